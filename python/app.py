@@ -1,13 +1,12 @@
 from gevent import monkey  # gevent 的猴子补丁
+monkey.patch_all()  # 必须在其他导入之前执行：pymysql、requests（akshare）的网络 I/O 和线程池改为协作式
 import concurrent
 import re
 from gevent.pool import Pool  # gevent 限制并发数
 import json
 import asyncio
 from db.operations import (  # 数据库操作
-    read_matching_column,
     swap_rows,
-    upsert_dataframe_to_mysql
 )
 
 from db.stock_operations import (  # 股票数据操作
@@ -21,8 +20,24 @@ from db.stock_operations import (  # 股票数据操作
     read_specific_rows_from_mysql,
     read_table_df_mysql,
     read_table_range_df_mysql,
-    replace_json_mysql
+    replace_json_mysql,
+    invalidate_table_caches
 )
+from db.latest_quotes import read_latest_quotes_mysql  # 最新行情
+from db.price_schema import migrate_price_tables  # 行情表结构迁移
+from db.long_store import (  # 长表存储布局
+    LONG_BARS_TABLE,
+    LONG_FACTORS_TABLE,
+    enable_long_format,
+    long_format_tables,
+    migrate_to_long_format
+)
+from db.column_store import column_store_settings, enable_column_store  # 本地列式行情副本
+from db.range_cache import range_cache  # 日期范围读取缓存
+from db.system_config import system_config  # 系统配置缓存
+from db.streaming import iter_table_ndjson_mysql  # 大表流式读取
+from db.instrumentation import query_report, query_stats  # 查询统计
+from db.reload_journal import reload_progress  # 全量更新进度
 
 from data_processor import (  # 数据处理功能
     df2c,
@@ -32,25 +47,89 @@ from data_processor import (  # 数据处理功能
     str2list
 )
 from factor import create_file, get_info  # 因子操作
-from flask import Flask, jsonify, request  # Flask 核心库
+from flask import Flask, Response, jsonify, request, stream_with_context  # Flask 核心库
 from flask_cors import CORS  # 支持跨域的库
-from flask_socketio import SocketIO, emit  # SocketIO 库
+from flask_socketio import SocketIO, emit, join_room  # SocketIO 库
 from backtest.backtest import backtest_all  # 回测功能
-from get_data.add_base import update_stock_data
+from get_data.add_base import MISSING_HISTORY_STATUS, plan_incremental_update, update_stock_data
+from get_data.snapshot import ingest_spot_snapshot
+from get_data.pipeline import StagedLoader  # 行情批量写入流水线
 from get_data.get_base import get_stock_data  # 数据获取
+from get_data.fetch_scheduler import get_fetch_scheduler  # 行情请求调度
+from get_data.adjust import set_adjust_mode  # 复权数据获取方式
+from get_data.sources import AkshareSource, RecordingSource, ReplaySource, set_data_source  # 行情数据源
+from get_data.getclass import refresh_index_constituents  # 指数成分股更新
+from get_data.progress import ProgressReporter, new_run_id, progress_room, progress_snapshot  # 任务进度合并推送
 app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(app, async_mode='gevent', cors_allowed_origins="*")
-SYSTEM_DB_NAME = 'system'
-SYSTEM_TABLE_NAME = "system"
-SYSTEM_MATCH_COLUMN = "config_name"
+
+# 长任务（更新行情、迁移、计算因子）在后台 greenlet 中运行，事件处理函数立即返回，
+# 任务通过 socketio.emit(..., to=sid) 向发起的客户端推送结果；逐只股票的进度由 ProgressReporter 合并后
+# 定时推送到这次运行的房间（按 run_id），发起任务的客户端自动加入该房间，
+# job/started 事件返回 run_id，断线重连的客户端用它通过 progress/subscribe 重新加入。
+# 同时运行的长任务最多 MAX_CONCURRENT_JOBS 个，已满时新任务直接返回错误，不排队。
+MAX_CONCURRENT_JOBS = 2
+job_pool = Pool(MAX_CONCURRENT_JOBS)
+
+
+def start_job(name, job, *args):
+    """在事件处理函数中调用：后台运行 job(sid, run_id, *args)"""
+    if job_pool.full():
+        emit('error', {'error': f'同时运行的任务已达上限（{MAX_CONCURRENT_JOBS} 个），请稍后再试。'})
+        return
+    run_id = new_run_id(name)
+    join_room(progress_room(run_id))
+    job_pool.spawn(_run_job, name, run_id, request.sid, job, args)
+    emit('job/started', {'job': name, 'run_id': run_id})
+
+
+def _run_job(name, run_id, sid, job, args):
+    try:
+        job(sid, run_id, *args)
+    except Exception as e:
+        app.logger.error(f"任务 {name} 出错: {e}\n{traceback.format_exc()}")
+        socketio.emit('error', {'error': f'任务 {name} 执行失败。'}, to=sid)
+    finally:
+        socketio.emit('job/finished', {'job': name, 'run_id': run_id}, to=sid)
+
 def get_system_config(config_key):
     try:
-        return read_matching_column(SYSTEM_DB_NAME, SYSTEM_TABLE_NAME, SYSTEM_MATCH_COLUMN, config_key)
+        return system_config.get(config_key)
     except Exception as e:
         app.logger.error(f"获取系统配置项 {config_key} 时出错: {e}")
         return None
 
+def configure_storage_layout():
+    """
+    按系统配置选择存储布局：
+    storage_layout 为 long 时，行情和因子改为存放在按 (code, 日期) 主键的长表中；
+    配置了 column_store_dir 时，按日期范围读取行情和因子时优先使用该目录下的本地列式副本。
+    """
+    china_db = get_system_config('china_db_name')
+    factor_db = get_system_config('factor_db')
+    if get_system_config('storage_layout') == 'long':
+        if china_db:
+            enable_long_format(china_db, LONG_BARS_TABLE)
+        if factor_db:
+            enable_long_format(factor_db, LONG_FACTORS_TABLE)
+    column_store_dir = get_system_config('column_store_dir')
+    if column_store_dir:
+        enable_column_store(column_store_dir, [name for name in (china_db, factor_db) if name])
+    # adjust_mode 为 local 时只请求不复权行情和复权因子，前复权、后复权列在本地计算
+    if get_system_config('adjust_mode') == 'local':
+        set_adjust_mode('local')
+    # data_source 为 replay 时从 replay_dir 回放录制的行情，不访问网络（可用 replay_latency、replay_failure_rate
+    # 模拟接口的耗时和失败）；为 record 时照常请求 akshare，同时录制到 replay_dir
+    data_source = get_system_config('data_source')
+    replay_dir = get_system_config('replay_dir')
+    if data_source == 'replay' and replay_dir:
+        set_data_source(ReplaySource(replay_dir,
+                                     latency=float(get_system_config('replay_latency') or 0),
+                                     failure_rate=float(get_system_config('replay_failure_rate') or 0)))
+    elif data_source == 'record' and replay_dir:
+        set_data_source(RecordingSource(AkshareSource(), replay_dir))
+
 @app.route('/api/getheader', methods=['POST'])
 def getheader():
     df = read_table_df_mysql('headers', 'user')
@@ -103,11 +182,10 @@ def get_index_constituent():
     df = read_table_df_mysql(headers, user_db)
     headers = df['header'].tolist()
 
-    information = read_last_row_mysql(
+    information = read_latest_quotes_mysql(
         stocks_filtered['code'],
         china_db,
-        headers,
-        '日期'
+        headers
     )
     print(stocks_filtered)
     print(information)
@@ -130,10 +208,9 @@ def get_self_stocks():
             return jsonify({'error': '请提供 columns.'}), 400
         stocks = read_table_df_mysql(self_stocks_table_name, user_db)
         print(stocks)
-        information = read_last_row_mysql(
+        information = read_latest_quotes_mysql(
             stocks['code'], china_db,
-            headers,
-            '日期'
+            headers
         )
         print(information)
         df = merge_df_columns(stocks, information)
@@ -453,8 +530,9 @@ def addbacktest():
         sell = df.at[0, 'sell']
         print(sell)
         if __name__ == "__main__":
-            backtest_all(stocklist, stockdb, backtestdb, buy, sell, startdate, enddate, backtestname,
-                   filter_first_n=0, filter_last_n=0)
+            with query_report(f'backtest_all {backtestname}'):
+                backtest_all(stocklist, stockdb, backtestdb, buy, sell, startdate, enddate, backtestname,
+                       filter_first_n=0, filter_last_n=0)
 
         backtest_table = get_system_config('backtest_table')
         db = get_system_config('user_db')
@@ -540,6 +618,19 @@ def getbacktestbuysell():
     print(result_json)
     return jsonify(result_json)
 
+@app.route('/api/export_backtest_table', methods=['POST'])
+def export_backtest_table():
+    # 以 NDJSON 流式返回回测结果表（如 收益排行、某只股票的买卖记录），不把整张表读入内存
+    data = request.json
+    db_name = get_system_config('backtest_db')
+    backtestname = data.get('backtestname')
+    table = data.get('table')
+    if not all([db_name, backtestname, table]):
+        return jsonify({'error': '缺少必要的参数。'}), 400
+    table_name = f"{backtestname}_{table}"
+    return Response(stream_with_context(iter_table_ndjson_mysql(table_name, db_name)),
+                    mimetype='application/x-ndjson')
+
 @app.route('/api/move_factor', methods=['POST'])
 def move_factor_route():
     try:
@@ -584,6 +675,33 @@ def getsys():
     # 返回 JSON 响应
     return jsonify(result)
 
+@app.route('/api/cache-stats', methods=['POST'])
+def cache_stats():
+    # 日期范围读取缓存的命中、未命中、淘汰次数和内存占用
+    return jsonify(range_cache.stats())
+
+@app.route('/api/fetch-stats', methods=['POST'])
+def get_fetch_stats():
+    # 行情请求的次数、重试、合并、吞吐量和错误率
+    return jsonify(get_fetch_scheduler().stats())
+
+@app.route('/api/reload-progress', methods=['POST'])
+def get_reload_progress():
+    # 全量更新（replace_stock）各状态的股票数和失败原因
+    return jsonify(reload_progress(get_system_config('china_db_name'), 'replace_stock'))
+
+@app.route('/api/progress/<run_id>', methods=['GET', 'POST'])
+def get_job_progress(run_id):
+    # 一次运行最近合并推送的进度（运行结束后为最终汇总），供断线重连的客户端拉取；传入任务名时返回最近一次运行
+    snapshot = progress_snapshot(run_id)
+    if snapshot is None:
+        return jsonify({'error': f'任务 {run_id} 没有进度记录。'}), 404
+    return jsonify(snapshot)
+
+@app.route('/api/query-stats', methods=['POST'])
+def get_query_stats():
+    # 按表名聚合的查询次数、耗时、行数和耗时分布，以及按调用函数聚合的慢查询
+    return jsonify(query_stats.summary())
 
 
 
@@ -597,8 +715,9 @@ def add_config():
         return jsonify({"error": "Invalid input format. Expected a list of JSON objects."}), 400
 
     try:
-        for item in json_data:
-            add_json_mysql(item, 'system', 'system', 'config_name')  # 假设 config_name 是主键
+        # 一次性批量合并全部配置项
+        add_json_mysql(json_data, 'system', 'system', 'config_name')  # 假设 config_name 是主键
+        system_config.invalidate()
         return jsonify({"message": "Configs added/updated successfully."}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -607,138 +726,212 @@ def add_config():
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
+@socketio.on('progress/subscribe')
+def subscribe_progress(data):
+    """用 job/started 返回的 run_id 重新订阅一次运行的进度推送（例如断线重连后），并立即返回当前进度"""
+    run_id = (data or {}).get('run_id')
+    if not run_id:
+        emit('error', {'error': '缺少任务的 run_id。'})
+        return
+    join_room(progress_room(run_id))
+    snapshot = progress_snapshot(run_id)
+    if snapshot is not None:
+        emit('progress', snapshot)
+
+
 @socketio.on('updata_stock')
 def updata_stock():
+    start_job('updata_stock', updata_stock_job)
+
+
+def updata_stock_job(sid, run_id):
     try:
         # 获取系统配置
         db_name = get_system_config('china_db_name')
-        stock_list = get_system_config('stock_list')
-        stock_list = str2list(stock_list)  # 将配置的股票列表转化为 Python 列表
+        stock_list = system_config.stock_list()  # 已解析为 Python 列表的股票列表
         print(stock_list)
 
         if not all([db_name, stock_list]):
-            emit('error', {'error': '系统配置缺失。'})
+            socketio.emit('error', {'error': '系统配置缺失。'}, to=sid)
             return
 
-        # 使用线程池更新股票数据
-        with ThreadPoolExecutor(max_workers=8) as executor:  # max_workers 取决于您的需求
-            # 为每个股票提交一个任务
-            future_to_stock = {executor.submit(update_stock_data, stock, db_name, socketio): stock for stock in
-                               stock_list}
-
-            for future in as_completed(future_to_stock):
-                stock = future_to_stock[future]
-                try:
-                    future.result()  # 获取任务的返回值，若有异常则抛出
-                except Exception as e:
-                    app.logger.error(f"更新股票 {stock} 时出错: {e}")
-                    emit('error', {'error': f'无法更新股票 {stock} 的数据。'})
+        # 一次读取全部股票的更新水位，已是最新的股票不再查询数据库或请求远程接口
+        plan = plan_incremental_update(stock_list, db_name)
+        if get_system_config('daily_update_mode') == 'snapshot':
+            # 收盘后用一次全市场快照写入当天日线，有缺口或除权除息的股票再逐只请求历史行情
+            snapshot = ingest_spot_snapshot(db_name, plan)
+            socketio.emit('stock_snapshot', {'date': snapshot['date'], 'ingested': len(snapshot['ingested']),
+                                             'fallback': len(snapshot['fallback'])}, to=sid)
+        # 计划中的每只股票都会报告一个状态（已去重），total 与之一致，进度才能到 100%
+        total = len(plan['pending']) + len(plan['up_to_date']) + len(plan['missing'])
+        progress = ProgressReporter(socketio, 'updata_stock', run_id, total=total)
+        for stock in plan['up_to_date']:
+            progress.update(stock, '已是最新数据')
+        # 没有历史数据的股票（例如新加入股票列表）不做增量更新，提示需要先全量获取
+        for stock in plan['missing']:
+            progress.update(stock, MISSING_HISTORY_STATUS)
+
+        # 使用线程池获取股票数据，获取到的数据交给写入流水线合并写入
+        loader = StagedLoader(db_name)
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:  # max_workers 取决于您的需求
+                # 为每个需要更新的股票提交一个任务
+                future_to_stock = {executor.submit(update_stock_data, stock, db_name, progress, plan, loader): stock
+                                   for stock in plan['pending']}
+
+                for future in as_completed(future_to_stock):
+                    stock = future_to_stock[future]
+                    try:
+                        future.result()  # 获取任务的返回值，若有异常则抛出
+                    except Exception as e:
+                        app.logger.error(f"更新股票 {stock} 时出错: {e}")
+                        progress.update(stock, 'error', e)
+        finally:
+            socketio.emit('stock_update/stats', loader.close(), to=sid)
+            progress.close()
 
     except Exception as e:
         app.logger.error(f"处理 updata_stock 时出错: {e}\n{traceback.format_exc()}")
-        emit('error', {'error': '无法更新股票数据。'})
+        socketio.emit('error', {'error': '无法更新股票数据。'}, to=sid)
 
 
 @socketio.on('replace_stock')
 def replace_stock():
+    start_job('replace_stock', replace_stock_job)
+
+
+def replace_stock_job(sid, run_id):
     try:
         db_name = get_system_config('china_db_name')
-        stock_list = get_system_config('stock_list')
-        stock_list = str2list(stock_list)
-        start_date = '19900101'
-        end_date = '20250515'
+        stock_list = system_config.stock_list()
 
         if not all([db_name, stock_list]):
-            emit('error', {'error': '系统配置缺失。'})
+            socketio.emit('error', {'error': '系统配置缺失。'}, to=sid)
             return
 
-        # 直接调用，不使用Pool
-        get_stock_data(stock_list, db_name, start_date, end_date, socketio)
+        # 从 1990 年到今天；进度记录在 reload_journal 中，中断后再次运行只处理未完成的股票
+        with ProgressReporter(socketio, 'replace_stock', run_id, total=len(stock_list)) as progress:
+            journal = get_stock_data(stock_list, db_name, None, None, progress)
+        socketio.emit('replace_stock/summary', {
+            'done': journal['done'],
+            'failed': journal['failed'],
+            'errors': journal['errors'],
+        }, to=sid)
     except Exception as e:
         app.logger.error(f"处理 replace_stock 时出错: {e}")
-        emit('error', {'error': '无法替换股票数据。'})
+        socketio.emit('error', {'error': '无法替换股票数据。'}, to=sid)
 
-from concurrent.futures import ProcessPoolExecutor
-import importlib
-import inspect
-import traceback
 
-def process_parameters(parameters_str, df, columns, a, factor_function):
-    args = []
-    kwargs = {}
+@socketio.on('migrate_price_tables')
+def migrate_price_tables_event():
+    """将旧的行情表迁移为以日期为主键的类型化表，逐表推送进度"""
+    start_job('migrate_price_tables', migrate_price_tables_job)
 
-    sig = inspect.signature(factor_function)
-    param_dict = sig.parameters
 
-    params_list = [p.strip() for p in parameters_str.split(',') if p.strip()]
+def migrate_price_tables_job(sid, run_id):
+    try:
+        db_name = get_system_config('china_db_name')
+        if not db_name:
+            socketio.emit('error', {'error': '系统配置缺失。'}, to=sid)
+            return
+
+        def report(done, total, table_name, status):
+            socketio.emit('migrate/progress', {'done': done, 'total': total, 'table': table_name, 'status': status},
+                          to=sid)
+
+        summary = migrate_price_tables(db_name, progress=report)
+        socketio.emit('migrate/summary', {
+            'migrated': len(summary['migrated']),
+            'skipped': len(summary['skipped']),
+            'failed': summary['failed'],
+        }, to=sid)
+    except Exception as e:
+        app.logger.error(f"迁移行情表时出错: {e}")
+        socketio.emit('error', {'error': '无法迁移行情表。'}, to=sid)
+
+
+@socketio.on('migrate_long_format')
+def migrate_long_format_event():
+    """把每只股票一张表的行情和因子复制到长表，原表保留"""
+    start_job('migrate_long_format', migrate_long_format_job)
+
+
+def migrate_long_format_job(sid, run_id):
+    try:
+        china_db = get_system_config('china_db_name')
+        factor_db = get_system_config('factor_db')
+        if not all([china_db, factor_db]):
+            socketio.emit('error', {'error': '系统配置缺失。'}, to=sid)
+            return
+
+        for db_name, table_name in [(china_db, LONG_BARS_TABLE), (factor_db, LONG_FACTORS_TABLE)]:
+            def report(done, total, source, status):
+                socketio.emit('migrate/progress', {
+                    'target': table_name, 'done': done, 'total': total, 'table': source, 'status': status
+                }, to=sid)
+
+            summary = migrate_to_long_format(db_name, table_name, progress=report)
+            socketio.emit('migrate/summary', {
+                'target': table_name,
+                'migrated': len(summary['migrated']),
+                'failed': summary['failed'],
+            }, to=sid)
+    except Exception as e:
+        app.logger.error(f"迁移长表时出错: {e}")
+        socketio.emit('error', {'error': '无法迁移到长表。'}, to=sid)
 
-    for param in params_list:
-        if '=' in param:
-            key, value = [s.strip() for s in param.split('=', 1)]
-            if value.isdigit():
-                kwargs[key] = int(value)
-            else:
-                kwargs[key] = value.strip('"\'')
-        else:
-            if param == 'df':
-                args.append(df)
-            elif param == 'column':
-                column_name = a.get('column')
-                if not column_name:
-                    data_columns = [col for col in columns if col != '日期']
-                    if len(data_columns) == 1:
-                        column_name = data_columns[0]
-                    else:
-                        return {'error': '无法确定列名，请在参数中指定 column。'}, None
-                args.append(column_name)
-            else:
-                value = a.get(param)
-                if value is not None:
-                    args.append(value)
-                elif param in param_dict:
-                    default_value = param_dict[param].default
-                    if default_value is not inspect.Parameter.empty:
-                        args.append(default_value)
-                    else:
-                        return {'error': f'缺少必要参数 {param}。'}, None
-
-    return args, kwargs
+
+@socketio.on('refresh_index')
+def refresh_index_event():
+    """更新全部指数的成分股，只写入成分股有变化的指数"""
+    start_job('refresh_index', refresh_index_job)
+
+
+def refresh_index_job(sid, run_id):
+    try:
+        with ProgressReporter(socketio, 'refresh_index', run_id) as progress:
+            def report(done, total, index_code, status):
+                progress.total = total
+                progress.update(index_code, status)
+
+            summary = refresh_index_constituents(progress=report)
+        socketio.emit('refresh_index/summary', {
+            'changed': summary['changed'],
+            'unchanged': len(summary['unchanged']),
+            'failed': summary['failed'],
+            'seconds': summary['seconds'],
+        }, to=sid)
+    except Exception as e:
+        app.logger.error(f"更新指数成分股时出错: {e}")
+        socketio.emit('error', {'error': '无法更新指数成分股。'}, to=sid)
+
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+import multiprocessing
+import traceback
+from factor.compute import FACTOR_RESULT_DB, compute_factor_for_stock, init_factor_worker  # 因子计算子进程
 
 @socketio.on('api/factor/compute_factor')
 def compute_factor_event(data):
+    start_job('compute_factor', compute_factor_job, data)
+
+
+def compute_factor_job(sid, run_id, data):
     try:
-        result = compute_factor(data)
+        result = compute_factor(data, run_id)
         if 'error' in result:
-            emit('error', result)
+            socketio.emit('error', result, to=sid)
         else:
-            emit('response/compute_factor', result)
-    except Exception as e:
-        emit('error', {'error': '因子计算失败。'})
-def compute_factor_for_stock(a, stock_code, db_name, columns, factor_function, parameters_str, total_stocks):
-    try:
-        # 从数据库读取股票数据
-        df = read_table_range_df_mysql(stock_code, db_name, '日期', '19900101', '20291101', columns)
-        # 处理函数参数
-        args, kwargs = process_parameters(parameters_str, df, columns, a, factor_function)
-        if isinstance(args, dict) and 'error' in args:
-            return args
-
-        # 执行因子函数计算
-        df1 = factor_function(*args, **kwargs)
-        # 插入数据到 MySQL 数据库
-        upsert_dataframe_to_mysql('factor', stock_code, df1, '日期')
-
-        return {'stock_code': stock_code, 'status': 'success'}
+            socketio.emit('response/compute_factor', result, to=sid)
     except Exception as e:
-        return {'stock_code': stock_code, 'status': 'failed', 'error': str(e)}
-
+        app.logger.error(f"计算因子时出错: {e}\n{traceback.format_exc()}")
+        socketio.emit('error', {'error': '因子计算失败。'}, to=sid)
 
-def compute_factor(a):
+def compute_factor(a, run_id=None):
     try:
         db_name = get_system_config('china_db_name')
         factor_db = get_system_config('factor_db')
-        stock_list_str = get_system_config('stock_list')
-        stock_list = [stock.strip() for stock in stock_list_str.split(',')]
+        stock_list = system_config.stock_list()  # 已解析为 Python 列表的股票列表
         factor_name = a.get('factor_name')
         factor_function_name = a.get('factor')
         parameters_str = a.get('parameters')
@@ -757,9 +950,17 @@ def compute_factor(a):
             return {'error': f"{factor_function_name} 不是一个可调用的函数。"}
 
         stock_count = len(stock_list)
-
-        # 使用多进程处理每个股票的计算
-        with ProcessPoolExecutor(max_workers=8) as executor:
+        failed = {}
+
+        # 使用多进程处理每个股票的计算，进度合并后定时推送。
+        # 子进程用 spawn 而不是 fork 启动：主进程已执行 gevent 的 monkey.patch_all，并持有数据库连接池和
+        # 后台 greenlet，fork 出的子进程会继承打过补丁的线程、锁和共享的连接。spawn 的子进程只导入 factor.compute，
+        # 存储布局由 init_factor_worker 按主进程的设置重新启用
+        executor = ProcessPoolExecutor(max_workers=8, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=init_factor_worker,
+                                       initargs=(long_format_tables(), *column_store_settings()))
+        with ProgressReporter(socketio, 'compute_factor', run_id, total=stock_count) as progress, \
+                query_report(f'compute_factor {factor_name}') as report, executor:
             futures = {
                 executor.submit(
                     compute_factor_for_stock,
@@ -768,18 +969,25 @@ def compute_factor(a):
                     db_name,
                     columns,
                     factor_function,
-                    parameters_str,
-                    stock_count
+                    parameters_str
                 ): stock_code for stock_code in stock_list
             }
 
-            for index, future in enumerate(concurrent.futures.as_completed(futures)):
+            for future in concurrent.futures.as_completed(futures):
                 result = future.result()
+                report.merge(result.pop('queries', None))
                 print(f"Stock {result['stock_code']} 计算完成。")
-                progress_percentage = (index + 1) / stock_count * 100
-                formatted_percentage = f"{progress_percentage:.1f}"
-                emit('compute/progress', formatted_percentage)
-
+                # 子进程只清除了自己的缓存，主进程中该股票的因子缓存需要在这里清除，回测才能读到新结果
+                invalidate_table_caches(FACTOR_RESULT_DB, result['stock_code'])
+                progress.update(result['stock_code'], result['status'], result.get('error'))
+                if result['status'] != 'success':
+                    failed[result['stock_code']] = result.get('error', '计算失败')
+
+        if len(failed) == stock_count:
+            return {'error': f'全部 {stock_count} 只股票的因子计算失败。', 'failed': failed}
+        if failed:
+            return {'message': f'因子计算完成：成功 {stock_count - len(failed)} 只，失败 {len(failed)} 只。',
+                    'failed': failed}
         return {'message': '因子计算成功。'}
     except ImportError:
         return {'error': '导入因子模块失败。'}
@@ -826,6 +1034,7 @@ def handle_importFactors():
 
 if __name__ == '__main__':
     try:
+        configure_storage_layout()
         socketio.run(app, debug=True)
     except Exception as e:
         app.logger.critical(f"应用启动失败: {e}")
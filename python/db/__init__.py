@@ -1,17 +1,100 @@
-from .connection import create_db_connection
-from .operations import  (read_matching_column,swap_rows,upsert_dataframe_to_mysql)
+from .connection import create_db_connection, get_engine, configure_engine_pool, dispose_engines
+from .operations import  (read_matching_column,swap_rows,upsert_dataframe_to_mysql,BULK_CHUNK_SIZE)
+from .instrumentation import QUERY_LOG_OPTIONS, configure_query_log, query_stats, query_report
+from .schema_catalog import SchemaCatalog, schema_catalog
+from .range_cache import RangeCache, range_cache
+from .system_config import SystemConfig, system_config
 from .stock_operations import (
     add_df_mysql,
     replace_df_mysql,
     add_or_replace_df_mysql,
     add_json_mysql,
+    add_data_mysql,
+    merge_df_mysql,
     replace_json_mysql,
     read_table_df_mysql,
     read_specific_columns_from_mysql,
     read_specific_rows_from_mysql,
     read_matching_rows_from_mysql,
     read_table_range_df_mysql,
+    invalidate_table_caches,
+    read_last_row_mysql,
+    read_last_rows_snapshot_mysql,
+    SNAPSHOT_STATUS_COLUMN,
     delete_rows_from_table_mysql,
 )
 
+from .latest_quotes import (
+    LATEST_QUOTES_TABLE,
+    update_latest_quote,
+    update_latest_quotes,
+    rebuild_latest_quotes,
+    refresh_latest_quotes,
+    discard_latest_quotes,
+    read_latest_quotes_mysql,
+    read_latest_quotes_snapshot_mysql,
+)
+from .price_schema import (
+    PRICE_PRIMARY_KEY,
+    create_price_table,
+    ensure_price_table,
+    write_price_df_mysql,
+    write_price_frames_mysql,
+    migrate_price_table,
+    migrate_price_tables,
+)
+from .long_store import (
+    LONG_BARS_TABLE,
+    LONG_FACTORS_TABLE,
+    enable_long_format,
+    disable_long_format,
+    long_table_for,
+    read_stock_history,
+    write_long_rows_mysql,
+    read_date_slice,
+    migrate_to_long_format,
+)
+from .column_store import (
+    enable_column_store,
+    disable_column_store,
+    column_store_enabled,
+    invalidate_column_store,
+)
+from .streaming import (
+    STREAM_CHUNK_SIZE,
+    iter_table_chunks_mysql,
+    iter_table_records_mysql,
+    iter_table_ndjson_mysql,
+)
+from .numpy_fetch import (
+    fetch_columns_numpy,
+    read_table_range_numpy_mysql,
+    benchmark_numpy_fetch,
+)
+from .adjust_factors import (
+    ADJ_FACTORS_TABLE,
+    write_adjust_factors,
+    read_adjust_factors,
+)
+from .watermarks import (
+    WATERMARKS_TABLE,
+    read_watermarks,
+    watermark_statement,
+    bulk_watermark_statement,
+    clear_watermarks,
+)
+from .reload_journal import (
+    RELOAD_JOURNAL_TABLE,
+    open_reload_journal,
+    mark_reload_state,
+    reload_progress,
+)
+from .index_membership import (
+    CONSTITUENT_HASHES_TABLE,
+    MEMBERSHIP_TABLE,
+    constituent_checksum,
+    read_constituent_hashes,
+    write_index_changes,
+    read_index_members,
+)
 from .stock_reader import StockDataReader
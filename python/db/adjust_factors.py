@@ -0,0 +1,93 @@
+# db/adjust_factors.py
+import hashlib
+import threading
+import pandas as pd
+from sqlalchemy import text
+from db.connection import create_db_connection
+from db.schema_catalog import schema_catalog
+from db.sql_utils import PRICE_PRIMARY_KEY, column_arrays
+from db.watermarks import checksum_statement
+
+# 复权因子表：每只股票在每次除权除息日的后复权因子，与行情表位于同一数据库
+ADJ_FACTORS_TABLE = 'adj_factors'
+ADJ_FACTORS_CODE = 'code'
+HFQ_FACTOR_COLUMN = 'hfq_factor'
+
+_create_lock = threading.Lock()
+
+
+def ensure_adjust_factors_table(db_name):
+    if schema_catalog.has_table(db_name, ADJ_FACTORS_TABLE):
+        return
+    with _create_lock:
+        engine = create_db_connection(db_name)
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS `{ADJ_FACTORS_TABLE}` ("
+                f"`{ADJ_FACTORS_CODE}` VARCHAR(16) NOT NULL, `{PRICE_PRIMARY_KEY}` DATE NOT NULL, "
+                f"`{HFQ_FACTOR_COLUMN}` DOUBLE NOT NULL, "
+                f"PRIMARY KEY (`{ADJ_FACTORS_CODE}`, `{PRICE_PRIMARY_KEY}`)"
+                f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"))
+        schema_catalog.invalidate(db_name, ADJ_FACTORS_TABLE)
+
+
+def _normalize_factors(factors):
+    factors = factors[[PRICE_PRIMARY_KEY, HFQ_FACTOR_COLUMN]].dropna()
+    factors = factors.assign(**{PRICE_PRIMARY_KEY: pd.to_datetime(factors[PRICE_PRIMARY_KEY]).dt.date,
+                                HFQ_FACTOR_COLUMN: factors[HFQ_FACTOR_COLUMN].astype(float)})
+    factors = factors.drop_duplicates(subset=[PRICE_PRIMARY_KEY], keep='last')
+    return factors.sort_values(PRICE_PRIMARY_KEY).reset_index(drop=True)
+
+
+def factor_checksum(factors):
+    """复权因子的校验值（按日期排序，因子保留 8 位小数），因子没有变化时校验值不变"""
+    factors = _normalize_factors(factors)
+    digest = hashlib.sha1()
+    for day, value in zip(factors[PRICE_PRIMARY_KEY], factors[HFQ_FACTOR_COLUMN]):
+        digest.update(f"{day.isoformat()}:{value:.8f};".encode())
+    return digest.hexdigest()
+
+
+def write_adjust_factors(db_name, stock_code, factors):
+    """
+    用 factors（日期、hfq_factor 两列）整体替换一只股票的复权因子，并在同一事务内更新水位表中的因子校验值。
+
+    :return: 因子校验值
+    """
+    ensure_adjust_factors_table(db_name)
+    checksum = factor_checksum(factors)
+    statement, params = checksum_statement(db_name, stock_code, checksum)
+    factors = _normalize_factors(factors)
+    factors.insert(0, ADJ_FACTORS_CODE, str(stock_code))
+
+    engine = create_db_connection(db_name)
+    raw_conn = engine.raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        try:
+            cursor.execute(f"DELETE FROM `{ADJ_FACTORS_TABLE}` WHERE `{ADJ_FACTORS_CODE}` = %s", (str(stock_code),))
+            if not factors.empty:
+                cursor.executemany(
+                    f"INSERT INTO `{ADJ_FACTORS_TABLE}` (`{ADJ_FACTORS_CODE}`, `{PRICE_PRIMARY_KEY}`, "
+                    f"`{HFQ_FACTOR_COLUMN}`) VALUES (%s, %s, %s)",
+                    list(zip(*column_arrays(factors))))
+            cursor.execute(statement, params)
+            raw_conn.commit()
+        finally:
+            cursor.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    return checksum
+
+
+def read_adjust_factors(db_name, stock_code):
+    """一只股票的复权因子（日期升序），没有记录时返回空 DataFrame"""
+    if not schema_catalog.has_table(db_name, ADJ_FACTORS_TABLE):
+        return pd.DataFrame(columns=[PRICE_PRIMARY_KEY, HFQ_FACTOR_COLUMN])
+    engine = create_db_connection(db_name)
+    query = (f"SELECT `{PRICE_PRIMARY_KEY}`, `{HFQ_FACTOR_COLUMN}` FROM `{ADJ_FACTORS_TABLE}` "
+             f"WHERE `{ADJ_FACTORS_CODE}` = %s ORDER BY `{PRICE_PRIMARY_KEY}`")
+    return pd.read_sql(query, con=engine, params=(str(stock_code),))
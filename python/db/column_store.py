@@ -0,0 +1,202 @@
+# db/column_store.py
+import os
+import threading
+import uuid
+import numpy as np
+import pandas as pd
+from db.sql_utils import PRICE_PRIMARY_KEY, PRICE_TABLE_PATTERN
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # 未安装 pyarrow 时不能启用本地列式存储，未启用时读写全部走 MySQL
+    pa = None
+    feather = None
+
+# 本地列式存储：MySQL 仍是唯一数据源，这里只保存股票表的只读副本。
+# 每张股票表对应 <root>/<db_name>/<股票代码>.arrow（未压缩的 Arrow IPC 文件），
+# 读取时通过内存映射打开，按列裁剪、按日期二分切片，不经过逐行的 Python 对象。
+# 每个文件在 Arrow 元数据中记录写入时的最大日期和行数（日期去重后），打开文件时与 MySQL 中的同一张表比对，
+# 不一致（例如其他进程或外部工具修改了 MySQL，或副本是上次运行留下的）时丢弃副本，重新从 MySQL 加载。
+_META_MAX_DATE = b'source_max_date'
+_META_ROWS = b'source_rows'
+_store = {'root': None, 'db_names': set()}
+_write_lock = threading.Lock()
+
+
+def enable_column_store(root, db_names):
+    """为 db_names 中的股票表启用本地列式副本，文件保存在 root 目录；未安装 pyarrow 时抛出 ImportError"""
+    if pa is None:
+        raise ImportError("本地列式存储需要 pyarrow（见 requirements.txt），请安装后重试，或清空 column_store_dir 配置")
+    _store['root'] = os.path.abspath(root)
+    _store['db_names'] = set(db_names)
+    return True
+
+
+def disable_column_store():
+    _store['root'] = None
+    _store['db_names'] = set()
+
+
+def column_store_settings():
+    """当前的列式副本目录（未启用时为 None）和启用的数据库列表"""
+    return _store['root'], sorted(_store['db_names'])
+
+
+def column_store_enabled(db_name, table_name=None):
+    """db_name（以及 table_name，如指定）是否使用本地列式副本"""
+    if _store['root'] is None or db_name not in _store['db_names']:
+        return False
+    return table_name is None or bool(PRICE_TABLE_PATTERN.match(str(table_name)))
+
+
+def _path(db_name, table_name):
+    return os.path.join(_store['root'], db_name, f"{table_name}.arrow")
+
+
+def _normalize(df):
+    df = df.copy(deep=False)
+    df[PRICE_PRIMARY_KEY] = pd.to_datetime(df[PRICE_PRIMARY_KEY])
+    df = df[df[PRICE_PRIMARY_KEY].notna()]
+    return df.drop_duplicates(subset=[PRICE_PRIMARY_KEY], keep='last').sort_values(PRICE_PRIMARY_KEY)
+
+
+def _date_stats(max_date, rows):
+    """统一最大日期和行数的表示，用于比较副本与 MySQL"""
+    max_date = pd.to_datetime(max_date, errors='coerce') if max_date is not None else pd.NaT
+    return ('' if pd.isna(max_date) else max_date.date().isoformat()), int(rows or 0)
+
+
+def _write_file(path, df):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+    max_date, rows = _date_stats(df[PRICE_PRIMARY_KEY].max() if len(df) else None, len(df))
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           _META_MAX_DATE: max_date.encode(), _META_ROWS: str(rows).encode()})
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+def _file_stats(path):
+    """副本记录的 (最大日期, 行数)，没有记录时返回 None"""
+    with pa.memory_map(path, 'r') as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    if _META_MAX_DATE not in metadata or _META_ROWS not in metadata:
+        return None
+    return metadata[_META_MAX_DATE].decode(), int(metadata[_META_ROWS])
+
+
+def _is_current(path, source_stats):
+    """副本记录的最大日期和行数是否与 MySQL 一致；无法比较时视为不一致"""
+    try:
+        return _file_stats(path) == _date_stats(*source_stats())
+    except Exception as e:
+        print(f"校验本地列式副本 {path} 失败: {e}")
+        return False
+
+
+def _read_file(path, columns=None):
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select([col for col in columns if col in table.column_names])
+    return table
+
+
+def store_column_table(db_name, table_name, df):
+    """用完整的表数据覆盖本地副本"""
+    if not column_store_enabled(db_name, table_name) or PRICE_PRIMARY_KEY not in df.columns:
+        return
+    path = _path(db_name, table_name)
+    try:
+        with _write_lock:
+            _write_file(path, _normalize(df))
+    except Exception as e:
+        print(f"写入本地列式副本 {path} 失败: {e}")
+        invalidate_column_store(db_name, table_name)
+
+
+def merge_column_table(db_name, table_name, df):
+    """
+    把新写入 MySQL 的行合并进本地副本（同一日期以新数据为准）。
+
+    副本不存在时不创建，等到第一次读取时从 MySQL 完整加载。
+    """
+    if not column_store_enabled(db_name, table_name) or PRICE_PRIMARY_KEY not in df.columns:
+        return
+    path = _path(db_name, table_name)
+    if not os.path.exists(path):
+        return
+    try:
+        with _write_lock:
+            existing = _read_file(path).to_pandas()
+            if set(df.columns) - set(existing.columns):
+                # 新增了列，旧行的新列需要从 MySQL 重新读取
+                invalidate_column_store(db_name, table_name)
+                return
+            # 与 MySQL 的 upsert 一致：新日期追加，已有日期只覆盖 df 中出现的列
+            existing = _normalize(existing).set_index(PRICE_PRIMARY_KEY)
+            new = _normalize(df).set_index(PRICE_PRIMARY_KEY)
+            merged = existing.reindex(existing.index.union(new.index))
+            merged.loc[new.index, new.columns] = new
+            _write_file(path, merged.rename_axis(PRICE_PRIMARY_KEY).reset_index())
+    except Exception as e:
+        print(f"更新本地列式副本 {path} 失败: {e}")
+        invalidate_column_store(db_name, table_name)
+
+
+def invalidate_column_store(db_name, table_name=None):
+    """删除本地副本，table_name 为空时删除该数据库的全部副本"""
+    if _store['root'] is None:
+        return
+    if table_name is None:
+        directory = os.path.join(_store['root'], db_name)
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)] if os.path.isdir(directory) else []
+    else:
+        paths = [_path(db_name, table_name)]
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"删除本地列式副本 {path} 失败: {e}")
+
+
+def read_column_store_range(db_name, table_name, start_value, end_value, columns, loader, source_stats=None):
+    """
+    从本地副本读取日期在 [start_value, end_value] 之间的数据。
+
+    :param columns: 需要的列，None 表示全部列
+    :param loader: 副本不存在时调用 loader() 从 MySQL 读取整张表并保存为副本
+    :param source_stats: 返回 MySQL 中该表 (最大日期, 去重后的日期数) 的函数；打开已有副本前先比对，
+                         不一致时丢弃副本重新加载。为 None 时不校验
+    """
+    path = _path(db_name, table_name)
+    if source_stats is not None and os.path.exists(path) and not _is_current(path, source_stats):
+        invalidate_column_store(db_name, table_name)
+    if not os.path.exists(path):
+        store_column_table(db_name, table_name, loader())
+        if not os.path.exists(path):
+            return None
+
+    if columns is not None and PRICE_PRIMARY_KEY not in columns:
+        table = _read_file(path, list(columns) + [PRICE_PRIMARY_KEY])
+    else:
+        table = _read_file(path, columns)
+    if columns is not None and any(col not in table.column_names for col in columns):
+        return None
+
+    # 日期已排序，二分查找得到切片范围，切片本身不复制数据
+    dates = table.column(PRICE_PRIMARY_KEY).to_numpy()
+    start = np.searchsorted(dates, np.datetime64(pd.to_datetime(start_value)), side='left')
+    end = np.searchsorted(dates, np.datetime64(pd.to_datetime(end_value)), side='right')
+    table = table.slice(start, max(end - start, 0))
+    if columns is not None:
+        table = table.select(list(columns))
+    df = table.to_pandas()
+    if PRICE_PRIMARY_KEY in df.columns:
+        # 与 MySQL DATE 列读出的类型保持一致
+        df[PRICE_PRIMARY_KEY] = df[PRICE_PRIMARY_KEY].dt.date
+    return df
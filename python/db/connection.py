@@ -1,7 +1,95 @@
 # db/connection.py
+import atexit
+import os
+import threading
 from sqlalchemy import create_engine
+from db.instrumentation import instrument_engine
 
-def create_db_connection(db_name, host='127.0.0.1', user='root', password='123456'):
-    connect_info = f'mysql+pymysql://{user}:{password}@{host}/{db_name}?charset=utf8'
-    engine = create_engine(connect_info)
+# 连接池默认参数，可通过 configure_engine_pool 修改
+# pool_size + max_overflow 需覆盖 get_data 中线程池的最大并发数（32）
+POOL_OPTIONS = {
+    'pool_size': 8,
+    'max_overflow': 32,
+    'pool_pre_ping': True,
+    'pool_recycle': 3600,
+    'pool_timeout': 30,
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+_engines_pid = os.getpid()
+
+
+def configure_engine_pool(**options):
+    """
+    修改连接池参数（pool_size、max_overflow、pool_pre_ping、pool_recycle、pool_timeout）。
+    已创建的引擎会被释放，下次获取时按新参数重建。
+    """
+    unknown = set(options) - set(POOL_OPTIONS)
+    if unknown:
+        raise ValueError(f"不支持的连接池参数: {', '.join(sorted(unknown))}")
+    with _engines_lock:
+        POOL_OPTIONS.update(options)
+        _dispose_all(close=True)
+
+
+def get_engine(db_name, host='127.0.0.1', user='root', password='123456', local_infile=False):
+    """
+    按 (host, user, db_name) 返回进程内共享的连接池引擎，线程安全。
+
+    local_infile=True 时返回允许 LOAD DATA LOCAL INFILE 的独立引擎。
+    """
+    _check_pid()
+    key = (host, user, db_name, 'local_infile') if local_infile else (host, user, db_name)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            connect_info = f'mysql+pymysql://{user}:{password}@{host}/{db_name}?charset=utf8'
+            connect_args = {'local_infile': True} if local_infile else {}
+            engine = instrument_engine(
+                create_engine(connect_info, echo=False, connect_args=connect_args, **POOL_OPTIONS))
+            _engines[key] = engine
     return engine
+
+
+def create_db_connection(db_name, host='127.0.0.1', user='root', password='123456'):
+    """创建与 MySQL 数据库的连接（返回共享的连接池引擎）"""
+    return get_engine(db_name, host, user, password)
+
+
+def dispose_engines():
+    """释放所有连接池中的连接，用于程序退出或手动重置"""
+    with _engines_lock:
+        _dispose_all(close=True)
+
+
+def _dispose_all(close):
+    for engine in _engines.values():
+        engine.dispose(close=close)
+    _engines.clear()
+
+
+def _check_pid():
+    """子进程（如 ProcessPoolExecutor 的 worker）不能复用父进程的连接"""
+    global _engines_pid
+    if _engines_pid != os.getpid():
+        with _engines_lock:
+            if _engines_pid != os.getpid():
+                _dispose_all(close=False)
+                _engines_pid = os.getpid()
+
+
+def _reset_after_fork():
+    global _engines_lock, _engines_pid
+    # fork 时锁可能被其他线程持有，子进程中重新创建
+    _engines_lock = threading.Lock()
+    _dispose_all(close=False)
+    _engines_pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(dispose_engines)
@@ -0,0 +1,161 @@
+# db/index_membership.py
+import hashlib
+import threading
+from datetime import date
+import pandas as pd
+from sqlalchemy import text
+from db.column_store import invalidate_column_store
+from db.connection import create_db_connection
+from db.operations import add_missing_columns
+from db.range_cache import range_cache
+from db.schema_catalog import schema_catalog
+from db.sql_utils import build_upsert_sql, column_arrays, quote_identifier
+
+# 指数成分股：每个指数一张成分股表（与原来相同，页面直接读取），另外记录
+# index_constituent_hashes：每个指数当前成分股集合的校验值，成分股没有变化的指数不再重写；
+# index_membership：成分股的生效区间（effective_from 到 effective_to，effective_to 为空表示仍在指数中），保留历史。
+INDEX_DB = 'index'
+CONSTITUENT_HASHES_TABLE = 'index_constituent_hashes'
+MEMBERSHIP_TABLE = 'index_membership'
+CONSTITUENT_CODE = '品种代码'
+CONSTITUENT_NAME = '品种名称'
+CONSTITUENT_SINCE = '纳入日期'
+
+_create_lock = threading.Lock()
+
+
+def ensure_membership_tables(db_name):
+    if schema_catalog.has_table(db_name, CONSTITUENT_HASHES_TABLE) and schema_catalog.has_table(db_name, MEMBERSHIP_TABLE):
+        return
+    with _create_lock:
+        engine = create_db_connection(db_name)
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS `{CONSTITUENT_HASHES_TABLE}` ("
+                f"`index_code` VARCHAR(16) NOT NULL, `checksum` CHAR(40) NOT NULL, `members` INT NOT NULL, "
+                f"`updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, "
+                f"PRIMARY KEY (`index_code`)"
+                f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"))
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS `{MEMBERSHIP_TABLE}` ("
+                f"`index_code` VARCHAR(16) NOT NULL, `code` VARCHAR(16) NOT NULL, `name` VARCHAR(64) NULL, "
+                f"`effective_from` DATE NOT NULL, `effective_to` DATE NULL, "
+                f"PRIMARY KEY (`index_code`, `code`, `effective_from`), KEY `idx_code` (`code`)"
+                f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"))
+        schema_catalog.invalidate(db_name, CONSTITUENT_HASHES_TABLE)
+        schema_catalog.invalidate(db_name, MEMBERSHIP_TABLE)
+
+
+def constituent_checksum(df):
+    """成分股集合的校验值（按代码排序，与行的顺序无关）"""
+    codes = sorted(set(df[CONSTITUENT_CODE].astype(str)))
+    return hashlib.sha1(','.join(codes).encode()).hexdigest()
+
+
+def read_constituent_hashes(db_name=INDEX_DB):
+    """一次查询读取全部指数的成分股校验值，{指数代码: 校验值}"""
+    if not schema_catalog.has_table(db_name, CONSTITUENT_HASHES_TABLE):
+        return {}
+    engine = create_db_connection(db_name)
+    with engine.connect() as connection:
+        return dict(connection.execute(text(f"SELECT `index_code`, `checksum` FROM `{CONSTITUENT_HASHES_TABLE}`")))
+
+
+def _open_members(connection, index_codes):
+    result = connection.execute(text(
+        f"SELECT `index_code`, `code` FROM `{MEMBERSHIP_TABLE}` "
+        f"WHERE `index_code` IN :codes AND `effective_to` IS NULL"), {'codes': tuple(index_codes)})
+    members = {}
+    for index_code, code in result:
+        members.setdefault(index_code, set()).add(code)
+    return members
+
+
+def _effective_from(row, default):
+    since = pd.to_datetime(row.get(CONSTITUENT_SINCE), errors='coerce') if CONSTITUENT_SINCE in row else pd.NaT
+    return default if pd.isna(since) else since.date()
+
+
+def write_index_changes(changes, db_name=INDEX_DB, effective_date=None):
+    """
+    在一个事务中写入成分股有变化的指数：替换各指数的成分股表、更新生效区间和校验值。
+
+    第一次记录某个指数时，成分股的 effective_from 为接口返回的纳入日期（没有时为 effective_date）；
+    之后新纳入的成分股 effective_from 为 effective_date，被移出的成分股 effective_to 设为 effective_date。
+    :param changes: {指数代码: 成分股 DataFrame}
+    :return: {指数代码: {'added': n, 'removed': n}}
+    """
+    if not changes:
+        return {}
+    effective_date = effective_date or date.today()
+    ensure_membership_tables(db_name)
+    engine = create_db_connection(db_name)
+
+    # 建表和补列是 DDL，不能放在事务中，先完成
+    for index_code, df in changes.items():
+        if not schema_catalog.has_table(db_name, index_code):
+            df.head(0).to_sql(index_code, con=engine, if_exists='append', index=False)
+            schema_catalog.register_table(db_name, index_code, df.columns)
+        else:
+            add_missing_columns(db_name, index_code, df)
+
+    with engine.connect() as connection:
+        open_members = _open_members(connection, list(changes))
+
+    summary = {}
+    raw_conn = engine.raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        try:
+            for index_code, df in changes.items():
+                current = {str(code): row for code, row in zip(df[CONSTITUENT_CODE].astype(str), df.to_dict('records'))}
+                previous = open_members.get(index_code, set())
+                added = [code for code in current if code not in previous]
+                removed = [code for code in previous if code not in current]
+
+                cursor.execute(f"DELETE FROM {quote_identifier(index_code, escape_percent=True)}")
+                if not df.empty:
+                    cursor.executemany(build_upsert_sql(index_code, list(df.columns), CONSTITUENT_CODE),
+                                       list(zip(*column_arrays(df))))
+                if removed:
+                    cursor.executemany(
+                        f"UPDATE `{MEMBERSHIP_TABLE}` SET `effective_to` = %s "
+                        f"WHERE `index_code` = %s AND `code` = %s AND `effective_to` IS NULL",
+                        [(effective_date, index_code, code) for code in removed])
+                if added:
+                    cursor.executemany(
+                        f"INSERT INTO `{MEMBERSHIP_TABLE}` (`index_code`, `code`, `name`, `effective_from`) "
+                        f"VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE `effective_to` = NULL",
+                        [(index_code, code, current[code].get(CONSTITUENT_NAME),
+                          effective_date if previous else _effective_from(current[code], effective_date))
+                         for code in added])
+                cursor.execute(
+                    f"INSERT INTO `{CONSTITUENT_HASHES_TABLE}` (`index_code`, `checksum`, `members`) VALUES (%s, %s, %s) "
+                    f"ON DUPLICATE KEY UPDATE `checksum` = VALUES(`checksum`), `members` = VALUES(`members`)",
+                    (index_code, constituent_checksum(df), len(current)))
+                summary[index_code] = {'added': len(added), 'removed': len(removed)}
+            raw_conn.commit()
+        finally:
+            cursor.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+
+    for index_code in changes:
+        invalidate_column_store(db_name, index_code)
+        range_cache.invalidate(db_name, index_code)
+    return summary
+
+
+def read_index_members(index_code, as_of=None, db_name=INDEX_DB):
+    """某一天（默认今天）指数的成分股代码列表"""
+    as_of = as_of or date.today()
+    engine = create_db_connection(db_name)
+    with engine.connect() as connection:
+        result = connection.execute(text(
+            f"SELECT `code` FROM `{MEMBERSHIP_TABLE}` WHERE `index_code` = :index_code "
+            f"AND `effective_from` <= :as_of AND (`effective_to` IS NULL OR `effective_to` > :as_of) ORDER BY `code`"),
+            {'index_code': index_code, 'as_of': as_of})
+        return [row[0] for row in result]
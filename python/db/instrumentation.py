@@ -0,0 +1,243 @@
+# db/instrumentation.py
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from functools import lru_cache
+from sqlalchemy import event
+
+# 查询统计：通过 SQLAlchemy 的 before_cursor_execute / after_cursor_execute 事件记录每条 SQL 的表名、行数和耗时，
+# 经过引擎执行的查询（包括 pd.read_sql）都会被统计；直接使用 raw_connection 游标的批量写入不经过这两个事件，不计入。
+# 只有开启统计时才在引擎上注册事件，关闭时没有额外开销。
+# 调用方函数名需要遍历调用栈，只在查询超过慢查询阈值时解析，按调用方的统计只包含慢查询。
+QUERY_LOG_OPTIONS = {
+    'enabled': True,
+    'slow_threshold': 1.0,   # 超过该耗时（秒）的查询打印到慢查询日志
+}
+
+# 耗时直方图的区间上界（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+_DB_DIR = os.path.dirname(os.path.abspath(__file__))
+_THIS_FILE = os.path.abspath(__file__)
+_STDLIB_DIR = os.path.dirname(os.__file__)
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|JOIN)\s+`?([^`\s,;()]+)`?', re.IGNORECASE)
+
+
+_QUERY_START_KEY = 'query_start_times'
+_engines = weakref.WeakSet()
+
+
+def configure_query_log(**options):
+    """修改查询统计参数（enabled、slow_threshold）；修改 enabled 时同时为已创建的引擎注册或移除事件"""
+    unknown = set(options) - set(QUERY_LOG_OPTIONS)
+    if unknown:
+        raise ValueError(f"不支持的查询统计参数: {', '.join(sorted(unknown))}")
+    QUERY_LOG_OPTIONS.update(options)
+    for engine in list(_engines):
+        _set_listeners(engine, QUERY_LOG_OPTIONS['enabled'])
+
+
+def _new_bucket():
+    return {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0,
+            'histogram': [0] * len(LATENCY_BUCKETS)}
+
+
+def _add(bucket, seconds, rows):
+    bucket['count'] += 1
+    bucket['seconds'] += seconds
+    bucket['max_seconds'] = max(bucket['max_seconds'], seconds)
+    bucket['rows'] += rows
+    for index, upper in enumerate(LATENCY_BUCKETS):
+        if seconds <= upper:
+            bucket['histogram'][index] += 1
+            break
+
+
+def _merge(bucket, other):
+    bucket['count'] += other['count']
+    bucket['seconds'] += other['seconds']
+    bucket['max_seconds'] = max(bucket['max_seconds'], other['max_seconds'])
+    bucket['rows'] += other['rows']
+    bucket['histogram'] = [a + b for a, b in zip(bucket['histogram'], other['histogram'])]
+
+
+class QueryStats:
+    """按表名聚合的查询统计，以及按调用方函数聚合的慢查询统计"""
+
+    def __init__(self):
+        self._by_helper = {}
+        self._by_table = {}
+        self._lock = threading.Lock()
+
+    def record(self, table, seconds, rows, helper=None):
+        """helper 为空（不是慢查询）时只计入按表名的统计"""
+        with self._lock:
+            _add(self._by_table.setdefault(table, _new_bucket()), seconds, rows)
+            if helper is not None:
+                _add(self._by_helper.setdefault(helper, _new_bucket()), seconds, rows)
+
+    def merge(self, summary):
+        """合并另一个 summary()（例如子进程中的统计）"""
+        if not summary:
+            return
+        with self._lock:
+            for key, target in (('helpers', self._by_helper), ('tables', self._by_table)):
+                for name, bucket in summary.get(key, {}).items():
+                    _merge(target.setdefault(name, _new_bucket()), bucket)
+
+    def summary(self):
+        """
+        {'helpers': {函数名: 慢查询统计}, 'tables': {表名: 统计}}，统计含 count、seconds、max_seconds、rows、histogram
+        """
+        with self._lock:
+            return {
+                'helpers': {name: dict(bucket, histogram=list(bucket['histogram']))
+                            for name, bucket in self._by_helper.items()},
+                'tables': {name: dict(bucket, histogram=list(bucket['histogram']))
+                           for name, bucket in self._by_table.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._by_helper.clear()
+            self._by_table.clear()
+
+    def format(self, top=10):
+        """按总耗时排序的文本报表"""
+        summary = self.summary()
+        lines = []
+        for title, key in (('表', 'tables'), ('慢查询调用方', 'helpers')):
+            items = sorted(summary[key].items(), key=lambda item: item[1]['seconds'], reverse=True)[:top]
+            if not items:
+                continue
+            lines.append(f"{title:<40}{'次数':>8}{'总耗时(s)':>12}{'最大(s)':>10}{'行数':>12}")
+            for name, bucket in items:
+                lines.append(f"{str(name):<40}{bucket['count']:>8}{bucket['seconds']:>12.3f}"
+                             f"{bucket['max_seconds']:>10.3f}{bucket['rows']:>12}")
+        return '\n'.join(lines)
+
+
+query_stats = QueryStats()
+_active_reports = []
+_reports_lock = threading.Lock()
+
+
+class QueryReport(QueryStats):
+    """一次任务期间（query_report 上下文内）进程中所有查询的统计"""
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.seconds = None
+
+
+@contextmanager
+def query_report(name, log=True):
+    """
+    统计 with 块执行期间进程内的全部查询，例如：
+
+        with query_report('compute_factor') as report:
+            ...
+        report.summary()
+
+    统计是进程级的：同一时间运行的其他任务的查询也会计入；子进程中的查询需通过 report.merge 合并。
+    """
+    report = QueryReport(name)
+    with _reports_lock:
+        _active_reports.append(report)
+    try:
+        yield report
+    finally:
+        with _reports_lock:
+            _active_reports.remove(report)
+        report.seconds = time.perf_counter() - report.started_at
+        if log:
+            print(f"[{name}] 用时 {report.seconds:.2f}s，查询统计：\n{report.format()}")
+
+
+@lru_cache(maxsize=None)
+def _source_kind(filename):
+    """'self'：本模块，'db'：db 包，'lib'：标准库和第三方库，'app'：业务代码"""
+    if filename.startswith('<'):
+        return 'lib'
+    path = os.path.abspath(filename)
+    if path == _THIS_FILE:
+        return 'self'
+    if path.startswith(_DB_DIR + os.sep):
+        return 'db'
+    if path.startswith(_STDLIB_DIR) or 'site-packages' in path or 'dist-packages' in path:
+        return 'lib'
+    return 'app'
+
+
+def _caller():
+    """调用 db 包的最外层函数名；不经过 db 包时为第一个业务代码函数名"""
+    helper = None
+    caller = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        kind = _source_kind(frame.f_code.co_filename)
+        if kind == 'db':
+            helper = frame.f_code.co_name
+        elif helper is not None and kind != 'self':
+            break
+        elif caller is None and kind == 'app':
+            caller = frame.f_code.co_name
+        frame = frame.f_back
+    return helper or caller or '?'
+
+
+def _table_of(sql):
+    match = _TABLE_PATTERN.search(sql[:2000])
+    return match.group(1) if match else '?'
+
+
+def _record(sql, seconds, rows):
+    table = _table_of(sql)
+    helper = _caller() if seconds >= QUERY_LOG_OPTIONS['slow_threshold'] else None
+    query_stats.record(table, seconds, rows, helper)
+    with _reports_lock:
+        reports = list(_active_reports)
+    for report in reports:
+        report.record(table, seconds, rows, helper)
+    if helper is not None:
+        text = ' '.join(sql[:300].split())
+        print(f"慢查询 {seconds:.3f}s [{helper}] 表 {table}，{rows} 行: {text}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get(_QUERY_START_KEY)
+    if not start_times:
+        # 查询执行期间才开启统计
+        return
+    seconds = time.perf_counter() - start_times.pop()
+    # 非缓冲查询（流式读取）只统计到返回第一批数据为止，行数未知
+    rows = cursor.rowcount
+    if rows is None or rows < 0 or rows >= 2 ** 63:
+        rows = 0
+    _record(statement, seconds, rows)
+
+
+def _set_listeners(engine, enabled):
+    for name, listener in (('before_cursor_execute', _before_cursor_execute),
+                           ('after_cursor_execute', _after_cursor_execute)):
+        if enabled and not event.contains(engine, name, listener):
+            event.listen(engine, name, listener)
+        elif not enabled and event.contains(engine, name, listener):
+            event.remove(engine, name, listener)
+
+
+def instrument_engine(engine):
+    """开启查询统计时为引擎注册计时事件；之后通过 configure_query_log(enabled=...) 开关"""
+    _engines.add(engine)
+    _set_listeners(engine, QUERY_LOG_OPTIONS['enabled'])
+    return engine
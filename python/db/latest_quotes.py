@@ -0,0 +1,176 @@
+# db/latest_quotes.py
+import threading
+import pandas as pd
+from sqlalchemy import text
+from db.connection import create_db_connection
+from db.operations import upsert_dataframe_to_mysql
+from db.schema_catalog import schema_catalog
+from db.stock_operations import (
+    SNAPSHOT_STATUS_COLUMN,
+    fill_missing_snapshot_rows,
+    read_last_rows_snapshot_mysql,
+)
+from db.watermarks import WATERMARK_CODE, WATERMARK_DATE, WATERMARKS_TABLE
+
+# 每只股票最新一行行情，与各股票历史表位于同一数据库，按 code 主键。
+# 写入历史表后更新失败时这里的记录会落后于历史表；读取时与增量更新水位（与历史表在同一事务中提交）比较，
+# 水位更新的股票视为没有记录，改为读取历史表。
+LATEST_QUOTES_TABLE = 'latest_quotes'
+LATEST_QUOTES_KEY = 'code'
+
+_create_lock = threading.Lock()
+
+
+def update_latest_quote(db_name, stock_code, df):
+    """
+    用刚写入的行情数据更新 latest_quotes 中该股票的记录（取 df 中日期最新的一行）。
+
+    由 get_data 的增量更新和全量更新在写入历史表后调用。
+    """
+    if df is None or df.empty or '日期' not in df.columns:
+        return
+    latest = df.loc[[pd.to_datetime(df['日期']).idxmax()]].copy()
+    latest['日期'] = pd.to_datetime(latest['日期'])
+    latest.insert(0, LATEST_QUOTES_KEY, str(stock_code))
+
+    if schema_catalog.has_table(db_name, LATEST_QUOTES_TABLE):
+        upsert_dataframe_to_mysql(db_name, LATEST_QUOTES_TABLE, latest, LATEST_QUOTES_KEY)
+    else:
+        # 首次建表时避免多个线程同时 CREATE TABLE
+        with _create_lock:
+            upsert_dataframe_to_mysql(db_name, LATEST_QUOTES_TABLE, latest, LATEST_QUOTES_KEY)
+
+
+def update_latest_quotes(db_name, df):
+    """一次写入多只股票的最新行情，df 含 code 列，每只股票一行"""
+    if df is None or df.empty:
+        return
+    latest = df.copy()
+    latest['日期'] = pd.to_datetime(latest['日期'])
+    latest[LATEST_QUOTES_KEY] = latest[LATEST_QUOTES_KEY].astype(str)
+    with _create_lock:
+        upsert_dataframe_to_mysql(db_name, LATEST_QUOTES_TABLE, latest, LATEST_QUOTES_KEY)
+
+
+def _copy_last_rows(db_name, stock_codes):
+    """把各股票历史表的最后一行写入 latest_quotes，返回历史表不存在、为空或读取失败的股票"""
+    # latest_quotes 已建立时只读取它的列；首次建立时读取各历史表的全部列
+    columns = [col for col in schema_catalog.get_columns(db_name, LATEST_QUOTES_TABLE) if col != LATEST_QUOTES_KEY]
+    snapshot = read_last_rows_snapshot_mysql(stock_codes, db_name, columns or None, order_by='日期')
+    found = snapshot[SNAPSHOT_STATUS_COLUMN] == 'ok'
+    if found.any():
+        latest = snapshot[found].drop(columns=[SNAPSHOT_STATUS_COLUMN])
+        latest['日期'] = pd.to_datetime(latest['日期'])
+        latest.insert(0, LATEST_QUOTES_KEY, [code for code, ok in zip(stock_codes, found) if ok])
+        with _create_lock:
+            upsert_dataframe_to_mysql(db_name, LATEST_QUOTES_TABLE, latest, LATEST_QUOTES_KEY)
+    return [code for code, ok in zip(stock_codes, found) if not ok]
+
+
+def rebuild_latest_quotes(db_name, stock_codes, chunk_size=200):
+    """从各股票历史表重建 latest_quotes，用于首次启用或数据修复"""
+    stock_codes = [str(code) for code in stock_codes]
+    for start in range(0, len(stock_codes), chunk_size):
+        _copy_last_rows(db_name, stock_codes[start:start + chunk_size])
+        print(f"latest_quotes 已重建 {min(start + chunk_size, len(stock_codes))}/{len(stock_codes)}")
+
+
+def refresh_latest_quotes(db_name, stock_codes):
+    """
+    从历史表重新读取各股票的最后一行更新 latest_quotes，用于改写了已有日期的数据之后（例如重建复权列、
+    通过通用写入函数修改股票表），这种改写不改变水位，读取时无法发现记录已过期。
+
+    latest_quotes 尚未建立时不做任何事；历史表已不存在或为空的股票删除其记录。
+    刷新失败时删除这些股票的记录，之后的读取改为读取历史表。
+    """
+    stock_codes = [str(code) for code in stock_codes]
+    if not stock_codes or not schema_catalog.has_table(db_name, LATEST_QUOTES_TABLE):
+        return
+    try:
+        gone = _copy_last_rows(db_name, stock_codes)
+    except Exception as e:
+        print(f"刷新最新行情失败，删除 {len(stock_codes)} 只股票的记录: {e}")
+        gone = stock_codes
+    discard_latest_quotes(db_name, gone)
+
+
+def discard_latest_quotes(db_name, stock_codes):
+    """
+    删除各股票在 latest_quotes 中的记录，之后读取这些股票时改为读取历史表。
+    用于更新 latest_quotes 失败之后，删除也失败时只打印错误（日期落后的记录读取时仍会按水位发现）。
+    """
+    stock_codes = [str(code) for code in stock_codes]
+    try:
+        if not stock_codes or not schema_catalog.has_table(db_name, LATEST_QUOTES_TABLE):
+            return
+        engine = create_db_connection(db_name)
+        with engine.begin() as connection:
+            connection.execute(text(f"DELETE FROM `{LATEST_QUOTES_TABLE}` WHERE `{LATEST_QUOTES_KEY}` IN :codes"),
+                               {'codes': tuple(stock_codes)})
+    except Exception as e:
+        print(f"删除 {len(stock_codes)} 只股票的最新行情记录失败: {e}")
+
+
+def _stale_codes(connection, db_name, rows):
+    """latest_quotes 中日期早于增量更新水位的股票（写入历史表后没能更新 latest_quotes）"""
+    if not rows or not schema_catalog.has_table(db_name, WATERMARKS_TABLE):
+        return set()
+    result = connection.execute(text(
+        f"SELECT `{WATERMARK_CODE}`, `{WATERMARK_DATE}` FROM `{WATERMARKS_TABLE}` "
+        f"WHERE `{WATERMARK_CODE}` IN :codes AND `{WATERMARK_DATE}` IS NOT NULL"), {'codes': tuple(rows)})
+    stale = set()
+    for code, last_date in result:
+        quote_date = pd.to_datetime(rows[code].get('日期'), errors='coerce')
+        if pd.isna(quote_date) or quote_date.date() < pd.to_datetime(last_date).date():
+            stale.add(code)
+    return stale
+
+
+def read_latest_quotes_snapshot_mysql(stock_codes, db_name, columns=None):
+    """
+    一次查询 latest_quotes 获取多只股票的最新行情。
+
+    返回结构与 read_last_rows_snapshot_mysql 相同（与 stock_codes 顺序一致，附加 _status 列）；
+    latest_quotes 中没有的股票（或表尚未建立、缺少所需列）、记录早于增量更新水位的股票退回按历史表逐批读取。
+    """
+    stock_codes = [str(code) for code in stock_codes]
+    rows = {}
+    if stock_codes and schema_catalog.has_table(db_name, LATEST_QUOTES_TABLE):
+        available = schema_catalog.get_columns(db_name, LATEST_QUOTES_TABLE)
+        if columns is None or all(col in available for col in columns):
+            select_columns = [col for col in available if col != LATEST_QUOTES_KEY] if columns is None else columns
+            # 与水位比较需要日期列，调用方没有要求时只用于比较，不出现在结果中
+            query_columns = select_columns if '日期' in select_columns else select_columns + ['日期']
+            columns_str = ', '.join([f'`{col}`' for col in [LATEST_QUOTES_KEY] + query_columns])
+            query = f"SELECT {columns_str} FROM `{LATEST_QUOTES_TABLE}` WHERE `{LATEST_QUOTES_KEY}` IN :codes"
+            engine = create_db_connection(db_name)
+            with engine.connect() as connection:
+                result = connection.execute(text(query), {'codes': tuple(dict.fromkeys(stock_codes))})
+                keys = list(result.keys())
+                rows = {row[0]: dict(zip(keys[1:], row[1:])) for row in result.fetchall()}
+                for code in _stale_codes(connection, db_name, rows):
+                    del rows[code]
+            columns = select_columns
+
+    missing_codes = [code for code in stock_codes if code not in rows]
+    fallback = None
+    if missing_codes:
+        fallback = read_last_rows_snapshot_mysql(missing_codes, db_name, columns, '日期')
+        if columns is None:
+            columns = [col for col in fallback.columns if col != SNAPSHOT_STATUS_COLUMN]
+    if not rows:
+        return fallback if fallback is not None else pd.DataFrame(columns=(columns or []) + [SNAPSHOT_STATUS_COLUMN])
+
+    result_df = pd.DataFrame.from_records([rows.get(code, {}) for code in stock_codes], columns=columns)
+    result_df[SNAPSHOT_STATUS_COLUMN] = ['ok' if code in rows else None for code in stock_codes]
+    if fallback is not None:
+        positions = [i for i, code in enumerate(stock_codes) if code not in rows]
+        fallback.index = positions
+        result_df.loc[positions, fallback.columns] = fallback
+    return result_df
+
+
+def read_latest_quotes_mysql(stock_codes, db_name, columns=None):
+    """与 read_last_row_mysql 返回格式相同，但优先从 latest_quotes 读取"""
+    snapshot = read_latest_quotes_snapshot_mysql(stock_codes, db_name, columns)
+    return fill_missing_snapshot_rows(snapshot, columns)
@@ -0,0 +1,318 @@
+# db/long_store.py
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+import pandas as pd
+from sqlalchemy import text
+from db.column_store import merge_column_table, store_column_table
+from db.connection import create_db_connection
+from db.range_cache import range_cache
+from db.schema_catalog import schema_catalog
+from db.sql_utils import (
+    BULK_CHUNK_SIZE,
+    PRICE_PRIMARY_KEY,
+    PRICE_TABLE_PATTERN,
+    executemany_upsert,
+    price_column_type,
+)
+
+# 长表布局：所有股票的行情（或因子）存放在一张按 (code, 日期) 为主键、按年分区的表中
+LONG_BARS_TABLE = 'market_bars'
+LONG_FACTORS_TABLE = 'market_factors'
+LONG_CODE_COLUMN = 'code'
+LONG_PRIMARY_KEY = (LONG_CODE_COLUMN, PRICE_PRIMARY_KEY)
+# 分区起始年份，早于该年份的数据落在第一个分区
+LONG_FIRST_YEAR = 1990
+
+# db_name -> 长表表名；未登记的数据库使用每只股票一张表的布局
+_long_tables = {}
+
+
+def enable_long_format(db_name, table_name):
+    """让 db 包对 db_name 中股票表的读写改为访问长表 table_name"""
+    _long_tables[db_name] = table_name
+
+
+def disable_long_format(db_name):
+    """恢复 db_name 为每只股票一张表的布局"""
+    _long_tables.pop(db_name, None)
+
+
+def long_format_tables():
+    """已启用长表布局的数据库，{db_name: 长表表名}"""
+    return dict(_long_tables)
+
+
+def long_table_for(db_name, table_name=None):
+    """
+    db_name 启用长表布局时返回长表表名，否则返回 None。
+
+    指定 table_name 时，只有以股票代码命名的表才会被映射到长表。
+    """
+    if table_name is not None and not PRICE_TABLE_PATTERN.match(str(table_name)):
+        return None
+    return _long_tables.get(db_name)
+
+
+def _partitions_ddl():
+    last_year = date.today().year + 5
+    partitions = [f"PARTITION p{year} VALUES LESS THAN ('{year + 1}-01-01')"
+                  for year in range(LONG_FIRST_YEAR, last_year + 1)]
+    partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return f"PARTITION BY RANGE COLUMNS(`{PRICE_PRIMARY_KEY}`) ({', '.join(partitions)})"
+
+
+def create_long_table(db_name, table_name, columns, dtypes=None):
+    """创建长表：(code, 日期) 为主键，日期单独建索引以支持按日期截面查询，按年分区"""
+    columns = [col for col in columns if col not in LONG_PRIMARY_KEY]
+    columns_ddl = ''.join(
+        f", `{col}` {price_column_type(col, None if dtypes is None else dtypes[col])}" for col in columns
+    )
+    ddl = (f"CREATE TABLE IF NOT EXISTS `{table_name}` ("
+           f"`{LONG_CODE_COLUMN}` VARCHAR(16) NOT NULL, `{PRICE_PRIMARY_KEY}` DATE NOT NULL{columns_ddl}, "
+           f"PRIMARY KEY (`{LONG_CODE_COLUMN}`, `{PRICE_PRIMARY_KEY}`), KEY `idx_date` (`{PRICE_PRIMARY_KEY}`)"
+           f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 {_partitions_ddl()}")
+    engine = create_db_connection(db_name)
+    with engine.begin() as connection:
+        connection.execute(text(ddl))
+    schema_catalog.invalidate(db_name, table_name)
+
+
+def ensure_long_table(db_name, table_name, columns, dtypes=None):
+    """确保长表存在并包含 columns 中的全部列"""
+    if not schema_catalog.has_table(db_name, table_name):
+        create_long_table(db_name, table_name, columns, dtypes)
+        return
+    existing = set(schema_catalog.get_columns(db_name, table_name))
+    missing = [col for col in columns if col not in existing]
+    if missing:
+        adds = ', '.join(
+            f"ADD COLUMN `{col}` {price_column_type(col, None if dtypes is None else dtypes[col])}"
+            for col in missing
+        )
+        engine = create_db_connection(db_name)
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE `{table_name}` {adds}"))
+        schema_catalog.add_columns(db_name, table_name, missing)
+
+
+def write_long_df_mysql(df, db_name, stock_code, replace=False, table_name=None, extra_statements=()):
+    """
+    将一只股票的数据按 (code, 日期) upsert 到长表。
+
+    :param replace: 为 True 时删除该股票原有的全部行再写入（全量更新），删除与写入在同一事务中
+    :param extra_statements: [(sql, params), ...]，与数据在同一事务中提交
+    :return: 写入统计 {'rows', 'seconds', 'rows_per_second'}
+    """
+    table_name = table_name or long_table_for(db_name)
+    if df is None or df.empty:
+        return
+    ensure_long_table(db_name, table_name, list(df.columns), df.dtypes)
+    engine = create_db_connection(db_name)
+    before_statements = []
+    if replace:
+        before_statements.append(
+            (f"DELETE FROM `{table_name}` WHERE `{LONG_CODE_COLUMN}` = %s", (str(stock_code),)))
+
+    df = df.drop(columns=[LONG_CODE_COLUMN], errors='ignore')
+    df = df[df[PRICE_PRIMARY_KEY].notna()].drop_duplicates(subset=[PRICE_PRIMARY_KEY], keep='last')
+    df = df.copy(deep=False)
+    df[PRICE_PRIMARY_KEY] = pd.to_datetime(df[PRICE_PRIMARY_KEY]).dt.date
+    df.insert(0, LONG_CODE_COLUMN, str(stock_code))
+
+    start_time = time.perf_counter()
+    executemany_upsert(engine, table_name, df, list(LONG_PRIMARY_KEY), BULK_CHUNK_SIZE, extra_statements,
+                       before_statements)
+    elapsed = time.perf_counter() - start_time
+    local_df = df.drop(columns=[LONG_CODE_COLUMN])
+    if replace:
+        store_column_table(db_name, stock_code, local_df)
+    else:
+        merge_column_table(db_name, stock_code, local_df)
+    range_cache.invalidate(db_name, str(stock_code))
+    rows = len(df)
+    rows_per_second = rows / elapsed if elapsed > 0 else float('inf')
+    print(f"Upserted {rows} records of {stock_code} into `{table_name}` in {elapsed:.2f}s ({rows_per_second:.0f} rows/s).")
+    return {'rows': rows, 'seconds': elapsed, 'rows_per_second': rows_per_second}
+
+
+def write_long_rows_mysql(df, db_name, table_name=None, extra_statements=(), replace_codes=()):
+    """
+    将多只股票的数据（df 含 code 列）一次 upsert 到长表，例如全市场当日行情。
+
+    :param extra_statements: [(sql, params), ...]，与数据在同一事务中提交
+    :param replace_codes: 全量更新的股票，在同一事务中先删除这些股票原有的全部行
+    :return: 写入统计 {'rows', 'seconds', 'rows_per_second'}
+    """
+    table_name = table_name or long_table_for(db_name)
+    if df is None or df.empty:
+        return
+    ensure_long_table(db_name, table_name, list(df.columns), df.dtypes)
+    df = df[df[PRICE_PRIMARY_KEY].notna()].drop_duplicates(subset=list(LONG_PRIMARY_KEY), keep='last')
+    df = df.copy(deep=False)
+    df[LONG_CODE_COLUMN] = df[LONG_CODE_COLUMN].astype(str)
+    df[PRICE_PRIMARY_KEY] = pd.to_datetime(df[PRICE_PRIMARY_KEY]).dt.date
+
+    replace_codes = [str(code) for code in replace_codes]
+    before_statements = []
+    if replace_codes:
+        placeholders = ', '.join(['%s'] * len(replace_codes))
+        before_statements.append(
+            (f"DELETE FROM `{table_name}` WHERE `{LONG_CODE_COLUMN}` IN ({placeholders})", tuple(replace_codes)))
+
+    engine = create_db_connection(db_name)
+    start_time = time.perf_counter()
+    executemany_upsert(engine, table_name, df, list(LONG_PRIMARY_KEY), BULK_CHUNK_SIZE, extra_statements,
+                       before_statements)
+    elapsed = time.perf_counter() - start_time
+    for stock_code, stock_df in df.groupby(LONG_CODE_COLUMN):
+        if stock_code in replace_codes:
+            store_column_table(db_name, stock_code, stock_df.drop(columns=[LONG_CODE_COLUMN]))
+        else:
+            merge_column_table(db_name, stock_code, stock_df.drop(columns=[LONG_CODE_COLUMN]))
+    range_cache.invalidate(db_name)
+    rows = len(df)
+    rows_per_second = rows / elapsed if elapsed > 0 else float('inf')
+    print(f"Upserted {rows} records into `{table_name}` in {elapsed:.2f}s ({rows_per_second:.0f} rows/s).")
+    return {'rows': rows, 'seconds': elapsed, 'rows_per_second': rows_per_second}
+
+
+def _columns_str(columns, with_code=False):
+    if columns is None:
+        return '*'
+    columns = [col for col in columns if col != LONG_CODE_COLUMN]
+    if with_code:
+        columns = [LONG_CODE_COLUMN] + columns
+    return ', '.join([f'`{col}`' for col in columns])
+
+
+def read_stock_history(db_name, stock_code, start_value=None, end_value=None, columns=None, table_name=None):
+    """读取长表中一只股票的历史数据（按日期升序，不含 code 列），对应原来读取单只股票表"""
+    table_name = table_name or long_table_for(db_name)
+    query = f"SELECT {_columns_str(columns)} FROM `{table_name}` WHERE `{LONG_CODE_COLUMN}` = %s"
+    params = [str(stock_code)]
+    if start_value is not None:
+        query += f" AND `{PRICE_PRIMARY_KEY}` >= %s"
+        params.append(start_value)
+    if end_value is not None:
+        query += f" AND `{PRICE_PRIMARY_KEY}` <= %s"
+        params.append(end_value)
+    query += f" ORDER BY `{PRICE_PRIMARY_KEY}`"
+    engine = create_db_connection(db_name)
+    df = pd.read_sql(query, con=engine, params=tuple(params))
+    return df.drop(columns=[LONG_CODE_COLUMN], errors='ignore')
+
+
+def stock_history_stats(db_name, stock_code, table_name=None):
+    """长表中一只股票的 (最大日期, 日期数)"""
+    table_name = table_name or long_table_for(db_name)
+    engine = create_db_connection(db_name)
+    with engine.connect() as connection:
+        return tuple(connection.execute(text(
+            f"SELECT MAX(`{PRICE_PRIMARY_KEY}`), COUNT(DISTINCT `{PRICE_PRIMARY_KEY}`) FROM `{table_name}` "
+            f"WHERE `{LONG_CODE_COLUMN}` = :code"), {'code': str(stock_code)}).one())
+
+
+def read_date_slice(db_name, start_value, end_value=None, columns=None, stock_codes=None, table_name=None):
+    """
+    读取某一天（或一个日期区间）全市场的数据，返回带 code 列的 DataFrame。
+
+    :param stock_codes: 可选，只返回这些股票
+    """
+    table_name = table_name or long_table_for(db_name)
+    end_value = start_value if end_value is None else end_value
+    query = (f"SELECT {_columns_str(columns, with_code=True)} FROM `{table_name}` "
+             f"WHERE `{PRICE_PRIMARY_KEY}` BETWEEN %s AND %s")
+    params = [start_value, end_value]
+    if stock_codes is not None:
+        stock_codes = [str(code) for code in stock_codes]
+        if not stock_codes:
+            return pd.DataFrame(columns=[LONG_CODE_COLUMN] + list(columns or []))
+        query += f" AND `{LONG_CODE_COLUMN}` IN ({', '.join(['%s'] * len(stock_codes))})"
+        params.extend(stock_codes)
+    query += f" ORDER BY `{PRICE_PRIMARY_KEY}`, `{LONG_CODE_COLUMN}`"
+    engine = create_db_connection(db_name)
+    return pd.read_sql(query, con=engine, params=tuple(params))
+
+
+def read_latest_rows(db_name, stock_codes, columns=None, table_name=None):
+    """一次查询读取多只股票在长表中的最新一行，返回 {股票代码: 行字典}"""
+    table_name = table_name or long_table_for(db_name)
+    stock_codes = list(dict.fromkeys(str(code) for code in stock_codes))
+    if not stock_codes:
+        return {}
+    select = 't.*' if columns is None else ', '.join(
+        [f't.`{LONG_CODE_COLUMN}`'] + [f't.`{col}`' for col in columns if col != LONG_CODE_COLUMN]
+    )
+    query = (f"SELECT {select} FROM `{table_name}` t JOIN ("
+             f"SELECT `{LONG_CODE_COLUMN}`, MAX(`{PRICE_PRIMARY_KEY}`) AS `latest` FROM `{table_name}` "
+             f"WHERE `{LONG_CODE_COLUMN}` IN :codes GROUP BY `{LONG_CODE_COLUMN}`"
+             f") m ON t.`{LONG_CODE_COLUMN}` = m.`{LONG_CODE_COLUMN}` AND t.`{PRICE_PRIMARY_KEY}` = m.`latest`")
+    engine = create_db_connection(db_name)
+    with engine.connect() as connection:
+        result = connection.execute(text(query), {"codes": tuple(stock_codes)})
+        keys = list(result.keys())
+        code_index = keys.index(LONG_CODE_COLUMN)
+        rows = {}
+        for row in result.fetchall():
+            record = dict(zip(keys, row))
+            rows[row[code_index]] = {key: value for key, value in record.items() if key != LONG_CODE_COLUMN}
+    return rows
+
+
+def migrate_table_to_long(db_name, source_table, table_name):
+    """把一张股票表（表名为股票代码）的全部数据复制到长表，可重复执行"""
+    columns = [col for col in schema_catalog.get_columns(db_name, source_table) if col != LONG_CODE_COLUMN]
+    if PRICE_PRIMARY_KEY not in columns:
+        raise ValueError(f"表 {source_table} 缺少 {PRICE_PRIMARY_KEY} 列。")
+    insert_str = ', '.join(f"`{col}`" for col in [LONG_CODE_COLUMN] + columns)
+    select_str = ', '.join(
+        [":code"] + [f"CAST(`{col}` AS DATE)" if col == PRICE_PRIMARY_KEY else f"`{col}`" for col in columns]
+    )
+    update_str = ', '.join(f"`{col}` = VALUES(`{col}`)" for col in columns if col != PRICE_PRIMARY_KEY)
+    query = (f"INSERT INTO `{table_name}` ({insert_str}) SELECT {select_str} FROM `{source_table}` "
+             f"WHERE `{PRICE_PRIMARY_KEY}` IS NOT NULL")
+    if update_str:
+        query += f" ON DUPLICATE KEY UPDATE {update_str}"
+    engine = create_db_connection(db_name)
+    with engine.begin() as connection:
+        result = connection.execute(text(query), {"code": source_table})
+    return result.rowcount
+
+
+def migrate_to_long_format(db_name, table_name, source_tables=None, max_workers=4, progress=None):
+    """
+    把 db_name 中每只股票一张表的数据迁移到长表 table_name，原表保留不动。
+
+    :param source_tables: 要迁移的表，默认为数据库中所有以股票代码命名的表
+    :param progress: 可选回调 progress(done, total, table_name, status)
+    :return: {'migrated': [...], 'failed': {表名: 错误信息}}
+    """
+    if source_tables is None:
+        source_tables = [name for name in schema_catalog.table_names(db_name) if PRICE_TABLE_PATTERN.match(name)]
+    # 先一次性补齐长表的列，避免多个线程同时 ALTER TABLE
+    all_columns = list(dict.fromkeys(
+        col for source in source_tables for col in schema_catalog.get_columns(db_name, source)
+    ))
+    ensure_long_table(db_name, table_name, all_columns)
+
+    summary = {'migrated': [], 'failed': {}}
+    total = len(source_tables)
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(migrate_table_to_long, db_name, source, table_name): source
+                   for source in source_tables}
+        for done, future in enumerate(as_completed(futures), start=1):
+            source = futures[future]
+            try:
+                rows = future.result()
+                summary['migrated'].append(source)
+                status = 'migrated'
+                print(f"[{done}/{total}] {source} -> {table_name}，{rows} 行，用时 {time.perf_counter() - start_time:.1f}s")
+            except Exception as e:
+                summary['failed'][source] = str(e)
+                status = 'failed'
+                print(f"[{done}/{total}] {source} 迁移失败: {e}")
+            if progress is not None:
+                progress(done, total, source, status)
+    return summary
@@ -0,0 +1,193 @@
+# db/numpy_fetch.py
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pymysql.constants import FIELD_TYPE
+from pymysql.cursors import SSCursor
+from sqlalchemy import text
+from db.connection import create_db_connection
+from db.long_store import LONG_CODE_COLUMN, long_table_for
+from db.price_schema import write_price_df_mysql
+from db.sql_utils import PRICE_PRIMARY_KEY, quote_identifier
+
+# 按结果集中的字段类型直接构造 NumPy 数组，不经过 pd.read_sql 的逐行构造和逐列类型推断。
+# 这些类型的字段不交给 pymysql 转换为 float/int/date 对象，而是保留原始文本，由 NumPy 在 C 中批量解析。
+# 行仍由 pymysql 逐行从协议包中读出为元组（纯 Python 驱动无法直接读成列），这部分耗时不变；
+# 省下的是逐个值的类型转换和 DataFrame 的逐行构造。
+_FLOAT_TYPES = {FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE, FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL}
+_INT_TYPES = {FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG, FIELD_TYPE.LONGLONG,
+              FIELD_TYPE.INT24, FIELD_TYPE.YEAR}
+_DATE_TYPES = {FIELD_TYPE.DATE, FIELD_TYPE.NEWDATE}
+_DATETIME_TYPES = {FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP}
+_RAW_TYPES = _FLOAT_TYPES | _INT_TYPES | _DATE_TYPES | _DATETIME_TYPES
+# 每次从无缓冲游标读取并解析的行数
+FETCH_CHUNK_ROWS = 50000
+
+
+class _RawSSCursor(SSCursor):
+    """
+    无缓冲游标：只对本次查询的结果集去掉数值和日期字段的转换函数，这些字段以文本返回。
+
+    转换函数在读取字段描述后、读取第一行之前替换，不修改连接上的 decoders，
+    连接归还连接池后不受影响。
+    """
+
+    def _do_get_result(self):
+        super()._do_get_result()
+        result = self._result
+        if result is not None and result.description:
+            result.converters = [(encoding, None if field.type_code in _RAW_TYPES else converter)
+                                 for field, (encoding, converter) in zip(result.fields, result.converters)]
+
+
+def _fill_missing(values, missing):
+    if None in values:
+        return [missing if value is None else value for value in values]
+    return values
+
+
+def _decode_column(values, type_code):
+    if type_code in _FLOAT_TYPES:
+        return np.fromiter(map(float, _fill_missing(values, 'nan')), np.float64, len(values))
+    if type_code in _INT_TYPES:
+        # 有空值时与 pandas 一致，转为 float64
+        if None in values:
+            return np.fromiter(map(float, _fill_missing(values, 'nan')), np.float64, len(values))
+        return np.fromiter(map(int, values), np.int64, len(values))
+    if type_code in _DATE_TYPES or type_code in _DATETIME_TYPES:
+        unit = 'datetime64[D]' if type_code in _DATE_TYPES else 'datetime64[us]'
+        try:
+            # 直接按 datetime64 构造时由 NumPy 解析 ISO 格式文本，比先构造字符串数组再 astype 快得多
+            return np.array(_fill_missing(values, 'NaT'), dtype=unit).astype('datetime64[ns]')
+        except ValueError:
+            # 0000-00-00 等无效日期
+            return pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype='datetime64[ns]')
+    return np.array(values, dtype=object)
+
+
+def fetch_columns_numpy(db_name, query, params=None):
+    """
+    执行查询并按列返回 {列名: NumPy 数组}。
+
+    浮点列为 float64，整数列为 int64（有空值时为 float64），日期列为 datetime64[ns]，其余为 object。
+    结果通过无缓冲游标每次读取 FETCH_CHUNK_ROWS 行并解析为数组，不会同时保留全部行的元组。
+    """
+    engine = create_db_connection(db_name)
+    raw_conn = engine.raw_connection()
+    chunks = []
+    try:
+        cursor = raw_conn.cursor(_RawSSCursor)
+        try:
+            cursor.execute(query, params)
+            description = cursor.description
+            while True:
+                rows = cursor.fetchmany(FETCH_CHUNK_ROWS)
+                if not rows:
+                    break
+                chunks.append([_decode_column(list(values), type_code)
+                               for (_, type_code, *_), values in zip(description, zip(*rows))])
+        finally:
+            cursor.close()
+    finally:
+        raw_conn.close()
+
+    columns = {}
+    for i, (name, type_code, *_) in enumerate(description):
+        parts = [chunk[i] for chunk in chunks]
+        if not parts:
+            columns[name] = _decode_column([], type_code)
+        elif len(parts) == 1:
+            columns[name] = parts[0]
+        else:
+            # 各块中同一整数列可能一块有空值（float64）一块没有（int64），合并时由 NumPy 统一类型
+            columns[name] = np.concatenate(parts)
+    return columns
+
+
+def read_table_range_numpy_mysql(table_name, db_name, primary_key, start_value, end_value, columns=None):
+    """
+    与 read_table_range_df_mysql 相同的查询，结果按列直接构造为 DataFrame。
+
+    注意：日期列返回 datetime64[ns]，而不是 datetime.date 对象。
+    """
+    long_table = long_table_for(db_name, table_name) if primary_key == PRICE_PRIMARY_KEY else None
+    if columns is None:
+        columns_str = '*'
+    else:
+        columns_str = ', '.join(quote_identifier(col, escape_percent=True)
+                                for col in columns if not long_table or col != LONG_CODE_COLUMN)
+    pk = quote_identifier(primary_key, escape_percent=True)
+    if long_table:
+        query = (f"SELECT {columns_str} FROM {quote_identifier(long_table, escape_percent=True)} "
+                 f"WHERE `{LONG_CODE_COLUMN}` = %s AND {pk} BETWEEN %s AND %s ORDER BY {pk}")
+        params = (str(table_name), start_value, end_value)
+    else:
+        query = (f"SELECT {columns_str} FROM {quote_identifier(table_name, escape_percent=True)} "
+                 f"WHERE {pk} BETWEEN %s AND %s")
+        params = (start_value, end_value)
+    df = pd.DataFrame(fetch_columns_numpy(db_name, query, params), copy=False)
+    if long_table:
+        df = df.drop(columns=[LONG_CODE_COLUMN], errors='ignore')
+    return df
+
+
+def benchmark_numpy_fetch(table_name, db_name, start_value='19900101', end_value='20291101', columns=None, repeat=5):
+    """
+    对同一张表分别用 pd.read_sql 和 read_table_range_numpy_mysql 读取，比较耗时。
+
+    :return: {'rows', 'read_sql', 'numpy'}，耗时为 repeat 次中的最短时间（秒）
+    """
+    columns_str = '*' if columns is None else ', '.join(quote_identifier(col, escape_percent=True) for col in columns)
+    query = (f"SELECT {columns_str} FROM {quote_identifier(table_name, escape_percent=True)} "
+             f"WHERE {quote_identifier(PRICE_PRIMARY_KEY, escape_percent=True)} BETWEEN %s AND %s")
+    engine = create_db_connection(db_name)
+
+    def timed(read):
+        best = float('inf')
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            df = read()
+            best = min(best, time.perf_counter() - start_time)
+        return best, df
+
+    read_sql_time, df_read_sql = timed(
+        lambda: pd.read_sql(query, con=engine, params=(start_value, end_value)))
+    numpy_time, df_numpy = timed(
+        lambda: read_table_range_numpy_mysql(table_name, db_name, PRICE_PRIMARY_KEY, start_value, end_value, columns))
+    if len(df_read_sql) != len(df_numpy):
+        raise AssertionError(f"行数不一致: read_sql {len(df_read_sql)}，numpy {len(df_numpy)}")
+    print(f"{table_name}: {len(df_numpy)} 行 x {len(df_numpy.columns)} 列，"
+          f"pd.read_sql {read_sql_time * 1000:.1f} ms，numpy {numpy_time * 1000:.1f} ms，"
+          f"加速 {read_sql_time / numpy_time:.2f}x")
+    return {'rows': len(df_numpy), 'read_sql': read_sql_time, 'numpy': numpy_time}
+
+
+def create_benchmark_table(db_name, table_name='_bench_numpy_fetch', years=30):
+    """生成 years 年的模拟日线数据（日期主键、DOUBLE 价格、BIGINT 成交量），用于基准测试"""
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=years * 244)
+    rng = np.random.default_rng(0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+    df = pd.DataFrame({PRICE_PRIMARY_KEY: dates.date})
+    for adjust in ('不复权', '前复权', '后复权'):
+        df[f'开盘_{adjust}'] = close * (1 + rng.normal(0, 0.005, len(dates)))
+        df[f'收盘_{adjust}'] = close
+        df[f'最高_{adjust}'] = close * 1.01
+        df[f'最低_{adjust}'] = close * 0.99
+        df[f'成交量_{adjust}'] = rng.integers(10_000, 10_000_000, len(dates))
+    write_price_df_mysql(df, db_name, table_name, replace=True)
+    return table_name
+
+
+if __name__ == '__main__':
+    # python -m db.numpy_fetch <数据库> [表名]，不指定表名时生成 30 年的模拟日线表并在测试后删除
+    bench_db = sys.argv[1]
+    if len(sys.argv) > 2:
+        benchmark_numpy_fetch(sys.argv[2], bench_db)
+    else:
+        bench_table = create_benchmark_table(bench_db)
+        try:
+            benchmark_numpy_fetch(bench_table, bench_db)
+        finally:
+            with create_db_connection(bench_db).begin() as connection:
+                connection.execute(text(f"DROP TABLE IF EXISTS `{bench_table}`"))
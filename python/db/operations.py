@@ -1,12 +1,16 @@
+import os
+import tempfile
+import time
 import uuid
-from sqlalchemy import insert
-from db.connection import create_db_connection
+from db.connection import create_db_connection, get_engine
+from db.long_store import long_table_for, write_long_df_mysql
+from db.column_store import merge_column_table
+from db.range_cache import range_cache
+from db.sql_utils import BULK_CHUNK_SIZE, build_upsert_sql, executemany_upsert, quote_identifier
+from db.schema_catalog import schema_catalog
 import pandas as pd
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, Float, DateTime, String, inspect, text
-from sqlalchemy.dialects.mysql import insert
+from sqlalchemy import MetaData, Table, Column, Integer, Float, DateTime, String, text
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.engine import Engine
-import math
 
 def read_matching_column(db_name, table_name, match_column, match_value):
     """
@@ -106,19 +110,11 @@ def swap_rows(db, table, factor_col, columns, factor_values, host='127.0.0.1', u
             trans.rollback()
             print(f"因子交换失败：{e}")
 
-def create_db_connection(db_name: str, host: str = '127.0.0.1', user: str = 'root', password: str = '123456') -> Engine:
-    """创建与 MySQL 数据库的连接"""
-    connect_info = f'mysql+pymysql://{user}:{password}@{host}/{db_name}?charset=utf8'
-    engine = create_engine(connect_info, echo=False, future=True)
-    return engine
-
-def check_or_create_table(db_name: str, table_name: str, dataframe: pd.DataFrame, primary_key_column: str) -> Table:
-    """检查表是否存在，不存在则根据 DataFrame 创建新表"""
-    engine = create_db_connection(db_name)
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-
-    if table_name not in metadata.tables:
+def check_or_create_table(db_name: str, table_name: str, dataframe: pd.DataFrame, primary_key_column: str):
+    """检查表是否存在（查表结构缓存，不反射），不存在则根据 DataFrame 创建新表"""
+    if not schema_catalog.has_table(db_name, table_name):
+        engine = create_db_connection(db_name)
+        metadata = MetaData()
         columns = []
         for col_name, dtype in dataframe.dtypes.items():
             if pd.api.types.is_integer_dtype(dtype):
@@ -137,119 +133,162 @@ def check_or_create_table(db_name: str, table_name: str, dataframe: pd.DataFrame
 
         table = Table(table_name, metadata, *columns)
         metadata.create_all(engine)
+        schema_catalog.register_table(db_name, table_name, [col.name for col in table.columns])
         print(f"Created table `{table_name}` with columns: {', '.join([col.name for col in table.columns])}")
-    else:
-        table = metadata.tables[table_name]
-        print(f"Table `{table_name}` already exists with columns: {', '.join([col.name for col in table.columns])}")
-    return table
 
 def add_missing_columns(db_name: str, table_name: str, dataframe: pd.DataFrame):
     """动态添加缺失的列到表中"""
-    engine = create_db_connection(db_name)
-    inspector = inspect(engine)
-    existing_columns = inspector.get_columns(table_name)
-    existing_column_names = {col['name'] for col in existing_columns}
+    existing_column_names = set(schema_catalog.get_columns(db_name, table_name))
 
     missing_columns = [col for col in dataframe.columns if col not in existing_column_names]
     if not missing_columns:
-        print("No missing columns to add.")
         return
 
-    with engine.connect() as conn:
-        for column in missing_columns:
-            dtype = dataframe[column].dtype
-            if pd.api.types.is_integer_dtype(dtype):
-                new_column_type = 'INTEGER'
-            elif pd.api.types.is_float_dtype(dtype):
-                new_column_type = 'FLOAT'
-            elif pd.api.types.is_datetime64_any_dtype(dtype):
-                new_column_type = 'DATETIME'
-            else:
-                new_column_type = 'VARCHAR(255)'
+    engine = create_db_connection(db_name)
+    added_columns = []
+    try:
+        with engine.connect() as conn:
+            for column in missing_columns:
+                dtype = dataframe[column].dtype
+                if pd.api.types.is_integer_dtype(dtype):
+                    new_column_type = 'INTEGER'
+                elif pd.api.types.is_float_dtype(dtype):
+                    new_column_type = 'FLOAT'
+                elif pd.api.types.is_datetime64_any_dtype(dtype):
+                    new_column_type = 'DATETIME'
+                else:
+                    new_column_type = 'VARCHAR(255)'
+
+                alter_table_stmt = text(f"ALTER TABLE `{table_name}` ADD COLUMN `{column}` {new_column_type}")
+                try:
+                    conn.execute(alter_table_stmt)
+                    added_columns.append(column)
+                    print(f"Added column `{column}` with type `{new_column_type}` to table `{table_name}`.")
+                except SQLAlchemyError as e:
+                    print(f"Error adding column `{column}`: {e}")
+                    raise
+            conn.commit()
+    except SQLAlchemyError:
+        # 缓存可能已过期（例如其他进程已加列），下次访问时重新读取该表结构
+        schema_catalog.invalidate(db_name, table_name)
+        raise
+    schema_catalog.add_columns(db_name, table_name, added_columns)
+
+def _escape_infile_text(series):
+    """转义 LOAD DATA 默认格式中的特殊字符（反斜杠、制表符、换行）"""
+    return (series.astype(str)
+            .str.replace('\\', '\\\\', regex=False)
+            .str.replace('\t', '\\t', regex=False)
+            .str.replace('\n', '\\n', regex=False)
+            .where(series.notna(), None))
+
+
+def _load_data_upsert(db_name, table_name, dataframe, primary_key_column, chunk_size, extra_statements=()):
+    """分块写入临时文件，LOAD DATA LOCAL INFILE 到临时表后合并到目标表"""
+    engine = get_engine(db_name, local_infile=True)
+    columns = list(dataframe.columns)
+    columns_str = ', '.join(quote_identifier(col, escape_percent=True) for col in columns)
+    staging_table = f"_stage_{uuid.uuid4().hex[:12]}"
+    merge_sql = build_upsert_sql(table_name, columns, primary_key_column, source=staging_table)
+
+    staged = dataframe.copy(deep=False)
+    for col in columns:
+        if staged[col].dtype == object or pd.api.types.is_string_dtype(staged[col].dtype):
+            staged[col] = _escape_infile_text(staged[col])
+
+    raw_conn = engine.raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        try:
+            cursor.execute(f"CREATE TEMPORARY TABLE {quote_identifier(staging_table)} "
+                           f"LIKE {quote_identifier(table_name)}")
+            for start in range(0, len(staged), chunk_size):
+                with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8',
+                                                 newline='', delete=False) as f:
+                    staged.iloc[start:start + chunk_size].to_csv(
+                        f, sep='\t', header=False, index=False, na_rep='\\N', lineterminator='\n')
+                    path = f.name
+                try:
+                    cursor.execute(
+                        f"LOAD DATA LOCAL INFILE %s INTO TABLE {quote_identifier(staging_table, True)} "
+                        f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                        f"({columns_str})",
+                        (path,))
+                finally:
+                    os.remove(path)
+            cursor.execute(merge_sql)
+            for statement, params in extra_statements:
+                cursor.execute(statement, params)
+            raw_conn.commit()
+        finally:
+            # 临时表属于连接，连接会回到连接池，需显式删除
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {quote_identifier(staging_table)}")
+            cursor.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
 
-            alter_table_stmt = text(f"ALTER TABLE `{table_name}` ADD COLUMN `{column}` {new_column_type}")
-            try:
-                conn.execute(alter_table_stmt)
-                print(f"Added column `{column}` with type `{new_column_type}` to table `{table_name}`.")
-            except SQLAlchemyError as e:
-                print(f"Error adding column `{column}`: {e}")
-                raise
-        conn.commit()
-
-def replace_nan_with_none(data_dicts):
-    for row in data_dicts:
-        for key, value in row.items():
-            if isinstance(value, float) and math.isnan(value):
-                row[key] = None
-    return data_dicts
-
-def upsert_dataframe_to_mysql(db_name: str, table_name: str, dataframe: pd.DataFrame, primary_key_column: str):
-    """将 DataFrame 数据进行 upsert 到 MySQL 表中"""
+
+def upsert_dataframe_to_mysql(db_name: str, table_name: str, dataframe: pd.DataFrame, primary_key_column: str,
+                              chunk_size: int = BULK_CHUNK_SIZE, use_load_data: bool = False,
+                              extra_statements=()):
+    """
+    将 DataFrame 数据进行 upsert 到 MySQL 表中
+
+    :param chunk_size: 每批写入的行数，避免单条语句超过 max_allowed_packet
+    :param use_load_data: 为 True 时通过 LOAD DATA LOCAL INFILE 写入临时表再合并，
+                          需要 MySQL 开启 local_infile
+    :param extra_statements: [(sql, params), ...]，与数据在同一事务中提交
+    :return: 写入统计 {'rows', 'seconds', 'rows_per_second'}，没有写入时返回 None
+    """
     if dataframe.empty:
         print(f"DataFrame for table `{table_name}` is empty, skipping upsert.")
         return
 
-    # 使用上下文管理器来创建和关闭数据库连接
+    if primary_key_column == '日期' and long_table_for(db_name, table_name):
+        # 长表布局：股票表映射为长表中该股票的行
+        return write_long_df_mysql(dataframe, db_name, table_name, extra_statements=extra_statements)
+
     engine = create_db_connection(db_name)
 
     # 检查或创建表
-    table = check_or_create_table(db_name, table_name, dataframe, primary_key_column)
+    check_or_create_table(db_name, table_name, dataframe, primary_key_column)
     add_missing_columns(db_name, table_name, dataframe)
 
-    # 重新反射表的结构，确保新添加的列被识别
-    metadata = MetaData()
-    metadata.reflect(bind=engine, only=[table_name])
-    table = metadata.tables[table_name]
-
-    # 打印表的列名以进行调试
-    print(f"Table columns after reflection: {table.columns.keys()}")
-
-    # 确保 '日期' 列存在并且没有缺失��
+    # 确保 '日期' 列存在并且没有缺失值
     if '日期' not in dataframe.columns:
         print(f"DataFrame for table `{table_name}` is missing '日期' column.")
         return
 
-    # 确保 '日期' 列为 datetime 类型
+    # 确保 '日期' 列为 date 类型，不修改调用方传入的 DataFrame
+    dataframe = dataframe.copy(deep=False)
     dataframe['日期'] = pd.to_datetime(dataframe['日期']).dt.date
 
-    # 替换 NaN 为 None
-    dataframe = dataframe.where(pd.notnull(dataframe), None)
-
-    # 准备数据列表
-    data_dicts = dataframe.to_dict(orient='records')
+    # 跳过缺少 '日期' 的行
+    missing_date = dataframe['日期'].isna()
+    if missing_date.any():
+        print(f"Warning: {int(missing_date.sum())} rows are missing '日期' value and will be skipped.")
+        dataframe = dataframe[~missing_date]
 
-    # 确保所有 NaN 被替换为 None
-    data_dicts = replace_nan_with_none(data_dicts)
-
-    # 检查 '日期' 列是否有 None
-    valid_data_dicts = []
-    for row in data_dicts:
-        if row.get('日期') is not None:
-            valid_data_dicts.append(row)
-        else:
-            print(f"Warning: Row is missing '日期' value and will be skipped: {row}")
-
-    if not valid_data_dicts:
+    if dataframe.empty:
         print(f"No valid data to upsert into `{table_name}`.")
         return
 
-    # 构建插入语句，使用 ON DUPLICATE KEY UPDATE 实现 upsert
-    stmt = insert(table).values(valid_data_dicts)
-
-    # 仅更新当前 DataFrame 中存在的列，排除主键
-    update_cols = {col.name: stmt.inserted[col.name]
-                   for col in table.columns
-                   if col.name != primary_key_column and col.name in dataframe.columns}
-
-    upsert_stmt = stmt.on_duplicate_key_update(update_cols)
-
-    # 在这里使用 with 语句来处理连接
+    start_time = time.perf_counter()
     try:
-        with engine.begin() as conn:
-            conn.execute(upsert_stmt)
-            print(f"Upserted {len(valid_data_dicts)} records into `{table_name}`.")
-    except SQLAlchemyError as e:
+        if use_load_data:
+            _load_data_upsert(db_name, table_name, dataframe, primary_key_column, chunk_size, extra_statements)
+        else:
+            executemany_upsert(engine, table_name, dataframe, primary_key_column, chunk_size, extra_statements)
+    except Exception as e:
         print(f"Error during upsert operation: {e}")
         raise
-    finally:
-        engine.dispose()
\ No newline at end of file
+    elapsed = time.perf_counter() - start_time
+    merge_column_table(db_name, table_name, dataframe)
+    range_cache.invalidate(db_name, table_name)
+    rows = len(dataframe)
+    rows_per_second = rows / elapsed if elapsed > 0 else float('inf')
+    print(f"Upserted {rows} records into `{table_name}` in {elapsed:.2f}s ({rows_per_second:.0f} rows/s).")
+    return {'rows': rows, 'seconds': elapsed, 'rows_per_second': rows_per_second}
@@ -0,0 +1,239 @@
+# db/price_schema.py
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from sqlalchemy import text
+from db.column_store import invalidate_column_store, merge_column_table, store_column_table
+from db.connection import create_db_connection
+from db.long_store import LONG_CODE_COLUMN, long_table_for, write_long_df_mysql, write_long_rows_mysql
+from db.operations import upsert_dataframe_to_mysql
+from db.range_cache import range_cache
+from db.schema_catalog import schema_catalog
+from db.sql_utils import (
+    BULK_CHUNK_SIZE,
+    PRICE_PRIMARY_KEY,
+    PRICE_TABLE_PATTERN,
+    executemany_upsert_tables,
+    price_column_type,
+)
+from db.watermarks import bulk_watermark_statement, clear_watermarks, watermark_statement
+
+
+def _columns_ddl(columns, dtypes=None):
+    return ', '.join(
+        f"`{col}` {price_column_type(col, None if dtypes is None else dtypes[col])}" for col in columns
+    )
+
+
+def create_price_table(db_name, table_name, df):
+    """按 DataFrame 的列创建带主键和明确类型的行情表（已存在时不做修改）"""
+    columns = [PRICE_PRIMARY_KEY] + [col for col in df.columns if col != PRICE_PRIMARY_KEY]
+    ddl = (f"CREATE TABLE IF NOT EXISTS `{table_name}` ({_columns_ddl(columns, df.dtypes)}, "
+           f"PRIMARY KEY (`{PRICE_PRIMARY_KEY}`)) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4")
+    engine = create_db_connection(db_name)
+    with engine.begin() as connection:
+        connection.execute(text(ddl))
+    schema_catalog.invalidate(db_name, table_name)
+
+
+def ensure_price_table(db_name, table_name, df):
+    """确保行情表存在，并按行情表的类型规则补齐缺失的列"""
+    if not schema_catalog.has_table(db_name, table_name):
+        create_price_table(db_name, table_name, df)
+        return
+    existing = set(schema_catalog.get_columns(db_name, table_name))
+    missing = [col for col in df.columns if col not in existing]
+    if missing:
+        adds = ', '.join(f"ADD COLUMN `{col}` {price_column_type(col, df.dtypes[col])}" for col in missing)
+        engine = create_db_connection(db_name)
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE `{table_name}` {adds}"))
+        schema_catalog.add_columns(db_name, table_name, missing)
+
+
+def write_price_df_mysql(df, db_name, table_name, replace=False, extra_statements=()):
+    """
+    写入股票历史行情：按日期 upsert，重复写入同一天不会产生重复行。
+
+    :param replace: 为 True 时用 df 整体替换原表（全量更新）。数据先写入临时表，再通过 RENAME TABLE
+                    原子替换，中途失败时原表保持不变，重复执行结果相同
+    :param extra_statements: [(sql, params), ...]（例如 watermark_statement）。增量写入时与行情数据在同一事务中提交；
+                             replace 时 RENAME TABLE 会隐式提交，无法与替换放在同一事务中，改为在同一连接上紧接着
+                             RENAME 执行。两者之间中断时水位日期保持为空（替换前已清空），之后的增量更新或
+                             read_watermarks 会从新表的最后一行重新得到水位
+    """
+    if replace:
+        # 先清空水位日期（保留复权因子校验值），写入失败时不会留下与数据不一致的水位
+        clear_watermarks(db_name, [table_name])
+    if long_table_for(db_name, table_name):
+        return write_long_df_mysql(df, db_name, table_name, replace=replace, extra_statements=extra_statements)
+    df = df.drop_duplicates(subset=[PRICE_PRIMARY_KEY], keep='last')
+    if replace:
+        return _replace_price_table(df, db_name, table_name, extra_statements)
+    ensure_price_table(db_name, table_name, df)
+    return upsert_dataframe_to_mysql(db_name, table_name, df, PRICE_PRIMARY_KEY,
+                                     extra_statements=extra_statements)
+
+
+def write_price_frames_mysql(frames, db_name, replace_codes=()):
+    """
+    合并写入多只股票的行情（{股票代码: DataFrame}），各股票的水位在同一事务中更新。
+
+    长表布局下全部股票合并为一条批量 upsert，replace_codes 中的股票在同一事务中先删除原有数据；
+    每只股票一张表时，replace_codes 中的股票逐只原子替换，其余股票在一个事务中分别 upsert 到各自的表。
+    :return: 写入的行数
+    """
+    frames = {str(code): df.drop_duplicates(subset=[PRICE_PRIMARY_KEY], keep='last')
+              for code, df in frames.items() if df is not None and not df.empty}
+    replace_codes = [code for code in map(str, replace_codes) if code in frames]
+    if not frames:
+        return 0
+    if long_table_for(db_name):
+        combined = pd.concat([df.assign(**{LONG_CODE_COLUMN: code}) for code, df in frames.items()], ignore_index=True)
+        statements = [watermark_statement(db_name, code, frames[code], replace=True) for code in replace_codes]
+        incremental = {code: pd.to_datetime(df[PRICE_PRIMARY_KEY]).max().date()
+                       for code, df in frames.items() if code not in replace_codes}
+        if incremental:
+            statements.append(bulk_watermark_statement(db_name, incremental))
+        write_long_rows_mysql(combined, db_name, extra_statements=statements, replace_codes=replace_codes)
+        return len(combined)
+
+    for code in replace_codes:
+        write_price_df_mysql(frames[code], db_name, code, replace=True,
+                             extra_statements=[watermark_statement(db_name, code, frames[code], replace=True)])
+    items = []
+    for code, df in frames.items():
+        if code in replace_codes:
+            continue
+        ensure_price_table(db_name, code, df)
+        df = df[df[PRICE_PRIMARY_KEY].notna()].copy(deep=False)
+        df[PRICE_PRIMARY_KEY] = pd.to_datetime(df[PRICE_PRIMARY_KEY]).dt.date
+        items.append((code, df, PRICE_PRIMARY_KEY))
+    if items:
+        last_dates = {code: max(df[PRICE_PRIMARY_KEY]) for code, df, _ in items}
+        executemany_upsert_tables(create_db_connection(db_name), items, BULK_CHUNK_SIZE,
+                                  [bulk_watermark_statement(db_name, last_dates)])
+        for code, df, _ in items:
+            merge_column_table(db_name, code, df)
+            range_cache.invalidate(db_name, code)
+    return sum(len(df) for df in frames.values())
+
+
+def _replace_price_table(df, db_name, table_name, extra_statements=()):
+    staging_table = f"{table_name}__reload_{uuid.uuid4().hex[:8]}"
+    old_table = f"{table_name}__old_{uuid.uuid4().hex[:8]}"
+    engine = create_db_connection(db_name)
+    create_price_table(db_name, staging_table, df)
+    try:
+        stats = upsert_dataframe_to_mysql(db_name, staging_table, df, PRICE_PRIMARY_KEY)
+        with engine.begin() as connection:
+            if schema_catalog.has_table(db_name, table_name):
+                connection.execute(text(
+                    f"RENAME TABLE `{table_name}` TO `{old_table}`, `{staging_table}` TO `{table_name}`"))
+                connection.execute(text(f"DROP TABLE `{old_table}`"))
+            else:
+                connection.execute(text(f"RENAME TABLE `{staging_table}` TO `{table_name}`"))
+            # RENAME 已隐式提交，这里的语句在同一连接的新事务中执行，不与替换原子
+            for statement, params in extra_statements:
+                connection.exec_driver_sql(statement, params)
+    except Exception:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS `{staging_table}`"))
+        raise
+    finally:
+        schema_catalog.drop_table(db_name, staging_table)
+        range_cache.invalidate(db_name, staging_table)
+        # 替换后写水位失败时原表也已被替换，缓存同样需要清除
+        schema_catalog.invalidate(db_name, table_name)
+        range_cache.invalidate(db_name, table_name)
+        invalidate_column_store(db_name, table_name)
+    store_column_table(db_name, table_name, df)
+    return stats
+
+
+def typed_price_tables(db_name):
+    """已经以日期为主键的表名集合"""
+    query = text("""
+        SELECT TABLE_NAME
+        FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = :db AND INDEX_NAME = 'PRIMARY' AND COLUMN_NAME = :pk
+    """)
+    engine = create_db_connection(db_name)
+    with engine.connect() as connection:
+        return {row[0] for row in connection.execute(query, {"db": db_name, "pk": PRICE_PRIMARY_KEY})}
+
+
+def migrate_price_table(db_name, table_name):
+    """
+    将一张旧行情表（to_sql 创建，无主键、类型由 pandas 推断）迁移为带主键的类型化表。
+
+    数据复制到新表（日期重复时保留后写入的一行），再通过 RENAME TABLE 原子替换原表。
+    :return: 迁移后的行数
+    """
+    columns = schema_catalog.get_columns(db_name, table_name)
+    if PRICE_PRIMARY_KEY not in columns:
+        raise ValueError(f"表 {table_name} 缺少 {PRICE_PRIMARY_KEY} 列，不是行情表。")
+    columns = [PRICE_PRIMARY_KEY] + [col for col in columns if col != PRICE_PRIMARY_KEY]
+    new_table = f"{table_name}__typed_{uuid.uuid4().hex[:8]}"
+    old_table = f"{table_name}__old_{uuid.uuid4().hex[:8]}"
+    columns_str = ', '.join(f"`{col}`" for col in columns)
+    select_str = ', '.join(
+        f"CAST(`{col}` AS DATE)" if col == PRICE_PRIMARY_KEY else f"`{col}`" for col in columns
+    )
+    update_str = ', '.join(f"`{col}` = VALUES(`{col}`)" for col in columns if col != PRICE_PRIMARY_KEY)
+
+    engine = create_db_connection(db_name)
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"CREATE TABLE `{new_table}` ({_columns_ddl(columns)}, PRIMARY KEY (`{PRICE_PRIMARY_KEY}`)) "
+            f"ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"))
+        try:
+            result = connection.execute(text(
+                f"INSERT INTO `{new_table}` ({columns_str}) SELECT {select_str} FROM `{table_name}` "
+                f"WHERE `{PRICE_PRIMARY_KEY}` IS NOT NULL"
+                + (f" ON DUPLICATE KEY UPDATE {update_str}" if update_str else "")))
+            connection.execute(text(
+                f"RENAME TABLE `{table_name}` TO `{old_table}`, `{new_table}` TO `{table_name}`"))
+        except Exception:
+            connection.execute(text(f"DROP TABLE IF EXISTS `{new_table}`"))
+            raise
+        connection.execute(text(f"DROP TABLE `{old_table}`"))
+    schema_catalog.invalidate(db_name, table_name)
+    range_cache.invalidate(db_name, table_name)
+    return result.rowcount
+
+
+def migrate_price_tables(db_name, table_names=None, max_workers=4, progress=None):
+    """
+    批量迁移行情表，已迁移的表会被跳过。
+
+    :param table_names: 要迁移的表，默认为数据库中所有以股票代码命名的表
+    :param progress: 可选回调 progress(done, total, table_name, status)，用于推送进度
+    :return: {'migrated': [...], 'skipped': [...], 'failed': {表名: 错误信息}}
+    """
+    if table_names is None:
+        table_names = [name for name in schema_catalog.table_names(db_name) if PRICE_TABLE_PATTERN.match(name)]
+    typed = typed_price_tables(db_name)
+    pending = [name for name in table_names if name not in typed]
+    summary = {'migrated': [], 'skipped': [name for name in table_names if name in typed], 'failed': {}}
+    total = len(pending)
+    print(f"待迁移行情表 {total} 张，已迁移 {len(summary['skipped'])} 张。")
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(migrate_price_table, db_name, name): name for name in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            try:
+                rows = future.result()
+                summary['migrated'].append(name)
+                status = 'migrated'
+                print(f"[{done}/{total}] {name} 迁移完成，{rows} 行，用时 {time.perf_counter() - start_time:.1f}s")
+            except Exception as e:
+                summary['failed'][name] = str(e)
+                status = 'failed'
+                print(f"[{done}/{total}] {name} 迁移失败: {e}")
+            if progress is not None:
+                progress(done, total, name, status)
+    return summary
@@ -0,0 +1,152 @@
+# db/range_cache.py
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+
+class RangeCache:
+    """
+    按日期范围读取的进程内读穿缓存（LRU，按内存预算淘汰）。
+
+    缓存键为 (数据库, 表, 列, 起始日期, 结束日期)，日期统一转换为 Timestamp，
+    因此已缓存的较宽范围（或全部列）可以直接切片得到较窄范围（或部分列）的结果。
+    写入某张表后由 db 包调用 invalidate 清除该表的全部缓存。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (DataFrame, 日期列的 Timestamp, 占用字节数)
+        self._by_table = {}            # (db_name, table_name) -> {key, ...}
+        self._bytes = 0
+        self._generation = {}          # (db_name, table_name) -> 写入次数，防止写入前读到的数据被放入缓存
+        self._epoch = 0                # 整库或全部清除的次数
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_bytes):
+        """修改内存预算（字节），0 表示停用缓存"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def read(self, db_name, table_name, primary_key, start_value, end_value, columns, loader):
+        """
+        返回 table_name 中 primary_key 在 [start_value, end_value] 之间的数据。
+
+        :param loader: 缓存未命中时调用 loader() 从数据库读取
+        :return: DataFrame 的副本，调用方可以放心修改
+        """
+        if self.max_bytes <= 0:
+            return loader()
+        try:
+            start, end = pd.Timestamp(start_value), pd.Timestamp(end_value)
+        except (TypeError, ValueError):
+            return loader()
+        columns = None if columns is None else tuple(columns)
+        table_key = (db_name, table_name)
+
+        with self._lock:
+            for key in self._by_table.get(table_key, ()):
+                _, _, cached_columns, cached_start, cached_end = key
+                if cached_start > start or cached_end < end:
+                    continue
+                df, dates, _ = self._entries[key]
+                if columns is None:
+                    if cached_columns is not None:
+                        continue
+                elif any(col not in df.columns for col in columns):
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                result = df[(dates >= start) & (dates <= end)]
+                if columns is not None:
+                    result = result[list(columns)]
+                return result.reset_index(drop=True).copy()
+            self.misses += 1
+            generation = self._current_generation(table_key)
+
+        df = loader()
+        self._store(table_key, generation, primary_key, columns, start, end, df)
+        return df.copy()
+
+    def _store(self, table_key, generation, primary_key, columns, start, end, df):
+        if df is None or primary_key not in df.columns:
+            return
+        try:
+            dates = pd.to_datetime(df[primary_key]).to_numpy()
+        except (TypeError, ValueError):
+            return
+        nbytes = int(df.memory_usage(deep=True).sum()) + dates.nbytes
+        if nbytes > self.max_bytes:
+            return
+        key = table_key + (columns, start, end)
+        with self._lock:
+            if self._current_generation(table_key) != generation:
+                # 读取期间表被写入过，结果可能已过期
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (df.copy(), dates, nbytes)
+            self._by_table.setdefault(table_key, set()).add(key)
+            self._bytes += nbytes
+            self._evict()
+
+    def _current_generation(self, table_key):
+        return self._epoch, self._generation.get(table_key, 0)
+
+    def _remove(self, key):
+        _, _, nbytes = self._entries.pop(key)
+        self._bytes -= nbytes
+        keys = self._by_table.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_table[key[:2]]
+
+    def _evict(self):
+        while self._entries and self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, db_name=None, table_name=None):
+        """
+        清除缓存。
+
+        :param db_name: 为空时清空全部缓存
+        :param table_name: 为空时清除该数据库的全部表
+        """
+        with self._lock:
+            if table_name is None:
+                self._epoch += 1
+                table_keys = [key for key in self._by_table if db_name is None or key[0] == db_name]
+            else:
+                table_keys = [(db_name, table_name)]
+                self._generation[(db_name, table_name)] = self._generation.get((db_name, table_name), 0) + 1
+            for table_key in table_keys:
+                for key in list(self._by_table.get(table_key, ())):
+                    self._remove(key)
+
+    def stats(self):
+        """命中、未命中、淘汰次数以及当前缓存条目数和占用字节数"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _after_fork(self):
+        self._lock = threading.RLock()
+
+
+range_cache = RangeCache()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=range_cache._after_fork)
@@ -0,0 +1,109 @@
+# db/reload_journal.py
+import threading
+from sqlalchemy import text
+from db.connection import create_db_connection
+from db.schema_catalog import schema_catalog
+
+# 全量重新获取行情的进度记录：每个任务每只股票一行（状态、尝试次数、最近一次错误），与行情表位于同一数据库。
+# 进程中断后再次运行同一任务时，只处理尚未完成的股票。
+# 一只股票最多尝试 MAX_RELOAD_ATTEMPTS 次，之后保持 failed 不再重试，不会让任务一直停留在未完成状态。
+RELOAD_JOURNAL_TABLE = 'reload_journal'
+RELOAD_PENDING = 'pending'
+RELOAD_RUNNING = 'running'
+RELOAD_DONE = 'done'
+RELOAD_FAILED = 'failed'
+MAX_RELOAD_ATTEMPTS = 3
+
+_create_lock = threading.Lock()
+
+
+def ensure_reload_journal(db_name):
+    if schema_catalog.has_table(db_name, RELOAD_JOURNAL_TABLE):
+        return
+    with _create_lock:
+        engine = create_db_connection(db_name)
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS `{RELOAD_JOURNAL_TABLE}` ("
+                f"`job` VARCHAR(64) NOT NULL, `code` VARCHAR(16) NOT NULL, "
+                f"`start_date` VARCHAR(8) NOT NULL, `end_date` VARCHAR(8) NOT NULL, "
+                f"`state` VARCHAR(16) NOT NULL, `attempts` INT NOT NULL DEFAULT 0, `last_error` TEXT NULL, "
+                f"`updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, "
+                f"PRIMARY KEY (`job`, `code`), KEY `idx_job_state` (`job`, `state`)"
+                f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"))
+        schema_catalog.invalidate(db_name, RELOAD_JOURNAL_TABLE)
+
+
+def open_reload_journal(db_name, job, stock_codes, start_date, end_date):
+    """
+    开始或继续一个全量更新任务。
+
+    任务有未完成的股票（pending、running，或失败但尝试次数未达到 MAX_RELOAD_ATTEMPTS）时继续上次的任务：
+    沿用上次的日期范围，stock_codes 中新增的股票加入任务，不在 stock_codes 中的股票移出任务，
+    已达到尝试次数上限的股票不再处理；
+    否则（首次运行、上次已全部完成或只剩达到上限的失败股票）以 stock_codes 和新的日期范围开始新任务。
+    :return: (start_date, end_date, 尚未完成的股票代码列表)
+    """
+    ensure_reload_journal(db_name)
+    stock_codes = list(dict.fromkeys(str(code) for code in stock_codes))
+    engine = create_db_connection(db_name)
+    with engine.begin() as connection:
+        row = connection.execute(text(
+            f"SELECT `start_date`, `end_date` FROM `{RELOAD_JOURNAL_TABLE}` "
+            f"WHERE `job` = :job AND (`state` IN (:pending, :running) "
+            f"OR (`state` = :failed AND `attempts` < :max_attempts)) LIMIT 1"),
+            {'job': job, 'pending': RELOAD_PENDING, 'running': RELOAD_RUNNING, 'failed': RELOAD_FAILED,
+             'max_attempts': MAX_RELOAD_ATTEMPTS}).fetchone()
+        if row is not None:
+            start_date, end_date = row
+            print(f"继续未完成的任务 {job}（{start_date} 到 {end_date}）")
+            if stock_codes:
+                connection.execute(text(
+                    f"DELETE FROM `{RELOAD_JOURNAL_TABLE}` WHERE `job` = :job AND `code` NOT IN :codes"),
+                    {'job': job, 'codes': tuple(stock_codes)})
+        else:
+            connection.execute(text(f"DELETE FROM `{RELOAD_JOURNAL_TABLE}` WHERE `job` = :job"), {'job': job})
+        if stock_codes:
+            connection.execute(text(
+                f"INSERT IGNORE INTO `{RELOAD_JOURNAL_TABLE}` (`job`, `code`, `start_date`, `end_date`, `state`) "
+                f"VALUES (:job, :code, :start_date, :end_date, :state)"),
+                [{'job': job, 'code': code, 'start_date': start_date, 'end_date': end_date, 'state': RELOAD_PENDING}
+                 for code in stock_codes])
+        finished = dict(connection.execute(text(
+            f"SELECT `code`, `state` FROM `{RELOAD_JOURNAL_TABLE}` WHERE `job` = :job "
+            f"AND (`state` = :done OR (`state` = :failed AND `attempts` >= :max_attempts))"),
+            {'job': job, 'done': RELOAD_DONE, 'failed': RELOAD_FAILED, 'max_attempts': MAX_RELOAD_ATTEMPTS}).fetchall())
+    remaining = [code for code in stock_codes if code not in finished]
+    given_up = sum(1 for state in finished.values() if state == RELOAD_FAILED)
+    print(f"任务 {job}：共 {len(stock_codes)} 只，已完成 {len(finished) - given_up} 只，"
+          f"失败达到 {MAX_RELOAD_ATTEMPTS} 次不再重试 {given_up} 只，待处理 {len(remaining)} 只")
+    return start_date, end_date, remaining
+
+
+def mark_reload_state(db_name, job, stock_code, state, error=None):
+    """更新一只股票的状态；进入 running 时尝试次数加一"""
+    attempts = ", `attempts` = `attempts` + 1" if state == RELOAD_RUNNING else ""
+    engine = create_db_connection(db_name)
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"UPDATE `{RELOAD_JOURNAL_TABLE}` SET `state` = :state, `last_error` = :error{attempts} "
+            f"WHERE `job` = :job AND `code` = :code"),
+            {'state': state, 'error': None if error is None else str(error)[:2000], 'job': job, 'code': str(stock_code)})
+
+
+def reload_progress(db_name, job):
+    """{'pending': n, 'running': n, 'done': n, 'failed': n, 'errors': {股票代码: 最近一次错误}}"""
+    progress = {RELOAD_PENDING: 0, RELOAD_RUNNING: 0, RELOAD_DONE: 0, RELOAD_FAILED: 0, 'errors': {}}
+    if not schema_catalog.has_table(db_name, RELOAD_JOURNAL_TABLE):
+        return progress
+    engine = create_db_connection(db_name)
+    with engine.connect() as connection:
+        for state, count in connection.execute(text(
+                f"SELECT `state`, COUNT(*) FROM `{RELOAD_JOURNAL_TABLE}` WHERE `job` = :job GROUP BY `state`"),
+                {'job': job}):
+            progress[state] = count
+        for code, error in connection.execute(text(
+                f"SELECT `code`, `last_error` FROM `{RELOAD_JOURNAL_TABLE}` WHERE `job` = :job AND `state` = :failed"),
+                {'job': job, 'failed': RELOAD_FAILED}):
+            progress['errors'][code] = error
+    return progress
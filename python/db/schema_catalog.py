@@ -0,0 +1,140 @@
+# db/schema_catalog.py
+import os
+import threading
+import time
+from sqlalchemy import text
+from db.connection import create_db_connection
+
+# 缓存中没有的表会单独到 INFORMATION_SCHEMA 确认一次（可能由其他进程新建），
+# 确认不存在的结果保留 MISSING_TABLE_TTL 秒，避免反复检查同一张不存在的表时每次都查询
+MISSING_TABLE_TTL = 5.0
+
+
+class SchemaCatalog:
+    """
+    缓存各数据库的表结构（表名 -> 列名列表），避免每次写入都反射整个数据库。
+
+    每个数据库首次使用时通过一次 INFORMATION_SCHEMA 查询加载全部表和列，
+    之后由 db 包在建表、加列时同步更新；外部修改表结构后可调用 invalidate 使缓存失效。
+    缓存中没有的表在报告不存在之前会单独重新查询一次，其他进程新建的表不需要 invalidate 也能看到。
+    """
+
+    def __init__(self):
+        self._columns = {}   # db_name -> {table_name: [column, ...]}
+        self._missing = {}   # (db_name, table_name) -> 确认不存在的时间（time.monotonic）
+        self._lock = threading.RLock()
+
+    def _load(self, db_name):
+        tables = self._columns.get(db_name)
+        if tables is not None:
+            return tables
+        with self._lock:
+            tables = self._columns.get(db_name)
+            if tables is None:
+                engine = create_db_connection(db_name)
+                query = text("""
+                    SELECT TABLE_NAME, COLUMN_NAME
+                    FROM INFORMATION_SCHEMA.COLUMNS
+                    WHERE TABLE_SCHEMA = :db
+                    ORDER BY TABLE_NAME, ORDINAL_POSITION
+                """)
+                tables = {}
+                with engine.connect() as conn:
+                    for table_name, column_name in conn.execute(query, {"db": db_name}):
+                        tables.setdefault(table_name, []).append(column_name)
+                self._columns[db_name] = tables
+        return tables
+
+    @staticmethod
+    def _query_columns(db_name, table_name):
+        engine = create_db_connection(db_name)
+        query = text("""
+            SELECT COLUMN_NAME
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = :db AND TABLE_NAME = :table
+            ORDER BY ORDINAL_POSITION
+        """)
+        with engine.connect() as conn:
+            return [row[0] for row in conn.execute(query, {"db": db_name, "table": table_name})]
+
+    def _lookup(self, db_name, table_name):
+        """表的列名列表；缓存中没有时单独查询一次该表，确认不存在时返回 None"""
+        tables = self._load(db_name)
+        columns = tables.get(table_name)
+        if columns is not None:
+            return columns
+        key = (db_name, table_name)
+        checked_at = self._missing.get(key)
+        if checked_at is not None and time.monotonic() - checked_at < MISSING_TABLE_TTL:
+            return None
+        columns = self._query_columns(db_name, table_name)
+        with self._lock:
+            if columns:
+                self._missing.pop(key, None)
+                return tables.setdefault(table_name, columns)
+            self._missing[key] = time.monotonic()
+        return None
+
+    def has_table(self, db_name, table_name):
+        """表是否存在"""
+        return self._lookup(db_name, table_name) is not None
+
+    def table_names(self, db_name):
+        """数据库中的全部表名"""
+        return list(self._load(db_name))
+
+    def get_columns(self, db_name, table_name):
+        """表的列名列表，表不存在时返回空列表"""
+        return list(self._lookup(db_name, table_name) or [])
+
+    def register_table(self, db_name, table_name, columns):
+        """记录新建（或被整体替换）的表及其列名"""
+        with self._lock:
+            tables = self._load(db_name)
+            self._missing.pop((db_name, table_name), None)
+            tables[table_name] = [str(col) for col in columns]
+
+    def add_columns(self, db_name, table_name, columns):
+        """记录 ALTER TABLE 新增的列"""
+        with self._lock:
+            self._missing.pop((db_name, table_name), None)
+            existing = self._load(db_name).setdefault(table_name, [])
+            existing.extend(col for col in columns if col not in existing)
+
+    def drop_table(self, db_name, table_name):
+        """记录被删除的表"""
+        with self._lock:
+            self._load(db_name).pop(table_name, None)
+
+    def invalidate(self, db_name=None, table_name=None):
+        """
+        使缓存失效。
+
+        :param db_name: 为空时清空全部数据库的缓存
+        :param table_name: 指定时只清除该表，下次访问时重新读取
+        """
+        with self._lock:
+            if db_name is None:
+                self._columns.clear()
+                self._missing.clear()
+            elif table_name is None:
+                self._columns.pop(db_name, None)
+                for key in [key for key in self._missing if key[0] == db_name]:
+                    del self._missing[key]
+            else:
+                self._missing.pop((db_name, table_name), None)
+                tables = self._columns.get(db_name)
+                if tables is not None:
+                    tables.pop(table_name, None)
+                    columns = self._query_columns(db_name, table_name)
+                    if columns:
+                        tables[table_name] = columns
+
+    def _after_fork(self):
+        # fork 时锁可能被其他线程持有；表结构缓存本身在子进程中仍然有效
+        self._lock = threading.RLock()
+
+
+schema_catalog = SchemaCatalog()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=schema_catalog._after_fork)
@@ -0,0 +1,106 @@
+# db/sql_utils.py
+import re
+import pandas as pd
+
+# 股票历史行情表以日期为主键，BETWEEN 与 ORDER BY 日期 均可走主键索引
+PRICE_PRIMARY_KEY = '日期'
+# 股票历史行情表的表名为 6 位股票代码
+PRICE_TABLE_PATTERN = re.compile(r'^\d{6}$')
+
+
+def price_column_type(column, dtype=None):
+    """行情表各列的 MySQL 类型：日期为 DATE，成交量为 BIGINT，其余数值列为 DOUBLE"""
+    if column == PRICE_PRIMARY_KEY:
+        return 'DATE NOT NULL'
+    if column.startswith('成交量'):
+        return 'BIGINT'
+    if dtype is None or pd.api.types.is_numeric_dtype(dtype):
+        return 'DOUBLE'
+    return 'VARCHAR(255)'
+
+
+# 批量写入时每批发送的行数
+BULK_CHUNK_SIZE = 5000
+
+
+def quote_identifier(name, escape_percent=False):
+    """
+    给列名或表名加反引号。
+
+    带参数执行的语句会经过 pymysql 的 % 格式化，此时需要 escape_percent=True。
+    """
+    quoted = '`' + str(name).replace('`', '``') + '`'
+    return quoted.replace('%', '%%') if escape_percent else quoted
+
+
+def build_upsert_sql(table_name, columns, primary_key_column, source=None):
+    """
+    构建 INSERT ... ON DUPLICATE KEY UPDATE 语句；source 为临时表名时使用 INSERT ... SELECT。
+
+    primary_key_column 可以是单个列名，也可以是复合主键的列名列表。
+    """
+    escape = source is None
+    quote = lambda name: quote_identifier(name, escape_percent=escape)
+    key_columns = [primary_key_column] if isinstance(primary_key_column, str) else list(primary_key_column)
+    columns_str = ', '.join(quote(col) for col in columns)
+    update_cols = [col for col in columns if col not in key_columns] or key_columns[:1]
+    update_str = ', '.join(f"{quote(col)} = VALUES({quote(col)})" for col in update_cols)
+    if source is None:
+        values_str = ', '.join(['%s'] * len(columns))
+        return (f"INSERT INTO {quote(table_name)} ({columns_str}) VALUES ({values_str}) "
+                f"ON DUPLICATE KEY UPDATE {update_str}")
+    return (f"INSERT INTO {quote(table_name)} ({columns_str}) "
+            f"SELECT {columns_str} FROM {quote(source)} "
+            f"ON DUPLICATE KEY UPDATE {update_str}")
+
+
+def column_arrays(dataframe):
+    """按列转换为 NumPy object 数组，NaN/NaT 替换为 None，避免逐行逐格遍历"""
+    arrays = []
+    for col in dataframe.columns:
+        series = dataframe[col]
+        values = series.to_numpy(dtype=object, na_value=None) if series.hasnans else series.to_numpy(dtype=object)
+        arrays.append(values)
+    return arrays
+
+
+def executemany_upsert(engine, table_name, dataframe, primary_key_column, chunk_size, extra_statements=(),
+                       before_statements=()):
+    """
+    分块通过 executemany 写入，pymysql 会将每块改写为多行 INSERT
+
+    :param extra_statements: [(sql, params), ...]，在同一事务中写入数据之后执行（例如更新水位表）
+    :param before_statements: [(sql, params), ...]，在同一事务中写入数据之前执行（例如删除旧数据）
+    """
+    executemany_upsert_tables(engine, [(table_name, dataframe, primary_key_column)], chunk_size,
+                              extra_statements, before_statements)
+
+
+def executemany_upsert_tables(engine, items, chunk_size, extra_statements=(), before_statements=()):
+    """
+    在一个事务中把多个 DataFrame 分别 upsert 到各自的表，用于合并多只股票的写入
+
+    :param items: [(表名, DataFrame, 主键列), ...]
+    """
+    raw_conn = engine.raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        try:
+            for statement, params in before_statements:
+                cursor.execute(statement, params)
+            for table_name, dataframe, primary_key_column in items:
+                sql = build_upsert_sql(table_name, list(dataframe.columns), primary_key_column)
+                arrays = column_arrays(dataframe)
+                for start in range(0, len(dataframe), chunk_size):
+                    rows = list(zip(*(values[start:start + chunk_size] for values in arrays)))
+                    cursor.executemany(sql, rows)
+            for statement, params in extra_statements:
+                cursor.execute(statement, params)
+            raw_conn.commit()
+        finally:
+            cursor.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
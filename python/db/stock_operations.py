@@ -1,43 +1,68 @@
 import pandas as pd
-from sqlalchemy import inspect, text
+from sqlalchemy import text
 from db.connection import create_db_connection
+from db.sql_utils import BULK_CHUNK_SIZE, PRICE_TABLE_PATTERN, column_arrays, quote_identifier
+from db.long_store import long_table_for, read_latest_rows, read_stock_history, stock_history_stats
+from db.column_store import (
+    column_store_enabled, invalidate_column_store, read_column_store_range, store_column_table,
+)
+from db.range_cache import range_cache
+from db.schema_catalog import schema_catalog
 import re
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+def invalidate_table_caches(db_name, table_name):
+    """表由其他进程写入后（例如计算因子的子进程），清除本进程中该表的日期范围缓存、本地列式副本和表结构缓存"""
+    invalidate_column_store(db_name, table_name)
+    range_cache.invalidate(db_name, table_name)
+    schema_catalog.invalidate(db_name, table_name)
+
+def _refresh_latest_quote(db_name, table_name):
+    """通用写入函数修改了股票表后，按历史表刷新该股票在 latest_quotes 中的记录"""
+    if not PRICE_TABLE_PATTERN.match(str(table_name)):
+        return
+    # db.latest_quotes 导入了本模块，只能在这里导入
+    from db.latest_quotes import refresh_latest_quotes
+    refresh_latest_quotes(db_name, [table_name])
+
 def add_df_mysql(df, db_name, table_name):
     """ 将 DataFrame 追加到 MySQL 数据库 """
     engine = create_db_connection(db_name)
-    inspector = inspect(engine)
 
     # 检查表是否存在
-    if table_name not in inspector.get_table_names():
+    if not schema_catalog.has_table(db_name, table_name):
         # 如果表不存在，创建表
-        df.head(0).to_sql(table_name, con=engine, if_exists='fail', index=False)
+        df.head(0).to_sql(table_name, con=engine, if_exists='append', index=False)
+        schema_catalog.register_table(db_name, table_name, df.columns)
         print(f"表 '{table_name}' 不存在，已创建表。")
 
     # 将 df 追加到 MySQL 数据库
     df.to_sql(name=table_name, con=engine, if_exists='append', index=False)
+    invalidate_column_store(db_name, table_name)
+    range_cache.invalidate(db_name, table_name)
+    _refresh_latest_quote(db_name, table_name)
     print(f"数据已成功追加到表 '{table_name}'。")
 
 def replace_df_mysql(df, db_name, table_name):
     """ 将 DataFrame 写入 MySQL 数据库 """
     engine = create_db_connection(db_name)
-    inspector = inspect(engine)
-    if table_name not in inspector.get_table_names():
-        # 如果表不存在，创建表
-        df.head(0).to_sql(table_name, con=engine, if_exists='fail', index=False)
-        print(f"表 '{table_name}' 不存在，已创建表。")
-    # 将 df 写入 MySQL 数据库，如果表存在则替换
+    # 将 df 写入 MySQL 数据库，如果表存在则替换（表不存在时 to_sql 会直接创建）
     df.to_sql(name=table_name, con=engine, if_exists='replace', index=False)
+    schema_catalog.register_table(db_name, table_name, df.columns)
+    store_column_table(db_name, table_name, df)
+    range_cache.invalidate(db_name, table_name)
+    _refresh_latest_quote(db_name, table_name)
 
 def add_or_replace_df_mysql(df, db_name, table_name):
     """ 将 DataFrame 追加到 MySQL 数据库，如果主键重复则覆盖 """
     engine = create_db_connection(db_name)
-    inspector = inspect(engine)
 
     # 检查表是否存在
-    if table_name not in inspector.get_table_names():
+    if not schema_catalog.has_table(db_name, table_name):
         # 如果表不存在，创建表
-        df.head(0).to_sql(table_name, con=engine, if_exists='fail', index=False)
+        df.head(0).to_sql(table_name, con=engine, if_exists='append', index=False)
+        schema_catalog.register_table(db_name, table_name, df.columns)
         print(f"表 '{table_name}' 不存在，已创建表。")
 
     # 将 DataFrame 写入 MySQL 数据库
@@ -49,6 +74,9 @@ def add_or_replace_df_mysql(df, db_name, table_name):
             VALUES ({', '.join(['%s'] * len(row))})
             """
             connection.execute(sql, tuple(row))
+    invalidate_column_store(db_name, table_name)
+    range_cache.invalidate(db_name, table_name)
+    _refresh_latest_quote(db_name, table_name)
 
     print(f"数据已成功追加到表 '{table_name}'，并且覆盖了重复主键的数据。")
 
@@ -61,9 +89,8 @@ def check_duplicate_primary_key(engine, table_name, df, primary_key, db_name):
 
 def add_columns_if_needed(engine, table_name, df):
     """ 根据 DataFrame 的列更新表结构，自动添加缺失的列 """
-    inspector = inspect(engine)
-    existing_columns = inspector.get_columns(table_name)
-    existing_column_names = [col['name'] for col in existing_columns]
+    db_name = engine.url.database
+    existing_column_names = schema_catalog.get_columns(db_name, table_name)
 
     for column in df.columns:
         if column not in existing_column_names:
@@ -71,6 +98,67 @@ def add_columns_if_needed(engine, table_name, df):
             add_column_sql = f'ALTER TABLE {table_name} ADD COLUMN {column} FLOAT'  # 根据需要设置数据类型
             with engine.connect() as connection:
                 connection.execute(text(add_column_sql))
+            schema_catalog.add_columns(db_name, table_name, [column])
+
+def merge_df_mysql(engine, table_name, df, primary_key, skip_null_updates=False):
+    """
+    将 DataFrame 批量合并到表中：主键已存在的行更新，其余行插入，全部在一个事务内完成。
+
+    数据先通过 executemany 写入临时表，再用一条 UPDATE ... JOIN 和一条 INSERT ... SELECT
+    合并，不需要读取目标表的主键列，也不要求目标表在主键列上建有唯一索引。
+
+    :param skip_null_updates: 为 True 时，DataFrame 中为空的字段不覆盖已有值
+    :return: (更新的行数, 新增的行数)
+    """
+    # 同一批数据中主键重复时保留最后一条
+    df = df[df[primary_key].notna()].drop_duplicates(subset=[primary_key], keep='last')
+    if df.empty:
+        return 0, 0
+
+    columns = list(df.columns)
+    target = quote_identifier(table_name)
+    staging = quote_identifier(f"_merge_{uuid.uuid4().hex[:12]}")
+    pk = quote_identifier(primary_key)
+    insert_columns = ', '.join(quote_identifier(col, escape_percent=True) for col in columns)
+    select_columns = ', '.join(f"s.{quote_identifier(col)}" for col in columns)
+    set_clause = ', '.join(
+        f"t.{quote_identifier(col)} = COALESCE(s.{quote_identifier(col)}, t.{quote_identifier(col)})"
+        if skip_null_updates else f"t.{quote_identifier(col)} = s.{quote_identifier(col)}"
+        for col in columns if col != primary_key
+    )
+
+    arrays = column_arrays(df)
+    raw_conn = engine.raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        try:
+            cursor.execute(f"CREATE TEMPORARY TABLE {staging} LIKE {target}")
+            stage_sql = (f"INSERT INTO {staging} ({insert_columns}) "
+                         f"VALUES ({', '.join(['%s'] * len(columns))})")
+            for start in range(0, len(df), BULK_CHUNK_SIZE):
+                cursor.executemany(stage_sql, list(zip(*(values[start:start + BULK_CHUNK_SIZE] for values in arrays))))
+
+            updated = 0
+            if set_clause:
+                updated = cursor.execute(
+                    f"UPDATE {target} t JOIN {staging} s ON t.{pk} = s.{pk} SET {set_clause}")
+            inserted = cursor.execute(
+                f"INSERT INTO {target} ({', '.join(quote_identifier(col) for col in columns)}) "
+                f"SELECT {select_columns} FROM {staging} s "
+                f"LEFT JOIN {target} t ON t.{pk} = s.{pk} WHERE t.{pk} IS NULL")
+            raw_conn.commit()
+        finally:
+            # 临时表属于连接，连接会回到连接池，需显式删除
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+            cursor.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    range_cache.invalidate(engine.url.database, table_name)
+    _refresh_latest_quote(engine.url.database, table_name)
+    return updated, inserted
 
 def add_data_mysql(data, table_name, db_name, primary_key):
     # 将数据转换为 DataFrame
@@ -78,35 +166,15 @@ def add_data_mysql(data, table_name, db_name, primary_key):
     print(df)
     # 创建数据库连接
     engine = create_db_connection(db_name)
-    inspector = inspect(engine)
     # 检查表是否存在，如果不存在则创建表
-    if table_name not in inspector.get_table_names():
-        df.head(0).to_sql(table_name, con=engine, if_exists='fail', index=False)
+    if not schema_catalog.has_table(db_name, table_name):
+        df.head(0).to_sql(table_name, con=engine, if_exists='append', index=False)
+        schema_catalog.register_table(db_name, table_name, df.columns)
         print(f"表 '{table_name}' 不存在，已创建表。")
     add_columns_if_needed(engine, table_name, df)
-    # 检查重复主键
-    existing_keys = pd.read_sql(f"SELECT {primary_key} FROM {table_name}", con=engine)
-    duplicates = df[df[primary_key].isin(existing_keys[primary_key])]
-
-    # 保存不重复的记录
-    if not duplicates.empty:
-        print(f"以下主键在数据库中已存在，将处理这些记录: {duplicates[primary_key].tolist()}")
-        # 进行更新操作
-        for index, row in duplicates.iterrows():
-            # 检查并更新数据
-            set_clause = ', '.join([f'{col} = {repr(row[col])}' for col in df.columns if col != primary_key])
-            update_sql = f"""
-            UPDATE {table_name} 
-            SET {set_clause} 
-            WHERE {primary_key} = {repr(row[primary_key])}
-            """
-            with engine.begin() as connection:
-                connection.execute(text(update_sql))
-        # 从原始DataFrame中删除已经存在的记录
-        df = df[~df[primary_key].isin(duplicates[primary_key])]
-
-    # 将新的（非重复）数据插入到数据库中，如果表存在则追加
-    df.to_sql(name=table_name, con=engine, if_exists='append', index=False)
+    # 主键已存在的记录更新，其余记录插入
+    updated, inserted = merge_df_mysql(engine, table_name, df, primary_key)
+    print(f"表 '{table_name}' 更新 {updated} 条记录，新增 {inserted} 条记录。")
 
 def add_json_mysql(json_data, table_name, db_name, primary_key):
     # 检查 json_data 是否是字符串（如果是 JSON 字符串就解析）
@@ -128,48 +196,19 @@ def add_json_mysql(json_data, table_name, db_name, primary_key):
 
     # 创建数据库连接
     engine = create_db_connection(db_name)
-    inspector = inspect(engine)
 
     # 检查表是否存在，如果不存在则创建表
-    if table_name not in inspector.get_table_names():
-        df.head(0).to_sql(table_name, con=engine, if_exists='fail', index=False)
+    if not schema_catalog.has_table(db_name, table_name):
+        df.head(0).to_sql(table_name, con=engine, if_exists='append', index=False)
+        schema_catalog.register_table(db_name, table_name, df.columns)
         print(f"表 '{table_name}' 不存在，已创建表。")
 
     # 添加缺失的列
     add_columns_if_needed(engine, table_name, df)
 
-    # 检查重复主键
-    existing_keys = pd.read_sql(f"SELECT `{primary_key}` FROM `{table_name}`", con=engine)
-    duplicates = df[df[primary_key].isin(existing_keys[primary_key])]
-
-    # 处理重复主键记录
-    if not duplicates.empty:
-        print(f"以下主键在数据库中已存在，将处理这些记录: {duplicates[primary_key].tolist()}")
-
-        # 进行更新操作
-        for index, row in duplicates.iterrows():
-            set_clause = ', '.join([f'`{col}` = {repr(row[col])}' for col in df.columns if col != primary_key and pd.notna(row[col])])
-
-            if set_clause:  # 确保有字段需要更新
-                update_sql = f"""
-                UPDATE `{table_name}` 
-                SET {set_clause} 
-                WHERE `{primary_key}` = {repr(row[primary_key])}
-                """
-                with engine.begin() as connection:
-                    connection.execute(text(update_sql.strip()))
-            else:
-                print(f"主键 '{row[primary_key]}' 的记录没有需要更新的字段，跳过更新。")
-
-        # 从原始 DataFrame 中删除已经存在的记录
-        df = df[~df[primary_key].isin(duplicates[primary_key])]
-
-    # 将新的（非重复）数据插入到数据库中，如果表存在则追加
-    if not df.empty:
-        df.to_sql(name=table_name, con=engine, if_exists='append', index=False)
-        print(f"已成功插入新数据到 '{table_name}' 表。")
-    else:
-        print("没有新数据需要插入。")
+    # 主键已存在的记录只更新非空字段，其余记录插入
+    updated, inserted = merge_df_mysql(engine, table_name, df, primary_key, skip_null_updates=True)
+    print(f"表 '{table_name}' 更新 {updated} 条记录，新增 {inserted} 条记录。")
 
 def replace_json_mysql(json_data, table_name, db_name, primary_key):
     # 检查 json_data 是否是字符串（如果是 JSON 字符串就解析）
@@ -191,11 +230,11 @@ def replace_json_mysql(json_data, table_name, db_name, primary_key):
 
     # 创建数据库连接
     engine = create_db_connection(db_name)
-    inspector = inspect(engine)
 
     # 检查表是否存在，如果不存在则创建表
-    if table_name not in inspector.get_table_names():
-        df.head(0).to_sql(table_name, con=engine, if_exists='fail', index=False)
+    if not schema_catalog.has_table(db_name, table_name):
+        df.head(0).to_sql(table_name, con=engine, if_exists='append', index=False)
+        schema_catalog.register_table(db_name, table_name, df.columns)
         print(f"表 '{table_name}' 不存在，已创建表。")
 
     # 清空表内容
@@ -205,6 +244,7 @@ def replace_json_mysql(json_data, table_name, db_name, primary_key):
 
     # 将新数据插入到数据库中
     df.to_sql(name=table_name, con=engine, if_exists='append', index=False)
+    range_cache.invalidate(db_name, table_name)
     print(f"已成功插入新数据到 '{table_name}' 表。")
 
 def delete_json_mysql(primary_key_value, table_name, db_name, primary_key):
@@ -235,6 +275,7 @@ def delete_json_mysql(primary_key_value, table_name, db_name, primary_key):
         delete_sql = f"DELETE FROM `{table_name}` WHERE `{primary_key}` = :pk"
         connection.execute(text(delete_sql), {'pk': primary_key_value})
         print(f"记录 {primary_key_value} 已成功删除。")
+    range_cache.invalidate(db_name, table_name)
 
 
 def delete_rows_from_table_mysql(table_name, db_name, primary_key_column, primary_keys):
@@ -248,16 +289,30 @@ def delete_rows_from_table_mysql(table_name, db_name, primary_key_column, primar
         with engine.begin() as connection:  # 确保自动提交
             result = connection.execute(text(delete_rows_sql), {"primary_key_values": tuple(primary_keys)})
             print(f"成功删除表 '{table_name}' 中主键值为 {primary_keys} 的行")
+        invalidate_column_store(db_name, table_name)
+        range_cache.invalidate(db_name, table_name)
+        _refresh_latest_quote(db_name, table_name)
     except Exception as e:
         print(f"删除行失败: {e}")
 
 def read_table_df_mysql(table_name, db_name):
     """ 从 MySQL 读取特定股票数据 """
+    if long_table_for(db_name, table_name):
+        return read_stock_history(db_name, table_name)
     engine = create_db_connection(db_name)
     query = f"SELECT * FROM `{table_name}`"
     df = pd.read_sql(query, con=engine)
     return df
 
+def table_date_stats(table_name, db_name):
+    """ 股票表在 MySQL 中的 (最大日期, 日期数)，用于校验本地列式副本 """
+    if long_table_for(db_name, table_name):
+        return stock_history_stats(db_name, table_name)
+    engine = create_db_connection(db_name)
+    with engine.connect() as connection:
+        return tuple(connection.execute(text(
+            f"SELECT MAX(`日期`), COUNT(DISTINCT `日期`) FROM {quote_identifier(table_name)}")).one())
+
 def read_specific_columns_from_mysql( db_name,table_name, columns):
     """ 从 MySQL 读取特定列的数据 """
     engine = create_db_connection(db_name)
@@ -267,6 +322,23 @@ def read_specific_columns_from_mysql( db_name,table_name, columns):
     return df
 
 def read_table_range_df_mysql(table_name, db_name, primary_key, start_value, end_value, columns=None):
+    """ 按主键范围读取数据；按日期读取时经过进程内的范围缓存 """
+    if primary_key == '日期':
+        return range_cache.read(
+            db_name, table_name, primary_key, start_value, end_value, columns,
+            loader=lambda: _read_table_range(table_name, db_name, primary_key, start_value, end_value, columns))
+    return _read_table_range(table_name, db_name, primary_key, start_value, end_value, columns)
+
+def _read_table_range(table_name, db_name, primary_key, start_value, end_value, columns=None):
+    if primary_key == '日期' and column_store_enabled(db_name, table_name):
+        # 优先读取本地列式副本，副本不存在或与 MySQL 不一致时从 MySQL 读取整张表并保存
+        df = read_column_store_range(db_name, table_name, start_value, end_value, columns,
+                                     loader=lambda: read_table_df_mysql(table_name, db_name),
+                                     source_stats=lambda: table_date_stats(table_name, db_name))
+        if df is not None:
+            return df
+    if primary_key == '日期' and long_table_for(db_name, table_name):
+        return read_stock_history(db_name, table_name, start_value, end_value, columns)
     engine = create_db_connection(db_name)
 
     # 如果没有传入列名，默认为 '*'
@@ -330,41 +402,120 @@ def read_matching_rows_from_mysql(table_name, partial_stock_code, db_name, colum
     df = pd.read_sql(query, con=engine, params=params)
     return df
 
-def read_last_row_mysql(table_names, db_name, columns=None, order_by=None):
-    engine = create_db_connection(db_name)
-    last_rows = []
+# read_last_rows_snapshot_mysql 返回结果中的状态列
+SNAPSHOT_STATUS_COLUMN = '_status'
 
-    # 如果没有指定列，则默认查询所有列
-    columns_str = "*" if columns is None else ", ".join([f"`{col}`" for col in columns])
 
-    for table_name in table_names:
-        # 构造查询语句，允许用户传入排序列。如果没有传入，则不排序。
-        query = f"SELECT {columns_str} FROM `{table_name}`"
+def _fetch_last_rows(engine, table_names, columns_str, order_by):
+    """一条 UNION ALL 查询读取一批表（列相同）的最后一行，返回 {表名: 行字典}"""
+    parts = []
+    params = {}
+    for i, table_name in enumerate(table_names):
+        part = f"(SELECT :t{i} AS `__table__`, {columns_str} FROM `{table_name}` t"
         if order_by:
-            query += f" ORDER BY `{order_by}` DESC"
-        query += " LIMIT 1"
+            part += f" ORDER BY `{order_by}` DESC"
+        parts.append(part + " LIMIT 1)")
+        params[f"t{i}"] = table_name
+    with engine.connect() as connection:
+        result = connection.execute(text(" UNION ALL ".join(parts)), params)
+        keys = list(result.keys())
+        return {row[0]: dict(zip(keys[1:], row[1:])) for row in result.fetchall()}
+
 
+def read_last_rows_snapshot_mysql(table_names, db_name, columns=None, order_by=None, chunk_size=200, max_workers=4):
+    """
+    批量读取多张表的最后一行（按 order_by 倒序后的第一行）。
+
+    每 chunk_size 张表合并为一条 UNION ALL 查询，各批次通过连接池并发执行；
+    某一批失败时（例如个别表缺少列）退回逐表查询，不影响其他表。
+
+    :return: 与 table_names 顺序一一对应的 DataFrame，附加 _status 列：
+             'ok' 有数据，'empty' 表存在但无数据，'missing_table' 表不存在，'error' 查询失败
+    """
+    table_names = [str(name) for name in table_names]
+    engine = create_db_connection(db_name)
+
+    rows = {}
+    failed = set()
+    if long_table_for(db_name) and order_by == '日期':
+        # 长表布局下一次查询即可取得全部股票的最新一行，长表中没有数据的股票视为表不存在
+        existing = []
+        stock_codes = [name for name in dict.fromkeys(table_names) if long_table_for(db_name, name)]
         try:
-            last_row = pd.read_sql(query, con=engine)
-            if last_row.empty:  # 如果查询结果为空（表有但无数据）
-                empty_row = {col: 0 for col in columns} if columns else {}
-                last_rows.append(pd.DataFrame([empty_row], columns=columns))
-            else:
-                last_rows.append(last_row)
+            rows = read_latest_rows(db_name, stock_codes, columns)
         except Exception as e:
-            print(f"查询表 {table_name} 时发生错误: {e}")
-            # 在发生错误时返回一个0数据行
-            empty_row = {col: 0 for col in columns} if columns else {}
-            last_rows.append(pd.DataFrame([empty_row], columns=columns))
-
-    # 根据请求的表名数量确保返回的行数一致
-    while len(last_rows) < len(table_names):
-        empty_row = {col: 0 for col in columns} if columns else {}
-        last_rows.append(pd.DataFrame([empty_row], columns=columns))
-
-    # 合并所有最后一行数据，并确保列顺序一致
-    result_df = pd.concat(last_rows, ignore_index=True)
-    if columns:
-        result_df = result_df[columns]  # 重新排列列以确保顺序一致
+            print(f"查询长表最新行情时发生错误: {e}")
+            failed.update(stock_codes)
+        chunks = []
+    else:
+        existing = [name for name in dict.fromkeys(table_names) if schema_catalog.has_table(db_name, name)]
+        # UNION ALL 要求各部分的列一致：按要查询的列分组，未指定列时使用表结构缓存中各表的全部列
+        groups = {}
+        for name in existing:
+            table_columns = columns if columns is not None else schema_catalog.get_columns(db_name, name)
+            groups.setdefault(tuple(table_columns), []).append(name)
+        chunks = [(names[i:i + chunk_size], ", ".join([f"t.{quote_identifier(col)}" for col in group_columns]))
+                  for group_columns, names in groups.items() for i in range(0, len(names), chunk_size)]
+
+    def fetch(item):
+        chunk, columns_str = item
+        try:
+            return _fetch_last_rows(engine, chunk, columns_str, order_by), set()
+        except Exception as e:
+            print(f"批量查询 {len(chunk)} 张表失败，改为逐表查询: {e}")
+        chunk_rows, chunk_failed = {}, set()
+        for table_name in chunk:
+            try:
+                chunk_rows.update(_fetch_last_rows(engine, [table_name], columns_str, order_by))
+            except Exception as e:
+                print(f"查询表 {table_name} 时发生错误: {e}")
+                chunk_failed.add(table_name)
+        return chunk_rows, chunk_failed
+
+    if chunks:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+            for chunk_rows, chunk_failed in executor.map(fetch, chunks):
+                rows.update(chunk_rows)
+                failed.update(chunk_failed)
+
+    if columns is None:
+        # 未指定列时按首次出现的顺序合并各表的列
+        columns = list(dict.fromkeys(col for row in rows.values() for col in row))
+
+    records, statuses = [], []
+    for table_name in table_names:
+        row = rows.get(table_name)
+        if row is not None:
+            status = 'ok'
+        elif table_name in failed:
+            status = 'error'
+        elif table_name in existing:
+            status = 'empty'
+        else:
+            status = 'missing_table'
+        records.append(row or {})
+        statuses.append(status)
+
+    result_df = pd.DataFrame.from_records(records, columns=columns)
+    result_df[SNAPSHOT_STATUS_COLUMN] = statuses
     return result_df
 
+
+def read_last_row_mysql(table_names, db_name, columns=None, order_by=None):
+    """
+    读取多张表的最后一行，返回行数与 table_names 一致。
+
+    没有数据（表不存在、为空或查询失败）的行在指定 columns 时填 0，与原有行为一致；
+    需要区分这些情况时使用 read_last_rows_snapshot_mysql。
+    """
+    snapshot = read_last_rows_snapshot_mysql(table_names, db_name, columns, order_by)
+    return fill_missing_snapshot_rows(snapshot, columns)
+
+
+def fill_missing_snapshot_rows(snapshot, columns=None):
+    """去掉 _status 列，没有数据的行在指定 columns 时填 0（页面按 0 显示缺失的股票）"""
+    missing = snapshot[SNAPSHOT_STATUS_COLUMN] != 'ok'
+    result_df = snapshot.drop(columns=[SNAPSHOT_STATUS_COLUMN])
+    if columns and missing.any():
+        result_df.loc[missing, columns] = 0
+    return result_df
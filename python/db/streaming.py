@@ -0,0 +1,73 @@
+# db/streaming.py
+import json
+import pandas as pd
+from sqlalchemy import text
+from db.connection import create_db_connection
+from db.long_store import LONG_CODE_COLUMN, long_table_for
+from db.sql_utils import PRICE_PRIMARY_KEY, quote_identifier
+
+# 每批读取的行数，内存占用只与批大小有关，与表的大小无关
+STREAM_CHUNK_SIZE = 10000
+
+
+def _stream_query(db_name, table_name, columns, order_by):
+    long_table = long_table_for(db_name, table_name)
+    if long_table:
+        # 长表布局：股票表对应长表中该股票的行
+        columns_str = '*' if columns is None else ', '.join(
+            quote_identifier(col) for col in columns if col != LONG_CODE_COLUMN)
+        query = (f"SELECT {columns_str} FROM {quote_identifier(long_table)} "
+                 f"WHERE {quote_identifier(LONG_CODE_COLUMN)} = :code")
+        return query + f" ORDER BY {quote_identifier(order_by or PRICE_PRIMARY_KEY)}", {'code': str(table_name)}, True
+    columns_str = '*' if columns is None else ', '.join(quote_identifier(col) for col in columns)
+    query = f"SELECT {columns_str} FROM {quote_identifier(table_name)}"
+    if order_by is not None:
+        query += f" ORDER BY {quote_identifier(order_by)}"
+    return query, {}, False
+
+
+def iter_rows_mysql(table_name, db_name, columns=None, chunk_size=STREAM_CHUNK_SIZE, order_by=None):
+    """
+    通过服务端游标（非缓冲）逐批读取整张表。
+
+    :return: 生成器，先产出列名列表，之后每次产出最多 chunk_size 行的元组列表
+    """
+    query, params, drop_code = _stream_query(db_name, table_name, columns, order_by)
+    engine = create_db_connection(db_name)
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_size) as connection:
+        result = connection.execute(text(query), params)
+        keys = list(result.keys())
+        code_index = keys.index(LONG_CODE_COLUMN) if drop_code and LONG_CODE_COLUMN in keys else None
+        if code_index is not None:
+            keys.pop(code_index)
+        yield keys
+        for rows in result.partitions(chunk_size):
+            if code_index is not None:
+                rows = [row[:code_index] + row[code_index + 1:] for row in rows]
+            yield rows
+
+
+def iter_table_chunks_mysql(table_name, db_name, columns=None, chunk_size=STREAM_CHUNK_SIZE, order_by=None):
+    """
+    逐批读取整张表，每批为一个 DataFrame，可代替 read_table_df_mysql 处理大表。
+
+    :param order_by: 可选，排序列（长表布局下默认按日期排序）
+    """
+    rows_iter = iter_rows_mysql(table_name, db_name, columns, chunk_size, order_by)
+    keys = next(rows_iter)
+    for rows in rows_iter:
+        yield pd.DataFrame.from_records(rows, columns=keys)
+
+
+def iter_table_records_mysql(table_name, db_name, columns=None, chunk_size=STREAM_CHUNK_SIZE, order_by=None):
+    """逐批读取整张表，每批为 [{列名: 值}, ...]"""
+    rows_iter = iter_rows_mysql(table_name, db_name, columns, chunk_size, order_by)
+    keys = next(rows_iter)
+    for rows in rows_iter:
+        yield [dict(zip(keys, row)) for row in rows]
+
+
+def iter_table_ndjson_mysql(table_name, db_name, columns=None, chunk_size=STREAM_CHUNK_SIZE, order_by=None):
+    """逐批读取整张表并编码为 NDJSON（每行一条 JSON 记录），用于 HTTP 流式响应"""
+    for records in iter_table_records_mysql(table_name, db_name, columns, chunk_size, order_by):
+        yield ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in records)
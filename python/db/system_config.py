@@ -0,0 +1,80 @@
+# db/system_config.py
+import os
+import threading
+import time
+from sqlalchemy import text
+from db.connection import create_db_connection
+from data_processor.srt2list import str2list
+
+SYSTEM_DB_NAME = 'system'
+SYSTEM_TABLE_NAME = 'system'
+SYSTEM_MATCH_COLUMN = 'config_name'
+SYSTEM_VALUE_COLUMN = 'config_value'
+
+
+class SystemConfig:
+    """
+    系统配置缓存：一次查询读取整张 system 表，之后的配置项查找都在内存中完成。
+
+    缓存超过 ttl 秒后在下次访问时重新加载；通过 /api/update-configs 修改配置后调用 invalidate 立即失效。
+    """
+
+    def __init__(self, db_name=SYSTEM_DB_NAME, table_name=SYSTEM_TABLE_NAME, ttl=60):
+        self.db_name = db_name
+        self.table_name = table_name
+        self.ttl = ttl
+        self._values = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        values = self._values
+        if values is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return values
+        with self._lock:
+            if self._values is None or time.monotonic() - self._loaded_at >= self.ttl:
+                engine = create_db_connection(self.db_name)
+                query = text(f"SELECT `{SYSTEM_MATCH_COLUMN}`, `{SYSTEM_VALUE_COLUMN}` FROM `{self.table_name}`")
+                with engine.connect() as connection:
+                    self._values = {name: value for name, value in connection.execute(query)}
+                self._loaded_at = time.monotonic()
+            return self._values
+
+    def get(self, config_key, default=None):
+        """配置项的原始值，不存在时返回 default"""
+        return self._load().get(config_key, default)
+
+    def get_list(self, config_key):
+        """以逗号分隔的配置项解析为列表，不存在或为空时返回空列表"""
+        value = self.get(config_key)
+        if value is None or value == '':
+            return []
+        return str2list(value)
+
+    def get_int(self, config_key, default=None):
+        """整数配置项，不存在或无法解析时返回 default"""
+        try:
+            return int(self.get(config_key))
+        except (TypeError, ValueError):
+            return default
+
+    def stock_list(self):
+        """需要更新的股票代码列表（配置项 stock_list）"""
+        return self.get_list('stock_list')
+
+    def all(self):
+        """全部配置项 {config_name: config_value}"""
+        return dict(self._load())
+
+    def invalidate(self):
+        """清除缓存，下次访问时重新读取 system 表"""
+        with self._lock:
+            self._values = None
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+
+system_config = SystemConfig()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=system_config._after_fork)
@@ -0,0 +1,134 @@
+# db/watermarks.py
+import threading
+import pandas as pd
+from sqlalchemy import text
+from db.connection import create_db_connection
+from db.schema_catalog import schema_catalog
+from db.stock_operations import SNAPSHOT_STATUS_COLUMN, read_last_rows_snapshot_mysql
+from db.sql_utils import PRICE_PRIMARY_KEY
+
+# 增量更新水位：每只股票已写入的最后一个交易日和最近一次复权因子的校验值，与行情表位于同一数据库。
+# 行情写入时在同一事务中更新 last_date，增量更新据此一次性规划各股票需要请求的日期范围，
+# 不再为每只股票单独查询历史表的最后一行。
+WATERMARKS_TABLE = 'ingest_watermarks'
+WATERMARK_CODE = 'code'
+WATERMARK_DATE = 'last_date'
+WATERMARK_CHECKSUM = 'factor_checksum'
+
+_create_lock = threading.Lock()
+
+
+def ensure_watermarks_table(db_name):
+    if schema_catalog.has_table(db_name, WATERMARKS_TABLE):
+        return
+    with _create_lock:
+        engine = create_db_connection(db_name)
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS `{WATERMARKS_TABLE}` ("
+                f"`{WATERMARK_CODE}` VARCHAR(16) NOT NULL, `{WATERMARK_DATE}` DATE NULL, "
+                f"`{WATERMARK_CHECKSUM}` VARCHAR(64) NULL, "
+                f"PRIMARY KEY (`{WATERMARK_CODE}`)"
+                f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"))
+        schema_catalog.invalidate(db_name, WATERMARKS_TABLE)
+
+
+def watermark_statement(db_name, stock_code, df, replace=False):
+    """
+    返回 (sql, params)，将 stock_code 的水位更新为 df 中最新的日期，传给写入函数的 extra_statements。
+
+    :param replace: 全量更新时直接设为 df 的最新日期；增量更新时只会前移，不会后退
+    """
+    ensure_watermarks_table(db_name)
+    last_date = pd.to_datetime(df[PRICE_PRIMARY_KEY]).max().date()
+    update = f"VALUES(`{WATERMARK_DATE}`)" if replace else \
+        f"GREATEST(COALESCE(`{WATERMARK_DATE}`, VALUES(`{WATERMARK_DATE}`)), VALUES(`{WATERMARK_DATE}`))"
+    sql = (f"INSERT INTO `{WATERMARKS_TABLE}` (`{WATERMARK_CODE}`, `{WATERMARK_DATE}`) VALUES (%s, %s) "
+           f"ON DUPLICATE KEY UPDATE `{WATERMARK_DATE}` = {update}")
+    return sql, (str(stock_code), last_date)
+
+
+def bulk_watermark_statement(db_name, last_dates):
+    """
+    返回 (sql, params)，一条语句把多只股票的水位前移到 last_dates（{股票代码: date}）
+
+    用于一次写入多只股票的场景（例如全市场当日行情），语句长度与股票数量成正比。
+    """
+    ensure_watermarks_table(db_name)
+    values = ', '.join(['(%s, %s)'] * len(last_dates))
+    sql = (f"INSERT INTO `{WATERMARKS_TABLE}` (`{WATERMARK_CODE}`, `{WATERMARK_DATE}`) VALUES {values} "
+           f"ON DUPLICATE KEY UPDATE `{WATERMARK_DATE}` = "
+           f"GREATEST(COALESCE(`{WATERMARK_DATE}`, VALUES(`{WATERMARK_DATE}`)), VALUES(`{WATERMARK_DATE}`))")
+    params = tuple(value for code, last_date in last_dates.items() for value in (str(code), last_date))
+    return sql, params
+
+
+def checksum_statement(db_name, stock_code, checksum):
+    """返回 (sql, params)，记录 stock_code 最近一次写入的复权因子校验值"""
+    ensure_watermarks_table(db_name)
+    sql = (f"INSERT INTO `{WATERMARKS_TABLE}` (`{WATERMARK_CODE}`, `{WATERMARK_CHECKSUM}`) VALUES (%s, %s) "
+           f"ON DUPLICATE KEY UPDATE `{WATERMARK_CHECKSUM}` = VALUES(`{WATERMARK_CHECKSUM}`)")
+    return sql, (str(stock_code), checksum)
+
+
+def clear_watermarks(db_name, stock_codes):
+    """
+    清空水位日期（例如全量更新替换原表之前），之后的增量更新会从历史表重新读取。
+
+    只把 last_date 置空，保留 factor_checksum：local 模式全量更新时复权因子和校验值在替换行情表之前已经写入，
+    删除整行会丢失校验值，下次增量更新就无法发现期间的除权除息。
+    """
+    if not stock_codes or not schema_catalog.has_table(db_name, WATERMARKS_TABLE):
+        return
+    engine = create_db_connection(db_name)
+    with engine.begin() as connection:
+        connection.execute(text(f"UPDATE `{WATERMARKS_TABLE}` SET `{WATERMARK_DATE}` = NULL "
+                                f"WHERE `{WATERMARK_CODE}` IN :codes"),
+                           {'codes': tuple(str(code) for code in stock_codes)})
+
+
+def read_watermarks(db_name, stock_codes):
+    """
+    一次查询读取多只股票的水位。
+
+    没有水位记录（或 last_date 为空）的股票从历史表的最后一行补齐并写回水位表，之后不再需要读取历史表。
+    :return: {股票代码: {'last_date': date 或 None, 'factor_checksum': str 或 None}}，
+             历史表不存在或为空的股票 last_date 为 None
+    """
+    stock_codes = list(dict.fromkeys(str(code) for code in stock_codes))
+    watermarks = {}
+    if stock_codes and schema_catalog.has_table(db_name, WATERMARKS_TABLE):
+        engine = create_db_connection(db_name)
+        with engine.connect() as connection:
+            result = connection.execute(text(
+                f"SELECT `{WATERMARK_CODE}`, `{WATERMARK_DATE}`, `{WATERMARK_CHECKSUM}` FROM `{WATERMARKS_TABLE}` "
+                f"WHERE `{WATERMARK_CODE}` IN :codes"), {'codes': tuple(stock_codes)})
+            for code, last_date, checksum in result:
+                watermarks[code] = {WATERMARK_DATE: last_date, WATERMARK_CHECKSUM: checksum}
+
+    missing = [code for code in stock_codes if watermarks.get(code, {}).get(WATERMARK_DATE) is None]
+    if missing:
+        backfill = _backfill_watermarks(db_name, missing)
+        for code in missing:
+            watermarks.setdefault(code, {WATERMARK_DATE: None, WATERMARK_CHECKSUM: None})
+            watermarks[code][WATERMARK_DATE] = backfill.get(code)
+    return watermarks
+
+
+def _backfill_watermarks(db_name, stock_codes):
+    """从历史表的最后一行读取水位并写回水位表，返回 {股票代码: date}"""
+    snapshot = read_last_rows_snapshot_mysql(stock_codes, db_name, [PRICE_PRIMARY_KEY], PRICE_PRIMARY_KEY)
+    found = {}
+    for code, status, value in zip(stock_codes, snapshot[SNAPSHOT_STATUS_COLUMN], snapshot[PRICE_PRIMARY_KEY]):
+        if status == 'ok' and pd.notna(value):
+            found[code] = pd.to_datetime(value).date()
+    if found:
+        ensure_watermarks_table(db_name)
+        engine = create_db_connection(db_name)
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"INSERT INTO `{WATERMARKS_TABLE}` (`{WATERMARK_CODE}`, `{WATERMARK_DATE}`) VALUES (:code, :last_date) "
+                f"ON DUPLICATE KEY UPDATE `{WATERMARK_DATE}` = VALUES(`{WATERMARK_DATE}`)"),
+                [{'code': code, 'last_date': last_date} for code, last_date in found.items()])
+        print(f"已从历史表补齐 {len(found)} 只股票的更新水位")
+    return found
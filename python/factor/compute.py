@@ -0,0 +1,94 @@
+import inspect
+from db.column_store import enable_column_store
+from db.instrumentation import query_report
+from db.long_store import enable_long_format
+from db.operations import upsert_dataframe_to_mysql
+from db.stock_operations import read_table_range_df_mysql
+
+# 因子计算的子进程函数。子进程以 spawn 方式启动（见 app.py 的 compute_factor），只导入本模块，
+# 不导入 app.py（Flask、SocketIO 和 gevent 猴子补丁），传给子进程的参数和因子函数都必须可以 pickle：
+# 因子函数是 factor 包中模块级别的函数，按模块名和函数名 pickle。
+
+# 因子计算结果写入的数据库（回测从该库读取因子）
+FACTOR_RESULT_DB = 'factor'
+
+
+def init_factor_worker(long_tables, column_store_root, column_store_db_names):
+    """
+    子进程的初始化函数：spawn 启动的子进程不继承主进程的存储布局，按主进程的设置重新启用长表和本地列式副本。
+    :param long_tables: {db_name: 长表表名}，见 long_format_tables()
+    :param column_store_root: 本地列式副本目录，未启用时为 None
+    """
+    for db_name, table_name in long_tables.items():
+        enable_long_format(db_name, table_name)
+    if column_store_root:
+        enable_column_store(column_store_root, column_store_db_names)
+
+
+def process_parameters(parameters_str, df, columns, a, factor_function):
+    args = []
+    kwargs = {}
+
+    sig = inspect.signature(factor_function)
+    param_dict = sig.parameters
+
+    params_list = [p.strip() for p in parameters_str.split(',') if p.strip()]
+
+    for param in params_list:
+        if '=' in param:
+            key, value = [s.strip() for s in param.split('=', 1)]
+            if value.isdigit():
+                kwargs[key] = int(value)
+            else:
+                kwargs[key] = value.strip('"\'')
+        else:
+            if param == 'df':
+                args.append(df)
+            elif param == 'column':
+                column_name = a.get('column')
+                if not column_name:
+                    data_columns = [col for col in columns if col != '日期']
+                    if len(data_columns) == 1:
+                        column_name = data_columns[0]
+                    else:
+                        return {'error': '无法确定列名，请在参数中指定 column。'}, None
+                args.append(column_name)
+            else:
+                value = a.get(param)
+                if value is not None:
+                    args.append(value)
+                elif param in param_dict:
+                    default_value = param_dict[param].default
+                    if default_value is not inspect.Parameter.empty:
+                        args.append(default_value)
+                    else:
+                        return {'error': f'缺少必要参数 {param}。'}, None
+
+    return args, kwargs
+
+
+def compute_factor_for_stock(a, stock_code, db_name, columns, factor_function, parameters_str):
+    # 在子进程中运行，查询统计随结果返回给主进程汇总
+    with query_report(f'compute_factor {stock_code}', log=False) as report:
+        result = _compute_factor_for_stock(a, stock_code, db_name, columns, factor_function, parameters_str)
+    result['queries'] = report.summary()
+    return result
+
+
+def _compute_factor_for_stock(a, stock_code, db_name, columns, factor_function, parameters_str):
+    try:
+        # 从数据库读取股票数据
+        df = read_table_range_df_mysql(stock_code, db_name, '日期', '19900101', '20291101', columns)
+        # 处理函数参数
+        args, kwargs = process_parameters(parameters_str, df, columns, a, factor_function)
+        if isinstance(args, dict) and 'error' in args:
+            return dict(args, stock_code=stock_code, status='failed')
+
+        # 执行因子函数计算
+        df1 = factor_function(*args, **kwargs)
+        # 插入数据到 MySQL 数据库
+        upsert_dataframe_to_mysql(FACTOR_RESULT_DB, stock_code, df1, '日期')
+
+        return {'stock_code': stock_code, 'status': 'success'}
+    except Exception as e:
+        return {'stock_code': stock_code, 'status': 'failed', 'error': str(e)}
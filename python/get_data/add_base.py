@@ -1,31 +1,89 @@
-import akshare as ak
-from db.stock_operations import read_last_row_mysql, add_df_mysql
-from db.operations import read_matching_column
-from data_processor.formatted_date import formatted_date
+from db.price_schema import write_price_df_mysql
+from db.latest_quotes import discard_latest_quotes, update_latest_quote, read_latest_quotes_snapshot_mysql
+from db.stock_operations import SNAPSHOT_STATUS_COLUMN
+from db.watermarks import WATERMARK_CHECKSUM, WATERMARK_DATE, read_watermarks, watermark_statement
+from get_data.fetch_scheduler import get_fetch_scheduler
+from get_data.adjust import adjust_mode, fetch_locally_adjusted, qfq_changed, rewrite_remote_qfq
 import pandas as pd
-from datetime import timedelta
+from datetime import datetime, timedelta
+from functools import partial
+
+# 收盘时间（小时），此后当天的日线数据才视为可以获取
+MARKET_CLOSE_HOUR = 15
+# 没有历史数据的股票不做增量更新，报告为该状态，需要先全量获取
+MISSING_HISTORY_STATUS = '需全量获取'
+
+
+def latest_session_date(now=None):
+    """最近一个已收盘的交易日，按工作日计算（不识别节假日，节假日后的第一次更新仍会请求一次远程接口）"""
+    now = now or datetime.now()
+    day = now.date() if now.hour >= MARKET_CLOSE_HOUR else now.date() - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def plan_incremental_update(stock_codes, db_name, as_of=None):
+    """
+    一次性规划增量更新：一条查询读取全部股票的水位，决定每只股票需要请求的起始日期。
+
+    :param as_of: 视为最新交易日的日期，默认为 latest_session_date()
+    :return: {'pending': {股票代码: 起始日期 'YYYYMMDD'}, 'up_to_date': [...], 'missing': [...],
+              'checksums': {股票代码: 复权因子校验值}, 'references': {股票代码: (日期, 前复权收盘价)}}，
+             missing 为没有历史数据的股票（需先全量获取）；checksums 和 references 用于检测除权除息
+    """
+    as_of = as_of or latest_session_date()
+    watermarks = read_watermarks(db_name, stock_codes)
+    plan = {'pending': {}, 'up_to_date': [], 'missing': [], 'checksums': {}, 'references': {}}
+    for stock_code in dict.fromkeys(str(code) for code in stock_codes):
+        last_date = watermarks[stock_code][WATERMARK_DATE]
+        if last_date is None:
+            plan['missing'].append(stock_code)
+        elif last_date >= as_of:
+            plan['up_to_date'].append(stock_code)
+        else:
+            plan['pending'][stock_code] = (last_date + timedelta(days=1)).strftime('%Y%m%d')
+            plan['checksums'][stock_code] = watermarks[stock_code][WATERMARK_CHECKSUM]
+    if plan['pending'] and adjust_mode() == 'remote':
+        plan['references'] = read_qfq_references(db_name, list(plan['pending']))
+    print(f"增量更新计划：待更新 {len(plan['pending'])} 只，已是最新 {len(plan['up_to_date'])} 只，"
+          f"无历史数据 {len(plan['missing'])} 只")
+    return plan
+
+
+def read_qfq_references(db_name, stock_codes):
+    """从 latest_quotes 一次读取各股票最后保存的前复权收盘价，{股票代码: (日期, 收盘_前复权)}"""
+    try:
+        snapshot = read_latest_quotes_snapshot_mysql(stock_codes, db_name, ['日期', '收盘_前复权'])
+    except Exception as e:
+        print(f"读取前复权参考价失败，本次不检测除权除息: {e}")
+        return {}
+    references = {}
+    for code, status, day, close in zip(stock_codes, snapshot[SNAPSHOT_STATUS_COLUMN],
+                                        snapshot['日期'], snapshot['收盘_前复权']):
+        if status == 'ok' and pd.notna(day):
+            references[code] = (pd.to_datetime(day).date(), close)
+    return references
+
 
 def get_recent_date(stock_code, db_name):
     """获取股票的最近更新日期并计算起始查询日期"""
-    last_row = read_last_row_mysql([stock_code], db_name, ['日期'], '日期')
+    last_date = read_watermarks(db_name, [stock_code])[str(stock_code)][WATERMARK_DATE]
 
-    if last_row.empty:
+    if last_date is None:
         raise ValueError(f"未找到股票 {stock_code} 的日期数据")
 
-    recent_date = formatted_date(f"{last_row['日期'].iloc[0]}")  # 格式化日期
-    return (pd.to_datetime(recent_date) + timedelta(days=1)).strftime('%Y%m%d')
+    return (last_date + timedelta(days=1)).strftime('%Y%m%d')
 
 
 def get_stock_data(stock_code, start_date, end_date, adjust):
     """获取并调整股票数据的列名"""
-    stock_data = ak.stock_zh_a_hist(
-        symbol=stock_code,
-        period="daily",
-        start_date=start_date,
-        end_date=end_date,
-        adjust=adjust
-    )
+    stock_data = get_fetch_scheduler().submit(stock_code, start_date, end_date, adjust).result()
+    return format_stock_data(stock_data, adjust)
 
+
+def format_stock_data(stock_data, adjust):
+    """调整股票数据的列名，没有数据时返回 None"""
     if stock_data is not None and not stock_data.empty:
         if adjust == "hfq":
             stock_data.columns = [f'{col}_后复权' if col not in ['日期', '股票代码'] else col for col in stock_data.columns]
@@ -45,20 +103,86 @@ def merge_stock_data(stock_code, stock_results, adjust_types):
     return merged_df.drop(columns=['股票代码'])  # 删除不需要的股票代码列
 
 
-def process_stock_code(stock_code, db_name, adjust_types, end_date, socketio):
-    """针对单个股票代码进行数据获取与处理"""
-    try:
-        start_date = get_recent_date(stock_code, db_name)
-    except ValueError as e:
-        print(e)
+def process_stock_code(stock_code, db_name, adjust_types, end_date, progress, start_date=None,
+                       previous_checksum=None, reference=None, loader=None):
+    """
+    针对单个股票代码进行数据获取与处理，start_date 为空时从水位读取
+
+    前复权历史会在每次除权除息后整体变化，只追加新行会留下过期的前复权列。
+    local 模式比较复权因子校验值（previous_checksum），remote 模式多请求上次保存的最后一个交易日，
+    与已保存的前复权收盘价（reference）比较；发生变化时只重建这只股票的复权列。
+    状态记录到 progress（ProgressReporter），由它合并推送。
+    """
+    if start_date is None:
+        try:
+            start_date = get_recent_date(stock_code, db_name)
+        except ValueError as e:
+            print(e)
+            return
+
+    if adjust_mode() == 'local':
+        # 只请求不复权行情和复权因子，复权列在本地计算
+        try:
+            merged_df = fetch_locally_adjusted(stock_code, start_date, end_date, db_name, previous_checksum)
+        except Exception as exc:
+            print(f"获取 {stock_code} 数据失败: {exc}")
+            progress.update(stock_code, '获取失败', exc)
+            return
+        if merged_df is None:
+            print(f"{stock_code} 没有新数据需要更新")
+            progress.update(stock_code, '已是最新数据')
+            return
+    else:
+        # 与上次保存的最后一个交易日重叠一天，用于检测前复权价格是否变化
+        overlap_date = (pd.to_datetime(start_date) - timedelta(days=1)).date()
+        merged_df = fetch_remote_adjusted(stock_code, overlap_date.strftime('%Y%m%d'), end_date, adjust_types, progress)
+        if merged_df is None:
+            return
+        dates = pd.to_datetime(merged_df['日期']).dt.date
+        overlap = merged_df[dates == overlap_date]
+        if reference is not None and reference[0] == overlap_date and not overlap.empty \
+                and qfq_changed(reference[1], overlap['收盘_前复权'].iloc[0]):
+            # 在写入新数据（推进水位）之前重建，重建失败时下次更新仍会检测到变化
+            print(f"{stock_code} 的前复权价格已变化，重新获取前复权历史")
+            try:
+                rewrite_remote_qfq(db_name, stock_code, end_date)
+            except Exception as exc:
+                print(f"重建 {stock_code} 前复权数据失败: {exc}")
+                progress.update(stock_code, '复权数据重建失败', exc)
+                return
+            progress.update(stock_code, '复权数据已重建')
+        merged_df = merged_df[dates > overlap_date]
+        if merged_df.empty:
+            print(f"{stock_code} 没有新数据需要更新")
+            progress.update(stock_code, '已是最新数据')
+            return
+
+    if loader is not None:
+        # 交给写入流水线与其他股票合并写入，获取线程继续请求下一只股票
+        loader.put(stock_code, merged_df, on_written=partial(report_written, progress))
         return
 
+    # 水位与行情在同一事务中提交
+    write_price_df_mysql(merged_df, db_name=db_name, table_name=stock_code,
+                         extra_statements=[watermark_statement(db_name, stock_code, merged_df)])
+    try:
+        update_latest_quote(db_name, stock_code, merged_df)
+    except Exception as e:
+        print(f"更新 {stock_code} 最新行情失败，改为从历史表读取: {e}")
+        discard_latest_quotes(db_name, [stock_code])
+    progress.update(stock_code, '完成')
+
+
+def fetch_remote_adjusted(stock_code, start_date, end_date, adjust_types, progress):
+    """分别请求各复权类型的行情并合并，没有新数据或数据不完整时返回 None"""
     stock_results = {}
     stock_fetched = False
 
-    for adjust in adjust_types:
+    # 各复权类型的请求同时提交，由调度器统一限速和重试
+    futures = get_fetch_scheduler().fetch_stock(stock_code, start_date, end_date, adjust_types)
+    for adjust, future in futures.items():
         try:
-            stock_data = get_stock_data(stock_code, start_date, end_date, adjust)
+            stock_data = format_stock_data(future.result(), adjust)
 
             if stock_data is not None:
                 stock_results[(stock_code, adjust)] = stock_data
@@ -70,26 +194,53 @@ def process_stock_code(stock_code, db_name, adjust_types, end_date, socketio):
 
     if not stock_fetched:
         print(f"{stock_code} 没有新数据需要更新")
-        socketio.emit('stock_update', {'stock_code': stock_code, 'status': '已是最新数据'})
+        progress.update(stock_code, '已是最新数据')
         return
 
     if not all((stock_code, adjust) in stock_results for adjust in adjust_types):
         print(f"{stock_code} 未能获取所有类型的调整数据")
+        progress.update(stock_code, '获取失败', '未能获取所有类型的调整数据')
         return
 
-    merged_df = merge_stock_data(stock_code, stock_results, adjust_types)
-    add_df_mysql(merged_df, db_name=db_name, table_name=stock_code)
-    socketio.emit('stock_update', {'stock_code': stock_code, 'status': '完成'})
+    return merge_stock_data(stock_code, stock_results, adjust_types)
+
+
+def report_written(progress, stock_code, error):
+    """写入流水线的回调：记录一只股票的写入结果"""
+    if error is None:
+        progress.update(stock_code, '完成')
+    else:
+        print(f"写入 {stock_code} 数据失败: {error}")
+        progress.update(stock_code, '写入失败', error)
+
 
+def update_stock_data(stock_codes, db_name, progress, plan=None, loader=None):
+    """
+    从数据库和远程接口获取股票数据
 
-def update_stock_data(stock_codes, db_name, socketio):
-    """从数据库和远程接口获取股票数据"""
+    :param progress: ProgressReporter，记录每只股票的状态
+    :param plan: plan_incremental_update 的结果，多个任务共用同一份计划时传入；为空时按 stock_codes 规划。
+                 已是最新的股票不查询数据库，也不请求远程接口
+    :param loader: 可选，StagedLoader；传入时获取到的数据由写入流水线批量写入
+    """
     if not isinstance(stock_codes, list):
         stock_codes = [stock_codes]
+    if plan is None:
+        plan = plan_incremental_update(stock_codes, db_name)
 
     end_date = "20990909"
     adjust_types = ["", "qfq", "hfq"]
 
-    for stock_code in stock_codes:
-        process_stock_code(stock_code, db_name, adjust_types, end_date, socketio)
+    for stock_code in map(str, stock_codes):
+        if stock_code in plan['pending']:
+            process_stock_code(stock_code, db_name, adjust_types, end_date, progress,
+                               start_date=plan['pending'][stock_code],
+                               previous_checksum=plan['checksums'].get(stock_code),
+                               reference=plan['references'].get(stock_code),
+                               loader=loader)
+        elif stock_code in plan['up_to_date']:
+            progress.update(stock_code, '已是最新数据')
+        else:
+            print(f"未找到股票 {stock_code} 的日期数据")
+            progress.update(stock_code, MISSING_HISTORY_STATUS)
 
@@ -0,0 +1,132 @@
+import threading
+import numpy as np
+import pandas as pd
+from db.adjust_factors import HFQ_FACTOR_COLUMN, factor_checksum, write_adjust_factors
+from db.latest_quotes import refresh_latest_quotes
+from db.price_schema import write_price_df_mysql
+from db.stock_operations import read_table_range_df_mysql
+from get_data.fetch_scheduler import get_fetch_scheduler
+from get_data.sources import HFQ_FACTOR
+
+# 复权数据的获取方式：
+# remote：分别请求不复权、前复权、后复权三份完整行情（默认）
+# local：只请求不复权行情和后复权因子，前复权和后复权列在本地计算
+ADJUST_MODES = ('remote', 'local')
+_adjust_options = {'mode': 'remote'}
+_options_lock = threading.Lock()
+
+# 复权时按因子缩放的价格类列，其余列（成交量、成交额、振幅、涨跌幅、换手率）与不复权数据相同
+PRICE_COLUMNS = ['开盘', '收盘', '最高', '最低', '涨跌额']
+
+# 重建复权列时读取的完整历史范围
+HISTORY_START = '19900101'
+HISTORY_END = '20991231'
+
+# 同一交易日的前复权收盘价相差超过该值（元）时，认为期间发生了除权除息，已保存的前复权列需要重建
+QFQ_TOLERANCE = 0.005
+
+
+def set_adjust_mode(mode):
+    if mode not in ADJUST_MODES:
+        raise ValueError(f"不支持的复权数据获取方式: {mode}")
+    with _options_lock:
+        _adjust_options['mode'] = mode
+
+
+def adjust_mode():
+    return _adjust_options['mode']
+
+
+def derive_adjusted(raw_df, factors):
+    """
+    由不复权行情和后复权因子计算三种复权类型的行情，列名与分别请求三份数据后合并的结果一致。
+
+    后复权价格 = 不复权价格 × 当日的后复权因子；
+    前复权价格 = 不复权价格 × 当日的后复权因子 ÷ 最新的后复权因子。
+    :param raw_df: 不复权行情（akshare 原始列名）
+    :param factors: 复权因子，日期、hfq_factor 两列
+    """
+    raw_df = raw_df.drop(columns=['股票代码'], errors='ignore').copy()
+    raw_df['日期'] = pd.to_datetime(raw_df['日期']).astype('datetime64[ns]')
+    raw_df = raw_df.sort_values('日期').reset_index(drop=True)
+    value_columns = [col for col in raw_df.columns if col != '日期']
+
+    if factors is None or factors.empty:
+        # 没有除权除息记录，三种复权类型相同
+        hfq = pd.Series(1.0, index=raw_df.index)
+        latest_factor = 1.0
+    else:
+        factors = factors[['日期', HFQ_FACTOR_COLUMN]].copy()
+        factors['日期'] = pd.to_datetime(factors['日期']).astype('datetime64[ns]')
+        factors[HFQ_FACTOR_COLUMN] = factors[HFQ_FACTOR_COLUMN].astype(float)
+        factors = factors.sort_values('日期')
+        # 每个交易日使用不晚于该日的最近一次因子，早于第一条因子记录的日期使用第一条因子
+        hfq = pd.merge_asof(raw_df[['日期']], factors, on='日期', direction='backward')[HFQ_FACTOR_COLUMN]
+        hfq = hfq.fillna(factors[HFQ_FACTOR_COLUMN].iloc[0])
+        latest_factor = factors[HFQ_FACTOR_COLUMN].iloc[-1]
+
+    scaled = [col for col in value_columns if col in PRICE_COLUMNS]
+    result = {'日期': raw_df['日期'].dt.date}
+    for suffix, multiplier in (('不复权', None), ('前复权', hfq / latest_factor), ('后复权', hfq)):
+        for col in value_columns:
+            values = raw_df[col]
+            if multiplier is not None and col in scaled:
+                values = values * multiplier.to_numpy()
+            result[f'{col}_{suffix}'] = values.to_numpy()
+    return pd.DataFrame(result)
+
+
+def fetch_locally_adjusted(stock_code, start_date, end_date, db_name, previous_checksum=None):
+    """
+    local 模式：请求不复权行情和后复权因子，保存因子后在本地计算复权行情。
+
+    :param previous_checksum: 上次保存的因子校验值（水位表中的 factor_checksum）；
+                              与本次请求的因子不同时，先用新因子重建已保存历史的复权列
+    :return: 与三份数据合并后相同列的 DataFrame，没有新数据时返回 None
+    """
+    scheduler = get_fetch_scheduler()
+    raw_future = scheduler.submit(stock_code, start_date, end_date, "")
+    factor_future = scheduler.submit(stock_code, start_date, end_date, HFQ_FACTOR)
+    raw_df = raw_future.result()
+    factors = factor_future.result()
+    if factors is not None and not factors.empty:
+        if previous_checksum is not None and factor_checksum(factors) != previous_checksum:
+            print(f"{stock_code} 的复权因子已变化，重建历史复权列")
+            rewrite_local_adjusted(db_name, stock_code, factors)
+        # 因子在复权列重建之后保存，重建失败时下次更新仍会检测到变化
+        write_adjust_factors(db_name, stock_code, factors)
+    if raw_df is None or raw_df.empty:
+        return None
+    return derive_adjusted(raw_df, factors)
+
+
+def rewrite_local_adjusted(db_name, stock_code, factors):
+    """用新的复权因子和已保存的不复权列重新计算一只股票全部历史的前复权、后复权列，只写入这些列"""
+    history = read_table_range_df_mysql(stock_code, db_name, '日期', HISTORY_START, HISTORY_END)
+    raw_columns = [col for col in history.columns if col.endswith('_不复权')]
+    if history.empty or not raw_columns:
+        return
+    raw_df = history[['日期'] + raw_columns].rename(columns=lambda col: col[:-len('_不复权')] if col in raw_columns else col)
+    adjusted = derive_adjusted(raw_df, factors)
+    adjusted = adjusted[[col for col in adjusted.columns if not col.endswith('_不复权')]]
+    write_price_df_mysql(adjusted, db_name, stock_code)
+    # 改写的是已有日期的复权列，水位不变，需要显式刷新 latest_quotes
+    refresh_latest_quotes(db_name, [stock_code])
+
+
+def qfq_changed(stored_close, fetched_close):
+    """同一交易日已保存的和重新请求的前复权收盘价不一致，说明期间发生了除权除息"""
+    if stored_close is None or fetched_close is None or pd.isna(stored_close) or pd.isna(fetched_close):
+        return False
+    return not np.isclose(float(stored_close), float(fetched_close), rtol=0, atol=QFQ_TOLERANCE)
+
+
+def rewrite_remote_qfq(db_name, stock_code, end_date):
+    """remote 模式：重新请求一只股票的完整前复权历史，只覆盖已保存的前复权列"""
+    qfq_df = get_fetch_scheduler().submit(stock_code, HISTORY_START, end_date, "qfq").result()
+    if qfq_df is None or qfq_df.empty:
+        return
+    qfq_df = qfq_df.drop(columns=['股票代码'], errors='ignore')
+    qfq_df.columns = [f'{col}_前复权' if col != '日期' else col for col in qfq_df.columns]
+    write_price_df_mysql(qfq_df, db_name, stock_code)
+    refresh_latest_quotes(db_name, [stock_code])
@@ -0,0 +1,171 @@
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from get_data.sources import get_data_source
+
+# 行情接口的复权类型：不复权、前复权、后复权
+ADJUST_TYPES = ("", "qfq", "hfq")
+
+
+class TokenBucket:
+    """令牌桶限速：平均每秒 rate 个请求，最多允许 capacity 个突发请求"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _copy_on_result(shared):
+    """返回一个新的 Future，在共享的请求完成时得到结果的副本（或同样的异常）"""
+    future = Future()
+
+    def forward(done):
+        error = done.exception()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            result = done.result()
+            future.set_result(result.copy() if hasattr(result, 'copy') else result)
+
+    shared.add_done_callback(forward)
+    return future
+
+
+class FetchScheduler:
+    """
+    远程行情请求调度：全局令牌桶限速 + 并发上限 + 指数退避重试，并合并相同的进行中请求。
+
+    :param fetch: 实际请求函数 fetch(stock_code, start_date, end_date, adjust)，
+                  默认为请求时的共享数据源 get_data_source()
+    :param rate: 每秒请求数上限
+    :param burst: 允许的突发请求数
+    :param max_concurrency: 同时进行的请求数上限
+    :param max_retries: 失败后的最大重试次数
+    :param backoff_base: 第一次重试前的基础等待时间（秒），之后每次翻倍
+    :param backoff_max: 单次等待时间上限（秒）
+    """
+
+    def __init__(self, fetch=None, rate=5.0, burst=10, max_concurrency=8,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.fetch = fetch
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._bucket = TokenBucket(rate, burst)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='fetch')
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'deduplicated': 0,
+                          'seconds': 0.0}
+        self._started_at = time.monotonic()
+
+    def submit(self, stock_code, start_date, end_date, adjust=""):
+        """
+        提交一个请求，返回 Future；相同参数的请求仍在进行时合并为一次请求。
+
+        合并的请求共用一次远程调用，但每个调用方得到的是结果的副本，可以直接修改（例如重命名列）。
+        """
+        key = (stock_code, start_date, end_date, adjust)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._counters['deduplicated'] += 1
+                return _copy_on_result(future)
+            future = self._executor.submit(self._run, key)
+            self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return _copy_on_result(future)
+
+    def fetch_stock(self, stock_code, start_date, end_date, adjust_types=ADJUST_TYPES):
+        """同时提交一只股票各复权类型的请求，返回 {adjust: Future}"""
+        return {adjust: self.submit(stock_code, start_date, end_date, adjust) for adjust in adjust_types}
+
+    def _forget(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def _run(self, key):
+        for attempt in range(self.max_retries + 1):
+            self._bucket.acquire()
+            self._count('requests')
+            start_time = time.perf_counter()
+            try:
+                fetch = self.fetch if self.fetch is not None else get_data_source()
+                result = fetch(*key)
+            except Exception as exc:
+                self._count('seconds', time.perf_counter() - start_time)
+                if attempt == self.max_retries:
+                    self._count('failed')
+                    raise
+                self._count('retries')
+                # 指数退避 + 全抖动，避免大量请求同时重试
+                backoff = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                delay = random.uniform(0, backoff)
+                print(f"请求 {key[0]}（{key[3] or '不复权'}）失败: {exc}，{delay:.2f}s 后第 {attempt + 1} 次重试")
+                time.sleep(delay)
+            else:
+                self._count('seconds', time.perf_counter() - start_time)
+                self._count('succeeded')
+                return result
+
+    def stats(self):
+        """请求数、成功/失败/重试/合并次数、吞吐量（成功请求数/秒）和错误率（失败请求占比）"""
+        with self._lock:
+            counters = dict(self._counters)
+            in_flight = len(self._in_flight)
+        elapsed = time.monotonic() - self._started_at
+        finished = counters['succeeded'] + counters['failed']
+        counters.update({
+            'in_flight': in_flight,
+            'throughput': counters['succeeded'] / elapsed if elapsed > 0 else 0.0,
+            'error_rate': counters['failed'] / finished if finished else 0.0,
+            'attempt_error_rate': (counters['requests'] - counters['succeeded']) / counters['requests']
+            if counters['requests'] else 0.0,
+        })
+        return counters
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_fetch_scheduler():
+    """进程内共享的调度器，所有行情更新任务共用同一个限速和并发上限"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FetchScheduler()
+    return _scheduler
+
+
+def set_fetch_scheduler(scheduler):
+    """替换共享的调度器（例如使用不同的限速参数）；更换数据源使用 set_data_source"""
+    global _scheduler
+    with _scheduler_lock:
+        previous, _scheduler = _scheduler, scheduler
+    if previous is not None and previous is not scheduler:
+        previous.shutdown(wait=False)
@@ -1,17 +1,41 @@
 from datetime import datetime
-import akshare as ak
-from db import read_specific_columns_from_mysql, replace_df_mysql
+from db import read_specific_columns_from_mysql
+from db.price_schema import write_price_df_mysql
+from db.watermarks import watermark_statement
+from db.latest_quotes import discard_latest_quotes, update_latest_quote
+from db.reload_journal import (
+    RELOAD_DONE,
+    RELOAD_FAILED,
+    RELOAD_RUNNING,
+    mark_reload_state,
+    open_reload_journal,
+    reload_progress,
+)
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from get_data.fetch_scheduler import get_fetch_scheduler
+from get_data.adjust import adjust_mode, fetch_locally_adjusted
+from get_data.pipeline import StagedLoader
 import multiprocessing
 
-def fetch_and_push_stock(stock_code, db_name, start_date, end_date, sio):
-    """获取单个股票的历史行情数据并推送到 MySQL"""
+# 全量更新默认的起始日期
+HISTORY_START_DATE = '19900101'
 
+
+def fetch_stock_history(stock_code, db_name, start_date, end_date):
+    """获取单个股票三种复权类型合并后的历史行情"""
     print(f'开始抓取 {stock_code} 数据，日期范围: {start_date} 到 {end_date}')
-    try:
-        stock_df = ak.stock_zh_a_hist(stock_code, period="daily", start_date=start_date, end_date=end_date, adjust="")
-        stock_qfq_df = ak.stock_zh_a_hist(stock_code, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
-        stock_hfq_df = ak.stock_zh_a_hist(stock_code, period="daily", start_date=start_date, end_date=end_date, adjust="hfq")
+    if adjust_mode() == 'local':
+        # 只请求不复权行情和复权因子，复权列在本地计算
+        merged_df = fetch_locally_adjusted(stock_code, start_date, end_date, db_name)
+        if merged_df is None:
+            raise ValueError(f'{stock_code} 在 {start_date} 到 {end_date} 之间没有行情数据')
+    else:
+        # 三种复权类型同时请求，由调度器统一限速和重试
+        futures = get_fetch_scheduler().fetch_stock(stock_code, start_date, end_date, ("", "qfq", "hfq"))
+        stock_df = futures[""].result()
+        stock_qfq_df = futures["qfq"].result()
+        stock_hfq_df = futures["hfq"].result()
 
         # 为后复权数据列添加后缀 '_后复权'
         stock_hfq_df.columns = [f'{col}_后复权' if col not in ['日期', '股票代码'] else col for col in stock_hfq_df.columns]
@@ -22,27 +46,95 @@ def fetch_and_push_stock(stock_code, db_name, start_date, end_date, sio):
 
         # 删除股票代码列
         merged_df = merged_df.drop(columns=['股票代码'])
+    return merged_df
+
+
+def reload_stock(stock_code, db_name, start_date, end_date):
+    """获取单个股票的历史行情数据并整体替换原有数据；原子替换，失败时原数据不变，可以重复执行"""
+    merged_df = fetch_stock_history(stock_code, db_name, start_date, end_date)
 
-        # 将合并后的数据写入 MySQL
-        replace_df_mysql(merged_df, db_name=db_name, table_name=stock_code)
-        sio.emit('stock_update', {'stock_code': stock_code, 'status': 'completed'})
-        print(f'{stock_code} 处理完成')
+    # 将合并后的数据写入 MySQL
+    write_price_df_mysql(merged_df, db_name=db_name, table_name=stock_code, replace=True,
+                         extra_statements=[watermark_statement(db_name, stock_code, merged_df, replace=True)])
+    try:
+        update_latest_quote(db_name, stock_code, merged_df)
     except Exception as e:
-        print(f'{stock_code} 处理时发生错误: {e}')
-        sio.emit('stock_update', {'stock_code': stock_code, 'status': 'error', 'error': str(e)})
+        # 整体替换后最新一行的日期可能不变，只靠水位无法发现记录已过期，需要删除
+        print(f'{stock_code} 更新最新行情失败，改为从历史表读取: {e}')
+        discard_latest_quotes(db_name, [stock_code])
+    print(f'{stock_code} 处理完成')
+
 
-def get_stock_data(stock_list, db_name, start_date, end_date, sio):
+def fetch_and_push_stock(stock_code, db_name, start_date, end_date, progress, job=None, loader=None):
+    """
+    获取单个股票的历史行情数据并推送到 MySQL；指定 job 时在进度记录中登记状态
+
+    :param loader: 可选，StagedLoader；传入时由写入流水线批量写入，写入完成后再登记状态
+    """
+    if job is not None:
+        mark_reload_state(db_name, job, stock_code, RELOAD_RUNNING)
+    try:
+        if loader is not None:
+            merged_df = fetch_stock_history(stock_code, db_name, start_date, end_date)
+            loader.put(stock_code, merged_df, replace=True, on_written=partial(report_reloaded, db_name, job, progress))
+            return
+        reload_stock(stock_code, db_name, start_date, end_date)
+    except Exception as e:
+        report_reloaded(db_name, job, progress, stock_code, e)
+        return
+    report_reloaded(db_name, job, progress, stock_code, None)
+
+
+def report_reloaded(db_name, job, progress, stock_code, error):
+    """登记并记录一只股票的全量更新结果"""
+    if error is not None:
+        print(f'{stock_code} 处理时发生错误: {error}')
+        if job is not None:
+            mark_reload_state(db_name, job, stock_code, RELOAD_FAILED, error)
+        progress.update(stock_code, 'error', error)
+        return
+    if job is not None:
+        mark_reload_state(db_name, job, stock_code, RELOAD_DONE)
+    progress.update(stock_code, 'completed')
+
+
+def get_stock_data(stock_list, db_name, start_date, end_date, progress, job='replace_stock'):
+    """
+    全量更新：逐只获取历史行情并整体替换，进度记录在 reload_journal 中。
+
+    进程中断后再次调用（相同的 job）时跳过已完成的股票，沿用上次的日期范围继续；
+    全部完成（或只剩失败次数达到上限的股票）后再次调用则以新的日期范围开始新的一轮。
+    :param progress: ProgressReporter，记录每只股票的状态
+    :param start_date: 为空时为 HISTORY_START_DATE
+    :param end_date: 为空时为今天
+    :return: reload_progress 的结果
+    """
+    start_date = start_date or HISTORY_START_DATE
+    end_date = end_date or datetime.now().strftime('%Y%m%d')
+    start_date, end_date, remaining = open_reload_journal(db_name, job, stock_list, start_date, end_date)
+    progress.total = len(remaining)
     max_workers = min(32, multiprocessing.cpu_count() * 5)  # 根据实际情况调整
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_stock = {
-            executor.submit(fetch_and_push_stock, stock_code, db_name, start_date, end_date, sio): stock_code
-            for stock_code in stock_list
-        }
-        for future in as_completed(future_to_stock):
-            stock_code = future_to_stock[future]
-            try:
-                future.result()
-            except Exception as exc:
-                print(f'{stock_code} 发生异常: {exc}')
-                sio.emit('stock_update', {'stock_code': stock_code, 'status': 'error', 'error': str(exc)})
+    # 获取线程只负责请求，写入由流水线的写入线程批量完成
+    loader = StagedLoader(db_name)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_stock = {
+                executor.submit(fetch_and_push_stock, stock_code, db_name, start_date, end_date, progress, job, loader):
+                    stock_code
+                for stock_code in remaining
+            }
+            for future in as_completed(future_to_stock):
+                stock_code = future_to_stock[future]
+                try:
+                    future.result()
+                except Exception as exc:
+                    print(f'{stock_code} 发生异常: {exc}')
+                    progress.update(stock_code, 'error', exc)
+    finally:
+        stats = loader.close()
+    print(f"写入 {stats['written']} 只（{stats['batches']} 批），获取 {stats['fetch_rate']:.1f} 只/秒，"
+          f"写入 {stats['write_rows_per_second']:.0f} 行/秒，获取线程等待写入 {stats['put_wait_seconds']:.1f}s")
+    journal = reload_progress(db_name, job)
+    print(f'任务 {job} 完成 {journal[RELOAD_DONE]} 只，失败 {journal[RELOAD_FAILED]} 只')
+    return journal
 
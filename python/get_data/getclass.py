@@ -1,17 +1,66 @@
-import akshare as ak
-from db.stock_operations import replace_df_mysql
+import time
+from concurrent.futures import as_completed
+from db.index_membership import (INDEX_DB, CONSTITUENT_CODE, constituent_checksum, read_constituent_hashes,
+                                 write_index_changes)
+from get_data.fetch_scheduler import FetchScheduler
+from get_data.sources import get_data_source
 
-# 获取所有的指数信息
-index_stock_info_df = ak.index_stock_info()
 
-# 循环遍历每个指数的代码
-for symbol in index_stock_info_df['index_code']:
-    # 获取该指数对应的成分股数据
-    df = ak.index_stock_cons(symbol)
+def refresh_index_constituents(db_name=INDEX_DB, index_codes=None, rate=2.0, max_concurrency=4, progress=None):
+    """
+    更新全部指数的成分股。
 
-    # 将数据添加到 MySQL 数据库中
-    replace_df_mysql(df, 'index', symbol)
+    成分股由限速的调度器并发请求；与上次保存的成分股校验值相同的指数不写入，
+    有变化的指数在一个事务中写入（替换成分股表并记录纳入/移出日期）。
+    请求失败或返回空数据的指数保留原有数据。
+    :param index_codes: 要更新的指数代码，默认为 index_stock_info 返回的全部指数
+    :param rate: 每秒请求数上限
+    :param max_concurrency: 同时进行的请求数上限
+    :param progress: 可选回调 progress(done, total, index_code, status)
+    :return: {'changed': {指数代码: {'added', 'removed'}}, 'unchanged': [...], 'failed': {指数代码: 错误}, 'seconds'}
+    """
+    start_time = time.perf_counter()
+    source = get_data_source()
+    if index_codes is None:
+        index_codes = source.index_list()['index_code']
+    index_codes = list(dict.fromkeys(str(code) for code in index_codes))
+    hashes = read_constituent_hashes(db_name)
 
-    # 打印出每个指数的成分股数据
-    print(f"Index Code: {symbol}")
-    print(df)
+    changed, unchanged, failed = {}, [], {}
+    # 调度器按 fetch(代码, 开始日期, 结束日期, 复权类型) 调用，成分股请求只使用代码
+    scheduler = FetchScheduler(fetch=lambda index_code, *_: source.index_cons(index_code), rate=rate,
+                               burst=max_concurrency, max_concurrency=max_concurrency)
+    try:
+        futures = {scheduler.submit(code, None, None): code for code in index_codes}
+        for done, future in enumerate(as_completed(futures), 1):
+            index_code = futures[future]
+            try:
+                df = future.result()
+                if df is None or df.empty or CONSTITUENT_CODE not in df.columns:
+                    raise ValueError("接口返回空的成分股数据")
+            except Exception as e:
+                print(f"获取指数 {index_code} 的成分股失败: {e}")
+                failed[index_code] = str(e)
+                status = 'failed'
+            else:
+                if hashes.get(index_code) == constituent_checksum(df):
+                    unchanged.append(index_code)
+                    status = 'unchanged'
+                else:
+                    changed[index_code] = df
+                    status = 'changed'
+            if progress is not None:
+                progress(done, len(index_codes), index_code, status)
+    finally:
+        print(f"指数成分股请求统计: {scheduler.stats()}")
+        scheduler.shutdown()
+
+    written = write_index_changes(changed, db_name)
+    seconds = time.perf_counter() - start_time
+    print(f"指数成分股更新完成：{len(written)} 个有变化，{len(unchanged)} 个无变化，{len(failed)} 个失败，"
+          f"用时 {seconds:.1f}s")
+    return {'changed': written, 'unchanged': unchanged, 'failed': failed, 'seconds': seconds}
+
+
+if __name__ == '__main__':
+    refresh_index_constituents()
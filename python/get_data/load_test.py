@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from get_data.fetch_scheduler import FetchScheduler, set_fetch_scheduler
+from get_data.get_base import HISTORY_START_DATE, fetch_stock_history
+from get_data.pipeline import StagedLoader
+from get_data.sources import ReplaySource, set_data_source
+
+
+def run_ingest_load_test(db_name, stock_codes, source, start_date=HISTORY_START_DATE, end_date=None,
+                         fetch_workers=16, rate=1000.0):
+    """
+    用指定的数据源压测全量入库流程：并发请求并合并三种复权类型（fetch_stock_history），
+    再由 StagedLoader 批量写入 db_name（整体替换）。不登记 reload_journal，也不推送进度。
+
+    会替换进程内共享的数据源和调度器，db_name 请使用单独的测试数据库。
+    :param source: 数据源，通常为 ReplaySource
+    :param rate: 调度器每秒请求数上限，默认足够大，只测流水线本身的吞吐量
+    :return: {'stocks', 'written', 'failed': {股票代码: 错误}, 'seconds', 'stocks_per_second',
+              'fetch': 调度器统计, 'write': 写入流水线统计}
+    """
+    end_date = end_date or datetime.now().strftime('%Y%m%d')
+    set_data_source(source)
+    scheduler = FetchScheduler(rate=rate, burst=fetch_workers * 3, max_concurrency=fetch_workers * 3)
+    set_fetch_scheduler(scheduler)
+
+    failed = {}
+
+    def on_written(stock_code, error):
+        if error is not None:
+            failed[stock_code] = str(error)
+
+    start_time = time.perf_counter()
+    loader = StagedLoader(db_name)
+    try:
+        with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+            futures = {executor.submit(fetch_stock_history, code, db_name, start_date, end_date): code
+                       for code in stock_codes}
+            for future in as_completed(futures):
+                stock_code = futures[future]
+                try:
+                    loader.put(stock_code, future.result(), replace=True, on_written=on_written)
+                except Exception as e:
+                    failed[stock_code] = str(e)
+    finally:
+        write_stats = loader.close()
+    seconds = time.perf_counter() - start_time
+
+    result = {
+        'stocks': len(stock_codes),
+        'written': write_stats['written'],
+        'failed': failed,
+        'seconds': seconds,
+        'stocks_per_second': write_stats['written'] / seconds if seconds > 0 else 0.0,
+        'fetch': scheduler.stats(),
+        'write': write_stats,
+    }
+    print(f"压测完成：{len(stock_codes)} 只股票，写入 {write_stats['written']} 只，失败 {len(failed)} 只，"
+          f"用时 {seconds:.1f}s（{result['stocks_per_second']:.1f} 只/秒），"
+          f"请求错误率 {result['fetch']['attempt_error_rate']:.1%}，"
+          f"写入 {write_stats['write_rows_per_second']:.0f} 行/秒")
+    return result
+
+
+def replay_stock_codes(root):
+    """回放目录中录制了不复权日线的股票代码"""
+    hist_dir = os.path.join(root, 'hist', 'none')
+    if not os.path.isdir(hist_dir):
+        return []
+    return sorted(name[:-len('.csv')] for name in os.listdir(hist_dir) if name.endswith('.csv'))
+
+
+if __name__ == '__main__':
+    # python -m get_data.load_test <测试数据库> <股票数> [回放目录] [延迟秒数] [错误率]
+    # 回放目录中没有录制的股票使用模拟日线；不指定回放目录时全部使用模拟日线
+    bench_db = sys.argv[1]
+    stock_count = int(sys.argv[2])
+    replay_dir = sys.argv[3] if len(sys.argv) > 3 else ''
+    latency = float(sys.argv[4]) if len(sys.argv) > 4 else 0.05
+    failure_rate = float(sys.argv[5]) if len(sys.argv) > 5 else 0.0
+    recorded = replay_stock_codes(replay_dir) if replay_dir else []
+    codes = list(dict.fromkeys(recorded + [str(600000 + i) for i in range(stock_count)]))[:stock_count]
+    run_ingest_load_test(bench_db, codes, ReplaySource(replay_dir, latency=latency, failure_rate=failure_rate,
+                                                       seed=0, synthetic=True))
@@ -0,0 +1,161 @@
+import queue
+import threading
+import time
+import pandas as pd
+from db.latest_quotes import LATEST_QUOTES_KEY, discard_latest_quotes, update_latest_quotes
+from db.price_schema import write_price_frames_mysql
+
+_STOP = object()
+
+
+class StagedLoader:
+    """
+    行情写入流水线：获取线程把合并好的行情放入有界队列后立即返回继续请求，
+    少量写入线程从队列中取出多只股票的数据，合并为一次批量写入。
+
+    队列满时 put 阻塞（背压），获取速度不会超过写入速度太多，内存占用有上限。
+
+    :param db_name: 行情数据库
+    :param writer_workers: 写入线程数
+    :param queue_size: 队列中最多等待写入的股票数
+    :param batch_stocks: 每批最多合并的股票数
+    :param batch_rows: 每批最多合并的行数
+    :param flush_interval: 队列暂时为空时，已取出的数据最多等待多久（秒）再写入
+    """
+
+    def __init__(self, db_name, writer_workers=2, queue_size=64, batch_stocks=50, batch_rows=200000,
+                 flush_interval=0.5):
+        self.db_name = db_name
+        self.batch_stocks = batch_stocks
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._counters = {'fetched': 0, 'fetched_rows': 0, 'put_wait_seconds': 0.0,
+                          'written': 0, 'failed': 0, 'written_rows': 0, 'batches': 0, 'write_seconds': 0.0}
+        self._started_at = time.monotonic()
+        self._writers = [threading.Thread(target=self._writer, name=f'loader-writer-{i}', daemon=True)
+                         for i in range(writer_workers)]
+        for writer in self._writers:
+            writer.start()
+
+    def put(self, stock_code, df, replace=False, on_written=None):
+        """
+        提交一只股票的行情等待写入，队列满时阻塞。
+
+        :param replace: 为 True 时整体替换该股票原有的数据
+        :param on_written: 可选回调 on_written(stock_code, error)，写入后在写入线程中调用，成功时 error 为 None
+        """
+        start_time = time.perf_counter()
+        self._queue.put((str(stock_code), df, replace, on_written))
+        with self._lock:
+            self._counters['fetched'] += 1
+            self._counters['fetched_rows'] += len(df)
+            self._counters['put_wait_seconds'] += time.perf_counter() - start_time
+
+    def close(self):
+        """等待队列中的数据全部写入，返回 stats()"""
+        for _ in self._writers:
+            self._queue.put(_STOP)
+        for writer in self._writers:
+            writer.join()
+        return self.stats()
+
+    def stats(self):
+        """
+        各阶段的吞吐量：
+        fetch_rate 为获取阶段每秒放入队列的股票数，put_wait_seconds 为获取线程因队列满而等待的总时间；
+        write_rate / write_rows_per_second 为写入阶段每秒写入的股票数和行数（按写入耗时计算）
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        elapsed = time.monotonic() - self._started_at
+        counters.update({
+            'queued': self._queue.qsize(),
+            'elapsed': elapsed,
+            'fetch_rate': counters['fetched'] / elapsed if elapsed > 0 else 0.0,
+            'write_rate': counters['written'] / counters['write_seconds'] if counters['write_seconds'] else 0.0,
+            'write_rows_per_second': counters['written_rows'] / counters['write_seconds']
+            if counters['write_seconds'] else 0.0,
+            'stocks_per_batch': counters['written'] / counters['batches'] if counters['batches'] else 0.0,
+        })
+        return counters
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            rows = len(item[1])
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_stocks and rows < self.batch_rows:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                rows += len(item[1])
+            self._write_batch(batch)
+            if stopping:
+                return
+
+    def _write_batch(self, batch):
+        # 同一批中同一只股票出现多次时写入最后一次的数据（其中任一次要求整体替换则整体替换），
+        # 每次提交的回调都会调用
+        frames = {}
+        replace_codes = []
+        callbacks = {}
+        for stock_code, df, replace, on_written in batch:
+            frames[stock_code] = df
+            if replace and stock_code not in replace_codes:
+                replace_codes.append(stock_code)
+            if on_written is not None:
+                callbacks.setdefault(stock_code, []).append(on_written)
+        start_time = time.perf_counter()
+        try:
+            write_price_frames_mysql(frames, self.db_name, replace_codes)
+            errors = {}
+        except Exception as e:
+            # 整批失败时逐只重写，只有出错的股票报告失败
+            print(f"批量写入 {len(frames)} 只股票失败，改为逐只写入: {e}")
+            errors = {}
+            for code, df in frames.items():
+                try:
+                    write_price_frames_mysql({code: df}, self.db_name, [code] if code in replace_codes else [])
+                except Exception as stock_error:
+                    errors[code] = stock_error
+        elapsed = time.perf_counter() - start_time
+
+        written = [code for code in frames if code not in errors]
+        self._update_latest_quotes({code: frames[code] for code in written})
+        with self._lock:
+            self._counters['batches'] += 1
+            self._counters['written'] += len(written)
+            self._counters['failed'] += len(errors)
+            self._counters['written_rows'] += sum(len(frames[code]) for code in written)
+            self._counters['write_seconds'] += elapsed
+        print(f"批量写入 {len(written)} 只股票，用时 {elapsed:.2f}s")
+        for code, code_callbacks in callbacks.items():
+            for on_written in code_callbacks:
+                try:
+                    on_written(code, errors.get(code))
+                except Exception as e:
+                    print(f"{code} 写入回调出错: {e}")
+
+    def _update_latest_quotes(self, frames):
+        latest = []
+        for code, df in frames.items():
+            if '日期' in df.columns and not df.empty:
+                latest.append(df.loc[[pd.to_datetime(df['日期']).idxmax()]].assign(**{LATEST_QUOTES_KEY: code}))
+        if not latest:
+            return
+        try:
+            update_latest_quotes(self.db_name, pd.concat(latest, ignore_index=True))
+        except Exception as e:
+            print(f"更新最新行情失败，改为从历史表读取: {e}")
+            discard_latest_quotes(self.db_name, list(frames))
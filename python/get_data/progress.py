@@ -0,0 +1,145 @@
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+
+# 长任务的进度推送：按任务汇总每只股票的最新状态，按固定间隔合并为一条 progress 事件，任务结束时发送 progress/summary。
+# 每次运行任务有一个运行 id（run_id），事件只发送到这次运行的房间：发起任务的客户端，
+# 以及断线重连后用 run_id 重新订阅的客户端；同名任务的其他运行和其他客户端收不到。
+PROGRESS_EVENT = 'progress'
+SUMMARY_EVENT = 'progress/summary'
+FLUSH_INTERVAL = 0.25
+# 保留进度的运行数，超出时丢弃最早的运行
+MAX_SNAPSHOTS = 100
+
+# 每次运行最近一次推送的进度（按 run_id），运行结束后保留最终结果，供重连的客户端拉取
+_snapshots = OrderedDict()
+# 每个任务最近一次运行的 run_id
+_latest_runs = {}
+_snapshots_lock = threading.Lock()
+
+
+def new_run_id(job):
+    """为任务的一次运行生成 run_id"""
+    return f'{job}-{uuid.uuid4().hex[:12]}'
+
+
+def progress_room(run_id):
+    """一次运行的 Socket.IO 房间名"""
+    return f'job:{run_id}'
+
+
+def progress_snapshot(run_id):
+    """一次运行最近的进度；传入任务名时返回该任务最近一次运行的进度。没有记录时返回 None"""
+    with _snapshots_lock:
+        if run_id not in _snapshots:
+            run_id = _latest_runs.get(run_id)
+        return _snapshots.get(run_id)
+
+
+def _store_snapshot(job, run_id, snapshot):
+    with _snapshots_lock:
+        _snapshots[run_id] = snapshot
+        _snapshots.move_to_end(run_id)
+        _latest_runs[job] = run_id
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+
+
+class ProgressReporter:
+    """
+    汇总一个任务中每只股票（或每个条目）的状态，最多每 interval 秒推送一次。
+
+    update 只修改内存中的状态，不直接发送事件，几千只股票的任务也只产生少量事件。
+    推送的内容：job、run_id、total、reported（已报告状态的条目数）、failed、percent、counts（各状态的条目数，
+    按每个条目的最新状态计算）、errors（最近的错误）、elapsed、finished。
+
+    :param socketio: SocketIO 实例，定时推送使用它的后台任务和 sleep，与 gevent 协作
+    :param job: 任务名
+    :param run_id: 运行 id，决定推送的房间（progress_room(run_id)），为空时生成新的 id
+    :param total: 条目总数
+    :param interval: 推送间隔（秒）
+    :param max_errors: 保留的最近错误数
+    """
+
+    def __init__(self, socketio, job, run_id=None, total=0, interval=FLUSH_INTERVAL, max_errors=20):
+        self.socketio = socketio
+        self.job = job
+        self.run_id = run_id or new_run_id(job)
+        self.total = total
+        self.interval = interval
+        self.room = progress_room(self.run_id)
+        self._statuses = {}
+        self._failed = set()
+        self._errors = deque(maxlen=max_errors)
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._dirty = True
+        self._closed = False
+        self._started_at = time.monotonic()
+        _store_snapshot(job, self.run_id, self.snapshot())
+        socketio.start_background_task(self._flush_loop)
+
+    def update(self, key, status, error=None):
+        """记录一个条目的最新状态；error 不为空时计为失败并保留错误信息"""
+        key = str(key)
+        with self._lock:
+            self._statuses[key] = status
+            if error is None:
+                self._failed.discard(key)
+            else:
+                self._failed.add(key)
+                self._errors.append({'key': key, 'status': status, 'error': str(error)[:500]})
+            self._dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            counts = Counter(self._statuses.values())
+            reported = len(self._statuses)
+            failed = len(self._failed)
+            errors = list(self._errors)
+        return {
+            'job': self.job,
+            'run_id': self.run_id,
+            'total': self.total,
+            'reported': reported,
+            'failed': failed,
+            'percent': round(min(reported / self.total, 1.0) * 100, 1) if self.total else 0.0,
+            'counts': dict(counts),
+            'errors': errors,
+            'elapsed': round(time.monotonic() - self._started_at, 2),
+            'finished': self._closed,
+        }
+
+    def flush(self):
+        """有新的状态时立即推送一次"""
+        with self._emit_lock:
+            with self._lock:
+                if not self._dirty or self._closed:
+                    return
+                self._dirty = False
+            snapshot = self.snapshot()
+            _store_snapshot(self.job, self.run_id, snapshot)
+            self.socketio.emit(PROGRESS_EVENT, snapshot, to=self.room)
+
+    def close(self, **extra):
+        """停止定时推送，推送最终进度和 progress/summary 事件；extra 附加到汇总中。返回汇总"""
+        with self._emit_lock:
+            self._closed = True
+            summary = self.snapshot()
+            summary.update(extra)
+            _store_snapshot(self.job, self.run_id, summary)
+            self.socketio.emit(PROGRESS_EVENT, summary, to=self.room)
+            self.socketio.emit(SUMMARY_EVENT, summary, to=self.room)
+        return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self.socketio.sleep(self.interval)
+            self.flush()
@@ -0,0 +1,168 @@
+from collections import Counter
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from db.latest_quotes import (
+    LATEST_QUOTES_KEY,
+    discard_latest_quotes,
+    read_latest_quotes_snapshot_mysql,
+    update_latest_quotes,
+)
+from db.long_store import LONG_CODE_COLUMN, long_table_for, write_long_rows_mysql
+from db.price_schema import write_price_frames_mysql
+from db.stock_operations import SNAPSHOT_STATUS_COLUMN
+from db.watermarks import bulk_watermark_statement
+from get_data.adjust import PRICE_COLUMNS
+from get_data.add_base import latest_session_date
+from get_data.sources import get_data_source
+
+# 收盘后用一次全市场快照生成当天的日线，代替每只股票三次历史行情请求。
+# 快照列 -> 日线行情列（与 stock_zh_a_hist 返回的列名一致）
+SPOT_COLUMNS = {'今开': '开盘', '最新价': '收盘', '最高': '最高', '最低': '最低', '成交量': '成交量',
+                '成交额': '成交额', '振幅': '振幅', '涨跌幅': '涨跌幅', '涨跌额': '涨跌额', '换手率': '换手率'}
+# 快照的昨收与已保存的最后收盘价相差超过该值（元）时，说明有缺口或今天除权除息，改为逐只请求历史行情
+CLOSE_TOLERANCE = 0.005
+# 能与已保存数据衔接的股票少于该比例时，认为快照不是新交易日的数据（例如节假日），不写入
+MIN_MATCH_RATIO = 0.5
+# 每只股票一张表时，每个事务合并写入的股票数
+SNAPSHOT_BATCH_STOCKS = 200
+
+
+def hfq_ratios(stored):
+    """已保存的最后一天的 收盘_后复权 / 收盘_不复权；收盘价为空或为 0 时为 NaN"""
+    ratio = (pd.to_numeric(stored['收盘_后复权'], errors='coerce')
+             / pd.to_numeric(stored['收盘_不复权'], errors='coerce'))
+    return ratio.where(np.isfinite(ratio) & (ratio > 0))
+
+
+def snapshot_bars(spot, stored, session_date):
+    """
+    由快照生成当天的日线，列名与三种复权类型合并后的行情表一致，附加 code 列。
+
+    没有除权除息时，前复权的最新一天与不复权相同；后复权按已保存的最后一天的
+    收盘_后复权 / 收盘_不复权 比例缩放价格类列。
+    :param spot: 以股票代码为索引的快照
+    :param stored: 以股票代码为索引的已保存最后一行（收盘_不复权、收盘_后复权）
+    """
+    raw = spot[list(SPOT_COLUMNS)].rename(columns=SPOT_COLUMNS).astype(float)
+    hfq_ratio = hfq_ratios(stored).reindex(raw.index)
+    bars = pd.DataFrame({LONG_CODE_COLUMN: raw.index.astype(str), '日期': session_date}, index=raw.index)
+    for suffix in ('不复权', '前复权', '后复权'):
+        for col in raw.columns:
+            values = raw[col]
+            if suffix == '后复权' and col in PRICE_COLUMNS:
+                values = values * hfq_ratio
+            bars[f'{col}_{suffix}'] = values
+    return bars.reset_index(drop=True)
+
+
+def ingest_spot_snapshot(db_name, plan, spot=None):
+    """
+    收盘后的全市场快照写入：plan['pending'] 中能与已保存数据衔接的股票由快照生成当天日线并批量写入，
+    写入成功的股票从 plan['pending'] 移到 plan['up_to_date']，其余股票（有缺口、今天除权除息、
+    快照中没有或停牌）留给逐只请求历史行情的增量更新处理。
+
+    :param plan: plan_incremental_update 的结果，会被修改
+    :param spot: 可选，已获取的快照（stock_zh_a_spot_em 的返回值）
+    :return: {'date', 'ingested': [...], 'fallback': [...]}
+    """
+    pending = plan['pending']
+    session_date = latest_session_date()
+    summary = {'date': session_date.isoformat(), 'ingested': [], 'fallback': list(pending)}
+    if session_date != date.today():
+        print("今天尚未收盘或不是交易日，不使用快照")
+        return summary
+    if not pending:
+        return summary
+    if spot is None:
+        try:
+            spot = get_data_source().spot()
+        except Exception as e:
+            print(f"获取全市场快照失败，改为逐只更新: {e}")
+            return summary
+
+    spot = spot.assign(代码=spot['代码'].astype(str)).drop_duplicates('代码').set_index('代码')
+    traded = spot[pd.to_numeric(spot['最新价'], errors='coerce').notna()
+                  & (pd.to_numeric(spot['成交量'], errors='coerce').fillna(0) > 0)]
+    codes = [code for code in pending if code in traded.index]
+    if not codes:
+        return summary
+
+    stored = read_latest_quotes_snapshot_mysql(codes, db_name, ['日期', '收盘_不复权', '收盘_后复权'])
+    stored.index = codes
+    stored = stored[stored[SNAPSHOT_STATUS_COLUMN] == 'ok']
+    stored_dates = pd.to_datetime(stored['日期']).dt.date
+    # 已保存的最后一天必须与水位一致
+    stored = stored[[day == (pd.to_datetime(pending[code]) - timedelta(days=1)).date()
+                     for code, day in zip(stored.index, stored_dates)]]
+    if stored.empty:
+        return summary
+    # 大多数股票的最后一天就是上一个交易日，不依赖节假日日历
+    last_session = Counter(pd.to_datetime(stored['日期']).dt.date).most_common(1)[0][0]
+    if last_session >= session_date:
+        return summary
+    previous_close = pd.to_numeric(traded.loc[stored.index, '昨收'], errors='coerce')
+    matched = stored[(pd.to_datetime(stored['日期']).dt.date == last_session)
+                     & ((previous_close - stored['收盘_不复权'].astype(float)).abs() <= CLOSE_TOLERANCE)]
+    if len(matched) < MIN_MATCH_RATIO * len(stored):
+        print(f"只有 {len(matched)}/{len(stored)} 只股票的昨收与已保存的收盘价一致，快照可能不是新交易日的数据，不写入")
+        return summary
+    # 已保存的收盘价为空或为 0 时算不出后复权比例，这些股票留给逐只请求历史行情
+    matched = matched[hfq_ratios(matched).notna()]
+    if matched.empty:
+        return summary
+
+    bars = snapshot_bars(traded.loc[matched.index], matched, session_date)
+    ingested = _write_snapshot_bars(db_name, bars)
+    if ingested:
+        latest = bars[bars[LONG_CODE_COLUMN].isin(ingested)].rename(columns={LONG_CODE_COLUMN: LATEST_QUOTES_KEY})
+        try:
+            update_latest_quotes(db_name, latest)
+        except Exception as e:
+            print(f"更新最新行情失败，改为从历史表读取: {e}")
+            discard_latest_quotes(db_name, ingested)
+
+    for code in ingested:
+        pending.pop(code, None)
+        plan['up_to_date'].append(code)
+    summary['ingested'] = ingested
+    summary['fallback'] = list(pending)
+    print(f"快照写入 {session_date} 日线 {len(ingested)} 只，需逐只更新 {len(pending)} 只")
+    return summary
+
+
+def _write_snapshot_bars(db_name, bars, batch_stocks=SNAPSHOT_BATCH_STOCKS):
+    """写入快照日线和水位，返回写入成功的股票代码"""
+    session_date = bars['日期'].iloc[0]
+    if long_table_for(db_name):
+        # 长表布局：全部股票一条批量 upsert，水位在同一事务中更新
+        codes = bars[LONG_CODE_COLUMN].tolist()
+        try:
+            write_long_rows_mysql(bars, db_name,
+                                  extra_statements=[bulk_watermark_statement(db_name, dict.fromkeys(codes, session_date))])
+        except Exception as e:
+            print(f"快照写入长表失败: {e}")
+            return []
+        return codes
+
+    # 每只股票一张表：每 batch_stocks 只股票在一个事务中分别 upsert 到各自的表，水位随同一事务更新
+    frames = {code: bar.drop(columns=[LONG_CODE_COLUMN])
+              for code, bar in bars.groupby(LONG_CODE_COLUMN, sort=False)}
+    codes = list(frames)
+    ingested = []
+    for start in range(0, len(codes), batch_stocks):
+        batch = {code: frames[code] for code in codes[start:start + batch_stocks]}
+        try:
+            write_price_frames_mysql(batch, db_name)
+            ingested.extend(batch)
+            continue
+        except Exception as e:
+            # 整批失败时逐只重写，只有出错的股票留给逐只请求历史行情
+            print(f"快照批量写入 {len(batch)} 只股票失败，改为逐只写入: {e}")
+        for code, bar in batch.items():
+            try:
+                write_price_frames_mysql({code: bar}, db_name)
+                ingested.append(code)
+            except Exception as e:
+                print(f"快照写入 {code} 失败: {e}")
+    return ingested
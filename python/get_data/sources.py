@@ -0,0 +1,303 @@
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+
+try:
+    import akshare as ak
+except ImportError:  # 未安装 akshare 时只能使用本地回放的数据源
+    ak = None
+
+# 行情数据源：入库代码通过 get_data_source() 获取行情、快照和指数成分股，不直接调用 akshare。
+# 默认为 AkshareSource；ReplaySource 从本地目录回放录制的（或模拟的）数据，可以注入延迟和错误率，
+# 用于在没有网络的环境下压测和回归测试整个入库流程（请求、合并、写入）。
+#
+# 回放目录结构（RecordingSource 按相同结构录制）：
+#   <root>/hist/<none|qfq|hfq|hfq-factor>/<股票代码>.csv   日线行情 / 后复权因子
+#   <root>/spot.csv                                       全市场快照
+#   <root>/index/index_stock_info.csv                     指数列表
+#   <root>/index/cons/<指数代码>.csv                        指数成分股
+
+# 请求后复权因子（而不是行情）时使用的 adjust 参数
+HFQ_FACTOR = "hfq-factor"
+# 读取录制文件时按字符串读取的代码列，避免丢失前导零
+_CODE_COLUMNS = {'股票代码': str, '代码': str, 'index_code': str, '品种代码': str}
+
+
+def _exchange_symbol(stock_code):
+    """新浪接口使用带交易所前缀的代码"""
+    code = str(stock_code)
+    if code.startswith(('5', '6', '9')):
+        return f"sh{code}"
+    if code.startswith(('4', '8')):
+        return f"bj{code}"
+    return f"sz{code}"
+
+
+class DataSource(ABC):
+    """
+    行情数据源接口，子类必须实现全部四个请求方法；不支持的请求应显式抛出 NotImplementedError 并说明原因。
+
+    hist 返回与 stock_zh_a_hist 相同列的日线（日期、股票代码、开盘、收盘……），没有数据时返回空 DataFrame；
+    adjust 为 HFQ_FACTOR 时返回全部后复权因子（日期、hfq_factor）。
+    实例可以直接作为 FetchScheduler 的请求函数：source(stock_code, start_date, end_date, adjust)。
+    """
+
+    @abstractmethod
+    def hist(self, stock_code, start_date, end_date, adjust=""):
+        """日线行情或后复权因子"""
+
+    @abstractmethod
+    def spot(self):
+        """全市场 A 股实时行情快照，列与 stock_zh_a_spot_em 相同"""
+
+    @abstractmethod
+    def index_list(self):
+        """全部指数的代码和名称，列与 index_stock_info 相同"""
+
+    @abstractmethod
+    def index_cons(self, index_code):
+        """指数成分股，列与 index_stock_cons 相同"""
+
+    def __call__(self, stock_code, start_date, end_date, adjust=""):
+        return self.hist(stock_code, start_date, end_date, adjust)
+
+
+class AkshareSource(DataSource):
+    """通过 akshare 请求远程接口（默认数据源）"""
+
+    def __init__(self):
+        if ak is None:
+            raise ImportError("未安装 akshare，无法使用 AkshareSource")
+
+    def hist(self, stock_code, start_date, end_date, adjust=""):
+        if adjust == HFQ_FACTOR:
+            factors = ak.stock_zh_a_daily(symbol=_exchange_symbol(stock_code), adjust=HFQ_FACTOR)
+            factors = factors.rename(columns={'date': '日期'})
+            factors['hfq_factor'] = factors['hfq_factor'].astype(float)
+            return factors[['日期', 'hfq_factor']]
+        return ak.stock_zh_a_hist(symbol=stock_code, period="daily",
+                                  start_date=start_date, end_date=end_date, adjust=adjust)
+
+    def spot(self):
+        return ak.stock_zh_a_spot_em()
+
+    def index_list(self):
+        return ak.index_stock_info()
+
+    def index_cons(self, index_code):
+        return ak.index_stock_cons(symbol=index_code)
+
+
+class SimulatedSource(DataSource):
+    """
+    模拟远程接口的耗时和失败：每次请求等待 latency + [0, jitter) 秒，并以 failure_rate 的概率抛出 ConnectionError。
+    本身不实现请求方法，由子类在返回数据前调用 _simulate_request。
+
+    :param seed: 随机种子，相同的种子产生相同的失败序列
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate_request(self, description):
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise ConnectionError(f"模拟请求失败: {description}")
+
+
+class FakeHistSource(SimulatedSource):
+    """
+    按股票代码生成确定的模拟日线，用于在不访问网络的情况下测试调度器和入库流程。
+    只模拟日线行情，spot、index_list、index_cons 抛出 NotImplementedError；需要这些数据时使用 ReplaySource。
+
+    :param latency: 每次请求的耗时（秒）
+    :param failure_rate: 请求随机失败的概率
+    :param seed: 随机种子
+    """
+
+    def __init__(self, latency=0.05, failure_rate=0.0, seed=None, jitter=0.0):
+        super().__init__(latency=latency, jitter=jitter, failure_rate=failure_rate, seed=seed)
+
+    def hist(self, stock_code, start_date, end_date, adjust=""):
+        self._simulate_request(f"{stock_code} {adjust}")
+        return synthetic_hist(stock_code, start_date, end_date, adjust)
+
+    def spot(self):
+        raise NotImplementedError("FakeHistSource 只模拟日线行情，不支持全市场快照，请使用 ReplaySource")
+
+    def index_list(self):
+        raise NotImplementedError("FakeHistSource 只模拟日线行情，不支持指数列表，请使用 ReplaySource")
+
+    def index_cons(self, index_code):
+        raise NotImplementedError("FakeHistSource 只模拟日线行情，不支持指数成分股，请使用 ReplaySource")
+
+
+def synthetic_hist(stock_code, start_date, end_date, adjust=""):
+    """按股票代码生成确定的模拟日线（同一代码每次结果相同），列与 stock_zh_a_hist 相同"""
+    if adjust == HFQ_FACTOR:
+        return pd.DataFrame({'日期': pd.to_datetime(['1990-12-19', '2020-06-01']).date, 'hfq_factor': [2.7, 3.0]})
+    dates = pd.bdate_range(pd.to_datetime(start_date), min(pd.to_datetime(end_date), pd.Timestamp.today()))
+    rng = np.random.default_rng(int(stock_code) if str(stock_code).isdigit() else 0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+    factor = {"": 1.0, "qfq": 0.9, "hfq": 3.0}[adjust]
+    return pd.DataFrame({
+        '日期': dates.date,
+        '股票代码': stock_code,
+        '开盘': close * factor,
+        '收盘': close * factor,
+        '最高': close * factor * 1.01,
+        '最低': close * factor * 0.99,
+        '成交量': rng.integers(10_000, 1_000_000, len(dates)),
+        '成交额': close * 1e6,
+        '振幅': 2.0,
+        '涨跌幅': 0.0,
+        '涨跌额': 0.0,
+        '换手率': 1.0,
+    })
+
+
+def _hist_path(root, stock_code, adjust):
+    return os.path.join(root, 'hist', adjust or 'none', f'{stock_code}.csv')
+
+
+def _spot_path(root):
+    return os.path.join(root, 'spot.csv')
+
+
+def _index_list_path(root):
+    return os.path.join(root, 'index', 'index_stock_info.csv')
+
+
+def _index_cons_path(root, index_code):
+    return os.path.join(root, 'index', 'cons', f'{index_code}.csv')
+
+
+def _read_recording(path):
+    df = pd.read_csv(path, dtype=_CODE_COLUMNS)
+    if '日期' in df.columns:
+        df['日期'] = pd.to_datetime(df['日期']).dt.date
+    return df
+
+
+class ReplaySource(SimulatedSource):
+    """
+    从本地目录回放录制的数据（目录结构见模块注释），可以注入延迟和错误率。
+
+    :param root: 回放目录
+    :param synthetic: 为 True 时没有录制文件的股票返回 synthetic_hist 生成的模拟日线，
+                      否则抛出 FileNotFoundError（与远程请求失败的处理相同）
+    """
+
+    def __init__(self, root, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None, synthetic=False):
+        super().__init__(latency=latency, jitter=jitter, failure_rate=failure_rate, seed=seed)
+        self.root = root
+        self.synthetic = synthetic
+
+    def hist(self, stock_code, start_date, end_date, adjust=""):
+        self._simulate_request(f"{stock_code} {adjust}")
+        path = _hist_path(self.root, stock_code, adjust)
+        if not os.path.exists(path):
+            if self.synthetic:
+                return synthetic_hist(stock_code, start_date, end_date, adjust)
+            raise FileNotFoundError(f"没有 {stock_code}（{adjust or '不复权'}）的录制数据: {path}")
+        df = _read_recording(path)
+        if adjust == HFQ_FACTOR:
+            return df
+        dates = pd.to_datetime(df['日期'])
+        mask = (dates >= pd.to_datetime(start_date)) & (dates <= pd.to_datetime(end_date))
+        return df[mask].reset_index(drop=True)
+
+    def spot(self):
+        self._simulate_request('spot')
+        return _read_recording(_spot_path(self.root))
+
+    def index_list(self):
+        self._simulate_request('index_list')
+        return _read_recording(_index_list_path(self.root))
+
+    def index_cons(self, index_code):
+        self._simulate_request(f"index {index_code}")
+        return _read_recording(_index_cons_path(self.root, index_code))
+
+
+class RecordingSource(DataSource):
+    """
+    包装另一个数据源，把返回的数据按回放目录结构保存下来，之后可以用 ReplaySource 离线回放。
+
+    同一只股票多次录制的日线按日期合并（同一日期以最新的为准）。
+    """
+
+    def __init__(self, source, root):
+        self.source = source
+        self.root = root
+        self._lock = threading.Lock()
+
+    def hist(self, stock_code, start_date, end_date, adjust=""):
+        df = self.source.hist(stock_code, start_date, end_date, adjust)
+        if df is not None and not df.empty:
+            path = _hist_path(self.root, stock_code, adjust)
+            with self._lock:
+                recorded = df
+                if adjust != HFQ_FACTOR and os.path.exists(path):
+                    recorded = pd.concat([_read_recording(path), df], ignore_index=True)
+                    recorded['日期'] = pd.to_datetime(recorded['日期']).dt.date
+                    recorded = recorded.drop_duplicates('日期', keep='last').sort_values('日期')
+                self._save(path, recorded)
+        return df
+
+    def spot(self):
+        return self._record(_spot_path(self.root), self.source.spot())
+
+    def index_list(self):
+        return self._record(_index_list_path(self.root), self.source.index_list())
+
+    def index_cons(self, index_code):
+        return self._record(_index_cons_path(self.root, index_code), self.source.index_cons(index_code))
+
+    def _record(self, path, df):
+        if df is not None:
+            with self._lock:
+                self._save(path, df)
+        return df
+
+    @staticmethod
+    def _save(path, df):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+
+_source = None
+_source_lock = threading.Lock()
+
+
+def get_data_source():
+    """进程内共享的数据源，默认为 AkshareSource"""
+    global _source
+    if _source is None:
+        with _source_lock:
+            if _source is None:
+                _source = AkshareSource()
+    return _source
+
+
+def set_data_source(source):
+    """替换共享的数据源（例如 ReplaySource 或 RecordingSource），之后的请求立即使用新的数据源"""
+    global _source
+    with _source_lock:
+        _source = source
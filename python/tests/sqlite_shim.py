@@ -0,0 +1,46 @@
+import re
+import pandas as pd
+from sqlalchemy import create_engine, event
+
+# 用 SQLite 文件数据库代替 MySQL 执行 db 包生成的只读查询。
+# SQLite 不允许 UNION ALL 的各部分带括号和 ORDER BY ... LIMIT，这里把每个 "(SELECT ... LIMIT 1)" 改写为子查询，
+# 其余 SQL 原样执行。SQLite 接受而 MySQL 拒绝的写法（其他选择项之后不带表名的 *）在这里直接报错。
+_BARE_STAR = re.compile(r',\s*\*\s+FROM', re.IGNORECASE)
+
+
+def _rewrite_union_parts(sql):
+    return re.sub(r'\((SELECT .*? LIMIT 1)\)', r'SELECT * FROM (\1)', sql)
+
+
+def sqlite_engine(path, tables):
+    """
+    创建 SQLite 数据库并写入各表。
+
+    :param tables: {表名: DataFrame}
+    """
+    engine = create_engine(f'sqlite:///{path}')
+    for table_name, df in tables.items():
+        df.to_sql(table_name, engine, index=False)
+
+    @event.listens_for(engine, 'before_cursor_execute', retval=True)
+    def rewrite(conn, cursor, statement, parameters, context, executemany):
+        if _BARE_STAR.search(statement):
+            raise ValueError(f"MySQL 不接受其他选择项之后的 *: {statement}")
+        return _rewrite_union_parts(statement), parameters
+
+    return engine
+
+
+def patch_catalog(monkeypatch, catalog, tables):
+    """让表结构缓存直接返回 tables 中各表的列"""
+    monkeypatch.setattr(catalog, 'has_table', lambda db_name, table_name: table_name in tables)
+    monkeypatch.setattr(catalog, 'get_columns',
+                        lambda db_name, table_name: list(tables[table_name].columns) if table_name in tables else [])
+
+
+def daily_frame(closes, start='2024-01-01', extra=None):
+    dates = pd.bdate_range(start, periods=len(closes)).strftime('%Y-%m-%d')
+    df = pd.DataFrame({'日期': dates, '收盘_不复权': closes, '收盘_后复权': [close * 3 for close in closes]})
+    for column, values in (extra or {}).items():
+        df[column] = values
+    return df
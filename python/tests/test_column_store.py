@@ -0,0 +1,53 @@
+import datetime
+import pandas as pd
+import pytest
+import db.column_store as column_store_module
+from db.column_store import disable_column_store, enable_column_store, read_column_store_range
+
+
+@pytest.fixture
+def column_store(tmp_path):
+    enable_column_store(str(tmp_path), ['china'])
+    yield tmp_path
+    disable_column_store()
+
+
+def _history(days):
+    dates = pd.bdate_range('2024-01-01', periods=days)
+    return pd.DataFrame({'日期': dates.date, '收盘': [float(i) for i in range(days)]})
+
+
+def _stats(df):
+    return lambda: (df['日期'].max(), df['日期'].nunique())
+
+
+def test_copy_is_reused_while_it_matches_mysql(column_store):
+    mysql = _history(5)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return mysql
+
+    for _ in range(2):
+        df = read_column_store_range('china', '600000', '20240101', '20241231', None, loader, _stats(mysql))
+        assert len(df) == 5
+    assert len(loads) == 1
+
+
+def test_copy_is_reloaded_when_mysql_changed_behind_it(column_store):
+    mysql = _history(5)
+    read_column_store_range('china', '600000', '20240101', '20241231', None, lambda: mysql, _stats(mysql))
+
+    # 其他进程向 MySQL 追加了数据，本进程的副本没有收到通知
+    changed = _history(8)
+    df = read_column_store_range('china', '600000', '20240101', '20241231', ['日期', '收盘'], lambda: changed, _stats(changed))
+    assert len(df) == 8
+    assert df['日期'].max() == datetime.date(2024, 1, 10)
+
+
+def test_enabling_without_pyarrow_is_an_error(monkeypatch, tmp_path):
+    monkeypatch.setattr(column_store_module, 'pa', None)
+    with pytest.raises(ImportError, match='pyarrow'):
+        enable_column_store(str(tmp_path), ['china'])
+    assert column_store_module.column_store_settings() == (None, [])
@@ -0,0 +1,137 @@
+import threading
+import time
+import pandas as pd
+import pytest
+import get_data.fetch_scheduler as fetch_scheduler
+from get_data.fetch_scheduler import FetchScheduler, TokenBucket
+
+
+class FlakyFetch:
+    """前 failures 次请求失败，之后返回请求参数"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, stock_code, start_date, end_date, adjust):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        if calls <= self.failures:
+            raise ConnectionError(f'第 {calls} 次请求失败')
+        return (stock_code, start_date, end_date, adjust)
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """记录每次退避的抖动区间，不实际等待"""
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr(fetch_scheduler.random, 'uniform', uniform)
+    return bounds
+
+
+def test_token_bucket_allows_burst_then_paces_to_rate():
+    bucket = TokenBucket(rate=50.0, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+
+    for _ in range(5):
+        bucket.acquire()
+    # 突发额度用完后每个请求间隔 1 / rate 秒
+    assert time.monotonic() - start >= 5 / 50.0 * 0.9
+
+
+def test_failed_request_is_retried_max_retries_times(backoffs):
+    fetch = FlakyFetch(failures=10)
+    scheduler = FetchScheduler(fetch, rate=1000.0, burst=10, max_retries=3, backoff_base=0.5, backoff_max=1.0)
+    try:
+        with pytest.raises(ConnectionError):
+            scheduler.submit('600000', '20240101', '20240110').result(timeout=5)
+        stats = scheduler.stats()
+    finally:
+        scheduler.shutdown()
+
+    assert fetch.calls == 4
+    assert stats['requests'] == 4
+    assert stats['retries'] == 3
+    assert stats['failed'] == 1
+    # 全抖动：第 n 次重试在 [0, min(backoff_max, backoff_base * 2^n)] 之间等待
+    assert backoffs == [(0, 0.5), (0, 1.0), (0, 1.0)]
+
+
+def test_request_succeeds_after_transient_failures(backoffs):
+    fetch = FlakyFetch(failures=2)
+    scheduler = FetchScheduler(fetch, rate=1000.0, burst=10, max_retries=3)
+    try:
+        result = scheduler.submit('600000', '20240101', '20240110', 'qfq').result(timeout=5)
+        stats = scheduler.stats()
+    finally:
+        scheduler.shutdown()
+
+    assert result == ('600000', '20240101', '20240110', 'qfq')
+    assert stats['retries'] == 2
+    assert stats['succeeded'] == 1
+    assert stats['failed'] == 0
+    assert len(backoffs) == 2
+
+
+def test_identical_in_flight_requests_share_one_fetch():
+    release = threading.Event()
+    calls = []
+
+    def fetch(*key):
+        calls.append(key)
+        release.wait(5)
+        return key
+
+    scheduler = FetchScheduler(fetch, rate=1000.0, burst=10)
+    try:
+        first = scheduler.submit('600000', '20240101', '20240110')
+        second = scheduler.submit('600000', '20240101', '20240110')
+        other = scheduler.submit('600000', '20240101', '20240110', 'hfq')
+        release.set()
+        assert first.result(timeout=5) == ('600000', '20240101', '20240110', '')
+        assert second.result(timeout=5) == ('600000', '20240101', '20240110', '')
+        other.result(timeout=5)
+        assert scheduler.stats()['deduplicated'] == 1
+
+        # 完成后的相同请求重新发起
+        deadline = time.monotonic() + 5
+        while scheduler.stats()['in_flight'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        scheduler.submit('600000', '20240101', '20240110').result(timeout=5)
+    finally:
+        scheduler.shutdown()
+
+    assert len(calls) == 3
+
+
+def test_consumers_of_a_deduplicated_request_get_their_own_frame():
+    release = threading.Event()
+
+    def fetch(stock_code, start_date, end_date, adjust):
+        release.wait(5)
+        return pd.DataFrame({'日期': ['2024-01-02'], '收盘': [10.0]})
+
+    scheduler = FetchScheduler(fetch, rate=1000.0, burst=10)
+    try:
+        first = scheduler.submit('600000', '20240101', '20240110', 'hfq')
+        second = scheduler.submit('600000', '20240101', '20240110', 'hfq')
+        release.set()
+        first_df = first.result(timeout=5)
+        # 与 get_base、add_base 中一样原地重命名列
+        first_df.columns = [f'{col}_后复权' if col != '日期' else col for col in first_df.columns]
+        second_df = second.result(timeout=5)
+    finally:
+        scheduler.shutdown()
+
+    assert scheduler.stats()['deduplicated'] == 1
+    assert list(second_df.columns) == ['日期', '收盘']
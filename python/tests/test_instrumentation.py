@@ -0,0 +1,49 @@
+import importlib
+import pytest
+from sqlalchemy import create_engine, text
+
+# db 包导出的同名对象会遮住子模块，按模块名取得 db.instrumentation
+instrumentation = importlib.import_module('db.instrumentation')
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setitem(instrumentation.QUERY_LOG_OPTIONS, 'enabled', True)
+    monkeypatch.setitem(instrumentation.QUERY_LOG_OPTIONS, 'slow_threshold', 1.0)
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE quotes (day TEXT)"))
+        connection.execute(text("INSERT INTO quotes VALUES ('2024-05-09'), ('2024-05-10')"))
+    return instrumentation.instrument_engine(engine)
+
+
+def read_quotes(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT day FROM quotes")).fetchall()
+
+
+def test_queries_are_timed_by_table_and_only_slow_ones_resolve_the_caller(engine, monkeypatch):
+    with instrumentation.query_report('fast', log=False) as report:
+        read_quotes(engine)
+    summary = report.summary()
+    assert summary['tables']['quotes']['count'] == 1
+    assert summary['helpers'] == {}
+
+    monkeypatch.setitem(instrumentation.QUERY_LOG_OPTIONS, 'slow_threshold', 0.0)
+    with instrumentation.query_report('slow', log=False) as report:
+        read_quotes(engine)
+    # 调用方为调用 db 包之外的第一个业务代码函数
+    assert list(report.summary()['helpers']) == ['read_quotes']
+
+
+def test_disabling_removes_the_listeners(engine):
+    try:
+        instrumentation.configure_query_log(enabled=False)
+        with instrumentation.query_report('disabled', log=False) as report:
+            read_quotes(engine)
+        assert report.summary()['tables'] == {}
+    finally:
+        instrumentation.configure_query_log(enabled=True)
+    with instrumentation.query_report('enabled', log=False) as report:
+        read_quotes(engine)
+    assert report.summary()['tables']['quotes']['count'] == 1
@@ -0,0 +1,36 @@
+import importlib
+from db.schema_catalog import schema_catalog
+from tests.sqlite_shim import daily_frame, patch_catalog, sqlite_engine
+
+# db 包导出的同名函数会遮住子模块，按模块名取得 db.stock_operations
+stock_operations = importlib.import_module('db.stock_operations')
+
+
+def _setup(monkeypatch, tmp_path, tables):
+    engine = sqlite_engine(tmp_path / 'china.db', tables)
+    monkeypatch.setattr(stock_operations, 'create_db_connection', lambda db_name: engine)
+    patch_catalog(monkeypatch, schema_catalog, tables)
+
+
+def test_last_rows_without_columns_select_every_column(monkeypatch, tmp_path):
+    tables = {'600000': daily_frame([10.0, 10.5, 11.0]), '000001': daily_frame([8.0, 7.5])}
+    _setup(monkeypatch, tmp_path, tables)
+
+    snapshot = stock_operations.read_last_rows_snapshot_mysql(['600000', '000001', '600999'], 'china',
+                                                              order_by='日期')
+    assert list(snapshot['_status']) == ['ok', 'ok', 'missing_table']
+    assert list(snapshot['收盘_不复权'][:2]) == [11.0, 7.5]
+    assert list(snapshot['日期'][:2]) == ['2024-01-03', '2024-01-02']
+
+
+def test_last_rows_of_tables_with_different_columns(monkeypatch, tmp_path):
+    tables = {
+        '600000': daily_frame([10.0, 11.0]),
+        '000001': daily_frame([8.0, 7.5], extra={'成交量_不复权': [100, 200]}),
+    }
+    _setup(monkeypatch, tmp_path, tables)
+
+    rows = stock_operations.read_last_row_mysql(['600000', '000001'], 'china', order_by='日期')
+    assert list(rows['收盘_后复权']) == [33.0, 22.5]
+    assert rows['成交量_不复权'].iloc[1] == 200
+    assert rows['成交量_不复权'].isna().iloc[0]
@@ -0,0 +1,67 @@
+import datetime
+import importlib
+from tests.sqlite_shim import daily_frame, patch_catalog, sqlite_engine
+
+# db 包导出的同名函数会遮住子模块，按模块名取得 db.latest_quotes
+latest_quotes = importlib.import_module('db.latest_quotes')
+
+
+class FakeConnection:
+    """返回固定的水位记录"""
+
+    def __init__(self, watermarks):
+        self.watermarks = watermarks
+
+    def execute(self, statement, params):
+        return [(code, self.watermarks[code]) for code in params['codes'] if code in self.watermarks]
+
+
+def test_quotes_older_than_the_watermark_are_stale(monkeypatch):
+    monkeypatch.setattr(latest_quotes.schema_catalog, 'has_table', lambda db_name, table_name: True)
+    rows = {
+        '600000': {'日期': datetime.datetime(2024, 5, 10)},
+        '600001': {'日期': datetime.datetime(2024, 5, 9)},
+        '600002': {'日期': datetime.datetime(2024, 5, 9)},
+    }
+    connection = FakeConnection({'600000': datetime.date(2024, 5, 10), '600001': datetime.date(2024, 5, 10)})
+    assert latest_quotes._stale_codes(connection, 'china', rows) == {'600001'}
+
+
+def test_stale_check_is_skipped_without_watermarks(monkeypatch):
+    monkeypatch.setattr(latest_quotes.schema_catalog, 'has_table', lambda db_name, table_name: False)
+    rows = {'600000': {'日期': datetime.datetime(2024, 5, 1)}}
+    assert latest_quotes._stale_codes(FakeConnection({}), 'china', rows) == set()
+
+
+def _rebuild_setup(monkeypatch, tmp_path, tables):
+    stock_operations = importlib.import_module('db.stock_operations')
+    engine = sqlite_engine(tmp_path / 'china.db', tables)
+    monkeypatch.setattr(stock_operations, 'create_db_connection', lambda db_name: engine)
+    patch_catalog(monkeypatch, latest_quotes.schema_catalog, tables)
+    written = []
+    monkeypatch.setattr(latest_quotes, 'upsert_dataframe_to_mysql',
+                        lambda db_name, table_name, df, key: written.append(df))
+    return written
+
+
+def test_rebuild_reads_the_last_row_of_each_history_table(monkeypatch, tmp_path):
+    tables = {'600000': daily_frame([10.0, 10.5, 11.0]), '000001': daily_frame([8.0, 7.5])}
+    written = _rebuild_setup(monkeypatch, tmp_path, tables)
+
+    latest_quotes.rebuild_latest_quotes('china', ['600000', '000001', '600999'])
+    latest = written[0].set_index('code')
+    assert sorted(latest.index) == ['000001', '600000']
+    assert latest.loc['600000', '收盘_不复权'] == 11.0
+    assert latest.loc['000001', '日期'] == datetime.datetime(2024, 1, 2)
+
+
+def test_refresh_selects_the_latest_quotes_columns(monkeypatch, tmp_path):
+    tables = {
+        '600000': daily_frame([10.0, 11.0], extra={'成交量_不复权': [100, 200]}),
+        'latest_quotes': daily_frame([9.0]).assign(code='600000'),
+    }
+    written = _rebuild_setup(monkeypatch, tmp_path, tables)
+
+    latest_quotes.refresh_latest_quotes('china', ['600000'])
+    assert list(written[0].columns) == ['code', '日期', '收盘_不复权', '收盘_后复权']
+    assert written[0]['收盘_后复权'].iloc[0] == 33.0
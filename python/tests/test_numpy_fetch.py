@@ -0,0 +1,56 @@
+import datetime
+import importlib
+import numpy as np
+from pymysql import converters
+from pymysql.constants import FIELD_TYPE
+
+# db 包导出的同名函数会遮住子模块，按模块名取得 db.numpy_fetch
+numpy_fetch = importlib.import_module('db.numpy_fetch')
+
+
+class Field:
+    def __init__(self, type_code):
+        self.type_code = type_code
+
+
+class Result:
+    """读取字段描述之后、读取第一行之前的结果集"""
+
+    def __init__(self, type_codes):
+        self.fields = [Field(type_code) for type_code in type_codes]
+        self.converters = [('ascii', converters.decoders.get(type_code)) for type_code in type_codes]
+        self.description = tuple((f'c{i}', type_code) for i, type_code in enumerate(type_codes))
+        self.affected_rows = 0
+        self.warning_count = 0
+        self.insert_id = 0
+        self.rows = None
+
+
+class Connection:
+    def __init__(self, result):
+        self._result = result
+        self.decoders = dict(converters.decoders)
+
+
+def test_raw_cursor_leaves_connection_decoders_untouched():
+    type_codes = [FIELD_TYPE.DATE, FIELD_TYPE.DOUBLE, FIELD_TYPE.VAR_STRING]
+    connection = Connection(Result(type_codes))
+    decoders = dict(connection.decoders)
+
+    cursor = numpy_fetch._RawSSCursor(connection)
+    cursor._do_get_result()
+    cursor.connection = None  # 没有真实的结果集可读，不让 close 去读取剩余的行
+    assert [converter for _, converter in connection._result.converters[:2]] == [None, None]
+    assert connection._result.converters[2] == ('ascii', converters.decoders.get(FIELD_TYPE.VAR_STRING))
+    assert connection.decoders == decoders
+
+
+def test_decode_columns_from_text():
+    floats = numpy_fetch._decode_column(['1.5', None, '2'], FIELD_TYPE.DOUBLE)
+    assert floats.dtype == np.float64 and np.isnan(floats[1]) and floats[2] == 2.0
+    assert numpy_fetch._decode_column(['3', '4'], FIELD_TYPE.LONGLONG).dtype == np.int64
+    assert numpy_fetch._decode_column(['3', None], FIELD_TYPE.LONGLONG).dtype == np.float64
+    dates = numpy_fetch._decode_column(['2024-05-10', None, '0000-00-00'], FIELD_TYPE.DATE)
+    assert dates.dtype == np.dtype('datetime64[ns]')
+    assert dates[0] == np.datetime64(datetime.date(2024, 5, 10))
+    assert np.isnat(dates[1]) and np.isnat(dates[2])
@@ -0,0 +1,27 @@
+import pandas as pd
+import get_data.pipeline as pipeline
+from get_data.pipeline import StagedLoader
+
+
+def test_every_callback_of_a_duplicated_stock_is_called(monkeypatch):
+    writes = []
+    monkeypatch.setattr(pipeline, 'write_price_frames_mysql',
+                        lambda frames, db_name, replace_codes: writes.append((frames, replace_codes)))
+    monkeypatch.setattr(pipeline, 'update_latest_quotes', lambda db_name, df: None)
+    called = []
+
+    def on_written(tag):
+        return lambda code, error: called.append((tag, code, error))
+
+    first = pd.DataFrame({'日期': ['2024-05-09'], '收盘': [10.0]})
+    last = pd.DataFrame({'日期': ['2024-05-10'], '收盘': [10.5]})
+    loader = StagedLoader('china', writer_workers=0)
+    loader._write_batch([('600000', first, True, on_written('first')),
+                         ('600001', first, False, None),
+                         ('600000', last, False, on_written('last'))])
+
+    frames, replace_codes = writes[0]
+    assert frames['600000'] is last
+    assert replace_codes == ['600000']
+    assert called == [('first', '600000', None), ('last', '600000', None)]
+    assert loader.stats()['written'] == 2
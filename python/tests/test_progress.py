@@ -0,0 +1,44 @@
+from get_data.progress import PROGRESS_EVENT, ProgressReporter, progress_room, progress_snapshot
+
+
+class RecordingSocketIO:
+    """记录推送的事件；不启动定时推送，由测试直接调用 flush"""
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, data, to=None):
+        self.events.append((event, data, to))
+
+    def start_background_task(self, target):
+        pass
+
+    def sleep(self, seconds):
+        pass
+
+
+def test_progress_is_sent_only_to_the_room_of_its_run():
+    socketio = RecordingSocketIO()
+    first = ProgressReporter(socketio, 'updata_stock', 'updata_stock-first', total=2)
+    second = ProgressReporter(socketio, 'updata_stock', 'updata_stock-second', total=1)
+    first.update('600000', 'success')
+    first.flush()
+    second.update('000001', 'error', ValueError('boom'))
+    second.close()
+
+    rooms = {to for event, data, to in socketio.events if event == PROGRESS_EVENT and data['run_id'] == 'updata_stock-first'}
+    assert rooms == {progress_room('updata_stock-first')}
+    assert progress_room('updata_stock-first') != progress_room('updata_stock-second')
+
+
+def test_snapshot_by_run_id_and_latest_run_of_job():
+    socketio = RecordingSocketIO()
+    first = ProgressReporter(socketio, 'compute_factor', 'compute_factor-a', total=1)
+    first.update('600000', 'success')
+    first.close()
+    second = ProgressReporter(socketio, 'compute_factor', 'compute_factor-b', total=4)
+
+    assert progress_snapshot('compute_factor-a')['finished'] is True
+    assert progress_snapshot('compute_factor-a')['percent'] == 100.0
+    assert progress_snapshot('compute_factor')['run_id'] == second.run_id
+    assert progress_snapshot('compute_factor-missing') is None
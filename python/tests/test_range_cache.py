@@ -0,0 +1,48 @@
+import subprocess
+import sys
+import pandas as pd
+from db.range_cache import RangeCache, range_cache
+from db.stock_operations import invalidate_table_caches
+
+
+def _write_rows_in_subprocess(path, days):
+    """在另一个进程中写入数据，本进程的缓存不会收到任何通知"""
+    script = (
+        "import sys, pandas as pd\n"
+        "days = int(sys.argv[2])\n"
+        "pd.DataFrame({'日期': pd.bdate_range('2024-01-01', periods=days).strftime('%Y-%m-%d'),"
+        " 'factor': range(days)}).to_csv(sys.argv[1], index=False)\n"
+    )
+    subprocess.run([sys.executable, '-c', script, str(path), str(days)], check=True)
+
+
+def _loader(path):
+    return lambda: pd.read_csv(path)
+
+
+def test_cached_range_is_served_until_invalidated(tmp_path):
+    cache = RangeCache()
+    path = tmp_path / 'factor.csv'
+    _write_rows_in_subprocess(path, 5)
+    first = cache.read('factor', '600000', '日期', '20240101', '20241231', None, _loader(path))
+    assert len(first) == 5
+
+    _write_rows_in_subprocess(path, 8)
+    stale = cache.read('factor', '600000', '日期', '20240101', '20241231', None, _loader(path))
+    assert len(stale) == 5
+
+    cache.invalidate('factor', '600000')
+    fresh = cache.read('factor', '600000', '日期', '20240101', '20241231', None, _loader(path))
+    assert len(fresh) == 8
+
+
+def test_invalidate_table_caches_after_write_from_another_process(tmp_path):
+    path = tmp_path / 'factor.csv'
+    _write_rows_in_subprocess(path, 3)
+    range_cache.read('factor', '000001', '日期', '20240101', '20241231', ['日期', 'factor'], _loader(path))
+
+    _write_rows_in_subprocess(path, 6)
+    invalidate_table_caches('factor', '000001')
+    fresh = range_cache.read('factor', '000001', '日期', '20240101', '20241231', ['日期', 'factor'], _loader(path))
+    assert len(fresh) == 6
+    assert fresh['factor'].tolist() == list(range(6))
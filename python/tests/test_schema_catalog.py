@@ -0,0 +1,59 @@
+import importlib
+from db.schema_catalog import SchemaCatalog
+
+# db 包导出的 schema_catalog 是缓存实例，与模块同名
+schema_catalog_module = importlib.import_module('db.schema_catalog')
+
+
+class StubCatalog(SchemaCatalog):
+    """用内存中的表代替 INFORMATION_SCHEMA；database 模拟其他进程看到的真实表结构"""
+
+    def __init__(self, database):
+        super().__init__()
+        self.database = database
+        self.table_queries = 0
+
+    def _load(self, db_name):
+        return self._columns.setdefault(db_name, {})
+
+    def _query_columns(self, db_name, table_name):
+        self.table_queries += 1
+        return list(self.database.get(table_name, []))
+
+
+def test_table_created_by_another_process_is_found_without_invalidate(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(schema_catalog_module.time, 'monotonic', lambda: now[0])
+    database = {}
+    catalog = StubCatalog(database)
+    catalog._columns['factor'] = {}
+    assert not catalog.has_table('factor', '600000')
+
+    # 其他进程建表；数据库的缓存已加载且不含该表，TTL 过后重新查询即可找到
+    database['600000'] = ['日期', 'factor']
+    now[0] += schema_catalog_module.MISSING_TABLE_TTL
+    assert catalog.has_table('factor', '600000')
+    assert catalog.get_columns('factor', '600000') == ['日期', 'factor']
+    assert catalog.table_queries == 2
+
+
+def test_missing_table_is_rechecked_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(schema_catalog_module.time, 'monotonic', lambda: now[0])
+    database = {}
+    catalog = StubCatalog(database)
+    assert not catalog.has_table('factor', '600000')
+    assert not catalog.has_table('factor', '600000')
+    assert catalog.table_queries == 1
+
+    database['600000'] = ['日期']
+    now[0] += schema_catalog_module.MISSING_TABLE_TTL
+    assert catalog.has_table('factor', '600000')
+    assert catalog.table_queries == 2
+
+
+def test_register_table_clears_missing_entry():
+    catalog = StubCatalog({})
+    assert not catalog.has_table('factor', '600000')
+    catalog.register_table('factor', '600000', ['日期'])
+    assert catalog.has_table('factor', '600000')
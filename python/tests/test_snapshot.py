@@ -0,0 +1,44 @@
+import datetime
+import pandas as pd
+import get_data.snapshot as snapshot
+from get_data.snapshot import hfq_ratios, snapshot_bars
+
+
+def _stored():
+    return pd.DataFrame({'收盘_不复权': [10.0, 0.0, None, 8.0], '收盘_后复权': [30.0, 5.0, 24.0, None]},
+                        index=['600000', '600001', '600002', '600003'])
+
+
+def test_hfq_ratio_is_missing_when_stored_close_is_null_or_zero():
+    ratios = hfq_ratios(_stored())
+    assert ratios['600000'] == 3.0
+    assert ratios[['600001', '600002', '600003']].isna().all()
+
+
+def test_snapshot_bars_scale_hfq_prices():
+    spot = pd.DataFrame({'今开': [10.5], '最新价': [11.0], '最高': [11.2], '最低': [10.4], '成交量': [1000],
+                         '成交额': [1.1e4], '振幅': [7.6], '涨跌幅': [10.0], '涨跌额': [1.0], '换手率': [0.5]},
+                        index=['600000'])
+    bars = snapshot_bars(spot, _stored().loc[['600000']], datetime.date(2024, 5, 10))
+    assert bars.loc[0, '收盘_后复权'] == 33.0
+    assert bars.loc[0, '收盘_前复权'] == 11.0
+    assert bars.loc[0, '成交量_后复权'] == 1000
+
+
+def test_per_table_snapshot_bars_are_written_in_batches(monkeypatch):
+    batches = []
+
+    def write(frames, db_name):
+        batches.append(sorted(frames))
+        if '600002' in frames:
+            raise RuntimeError('写入失败')
+
+    monkeypatch.setattr(snapshot, 'long_table_for', lambda db_name: None)
+    monkeypatch.setattr(snapshot, 'write_price_frames_mysql', write)
+    codes = ['600000', '600001', '600002', '600003', '600004']
+    bars = pd.DataFrame({'code': codes, '日期': datetime.date(2024, 5, 10), '收盘_不复权': 10.0})
+
+    ingested = snapshot._write_snapshot_bars('china', bars, batch_stocks=2)
+    # 失败的批次逐只重写，只有出错的股票不计入
+    assert sorted(ingested) == ['600000', '600001', '600003', '600004']
+    assert batches == [['600000', '600001'], ['600002', '600003'], ['600002'], ['600003'], ['600004']]
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+from get_data.sources import (
+    HFQ_FACTOR,
+    DataSource,
+    FakeHistSource,
+    RecordingSource,
+    ReplaySource,
+    synthetic_hist,
+)
+
+
+class MarketSource(FakeHistSource):
+    """在模拟日线之外提供固定的快照和指数数据"""
+
+    def spot(self):
+        return pd.DataFrame({'代码': ['000001', '600000'], '最新价': [10.5, 8.2]})
+
+    def index_list(self):
+        return pd.DataFrame({'index_code': ['000300'], 'display_name': ['沪深300']})
+
+    def index_cons(self, index_code):
+        return pd.DataFrame({'品种代码': ['000001', '600000'], '品种名称': ['平安银行', '浦发银行']})
+
+
+def test_recorded_history_replays_identically(tmp_path):
+    recorder = RecordingSource(MarketSource(latency=0), str(tmp_path))
+    recorded = {adjust: recorder.hist('000001', '20240101', '20240331', adjust) for adjust in ('', 'qfq', 'hfq')}
+
+    replay = ReplaySource(str(tmp_path))
+    for adjust, df in recorded.items():
+        pd.testing.assert_frame_equal(replay.hist('000001', '20240101', '20240331', adjust), df,
+                                      check_dtype=False)
+    # 回放按请求的日期范围切片
+    march = replay.hist('000001', '20240301', '20240331')
+    assert len(march) == len(synthetic_hist('000001', '20240301', '20240331'))
+    assert march['股票代码'].iloc[0] == '000001'
+
+
+def test_recordings_of_the_same_stock_are_merged_by_date(tmp_path):
+    recorder = RecordingSource(MarketSource(latency=0), str(tmp_path))
+    recorder.hist('600000', '20240101', '20240131')
+    recorder.hist('600000', '20240115', '20240229')
+
+    replayed = ReplaySource(str(tmp_path)).hist('600000', '20240101', '20240229')
+    assert len(replayed) == len(synthetic_hist('600000', '20240101', '20240229'))
+    assert replayed['日期'].is_unique
+
+
+def test_factor_spot_and_index_round_trip(tmp_path):
+    recorder = RecordingSource(MarketSource(latency=0), str(tmp_path))
+    factors = recorder.hist('000001', '20240101', '20240131', HFQ_FACTOR)
+    spot = recorder.spot()
+    index_list = recorder.index_list()
+    cons = recorder.index_cons('000300')
+
+    replay = ReplaySource(str(tmp_path))
+    pd.testing.assert_frame_equal(replay.hist('000001', '20240101', '20240131', HFQ_FACTOR), factors)
+    pd.testing.assert_frame_equal(replay.spot(), spot)
+    pd.testing.assert_frame_equal(replay.index_list(), index_list)
+    # 代码列按字符串读取，保留前导零
+    pd.testing.assert_frame_equal(replay.index_cons('000300'), cons)
+
+
+def test_replay_without_recording(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ReplaySource(str(tmp_path)).hist('000001', '20240101', '20240131')
+    synthetic = ReplaySource(str(tmp_path), synthetic=True).hist('000001', '20240101', '20240131')
+    pd.testing.assert_frame_equal(synthetic, synthetic_hist('000001', '20240101', '20240131'))
+
+
+def test_replay_injects_failures(tmp_path):
+    source = ReplaySource(str(tmp_path), failure_rate=1.0, synthetic=True)
+    with pytest.raises(ConnectionError):
+        source.hist('000001', '20240101', '20240131')
+    assert source.calls == 1
+
+
+def test_sources_must_implement_every_request():
+    class HistOnly(DataSource):
+        def hist(self, stock_code, start_date, end_date, adjust=""):
+            return pd.DataFrame()
+
+    with pytest.raises(TypeError):
+        HistOnly()
+    with pytest.raises(NotImplementedError):
+        FakeHistSource(latency=0).spot()
@@ -174,16 +174,19 @@ function useSearchFactor(dispatch: React.Dispatch<Action>) {
 export default function Home() {
   const [state, dispatch] = useReducer(reducer, initialState);
   const socketRef = useRef<Socket | null>(null);
+  // 当前因子计算任务的运行 id（job/started 返回），断线重连后用它重新订阅进度
+  const computeRunIdRef = useRef<string | null>(null);
 
   // 定义可用的传入参数选项
   const parameterOptions: string[] = ['df', 'column', 'moving_average_days', 'k'];
 
   // 定义 handleConfirmComput 函数
-  const handleConfirmComput = useCallback((progress: number) => {
+  const handleConfirmComput = useCallback((progress: number, finished: boolean) => {
     const roundedProgress = Math.round(progress);
     dispatch({ type: 'SET_COMPUTE_PROGRESS', payload: roundedProgress });
 
-    if (roundedProgress >= 100) {
+    if (finished) {
+      computeRunIdRef.current = null;
       dispatch({ type: 'SET_IS_COMPUTING', payload: false });
       alert('因子计算完成！');
     }
@@ -214,11 +217,61 @@ export default function Home() {
     const socket = io('http://127.0.0.1:5000');
     socketRef.current = socket;
 
+    // 处理本客户端发起的因子计算的进度，percent 为已完成的百分比，finished 表示计算已结束
+    const applyComputeProgress = (data: any) => {
+      const progress = Number(data.percent);
+      if (!isNaN(progress)) {
+        handleConfirmComput(progress, Boolean(data.finished));
+      } else {
+        console.error('Invalid progress value:', data);
+      }
+    };
+
     socket.on('connect', () => {
       console.log('已连接到 Socket.IO 服务器');
       // 请求基础数据和引用因子数据
       socket.emit('api/factor/baseData');
       socket.emit('api/factor/importFactors');
+
+      // 断线重连后重新加入计算任务的房间，并拉取断线期间的最新进度（任务可能已经结束）
+      const runId = computeRunIdRef.current;
+      if (!runId) return;
+      socket.emit('progress/subscribe', { run_id: runId });
+      fetch(`http://127.0.0.1:5000/api/progress/${runId}`)
+        .then((res) => (res.ok ? res.json() : null))
+        .then((data) => {
+          if (computeRunIdRef.current !== runId) return;
+          if (data) {
+            applyComputeProgress(data);
+          } else {
+            // 服务端没有这次运行的记录（例如服务已重启），任务不会再推送进度
+            computeRunIdRef.current = null;
+            dispatch({ type: 'SET_IS_COMPUTING', payload: false });
+          }
+        })
+        .catch((err) => console.error('获取计算进度失败:', err));
+    });
+
+    // 记录本客户端发起的因子计算的运行 id
+    socket.on('job/started', (data: { job: string; run_id: string }) => {
+      if (data.job === 'compute_factor') {
+        computeRunIdRef.current = data.run_id;
+      }
+    });
+
+    // 任务结束（包括出错退出）时恢复计算状态
+    socket.on('job/finished', (data: { job: string; run_id: string }) => {
+      if (data.run_id !== computeRunIdRef.current) return;
+      computeRunIdRef.current = null;
+      dispatch({ type: 'SET_IS_COMPUTING', payload: false });
+    });
+
+    // 计算未能启动（例如同时运行的任务已满）时恢复计算状态
+    socket.on('error', (data: any) => {
+      console.error('服务端错误:', data?.error);
+      if (!computeRunIdRef.current) {
+        dispatch({ type: 'SET_IS_COMPUTING', payload: false });
+      }
     });
 
     // 监听基础数据响应
@@ -261,17 +314,10 @@ export default function Home() {
       }
     });
 
-    // 监听计算进度
-    socket.on('compute/progress', (data: any) => {
-      console.log('Received compute/progress data:', data);
-
-      // 假设 data 直接是进度值的字符串，例如 "100.0"
-      const progress = parseFloat(data); // 将字符串转为浮点数
-      if (!isNaN(progress)) {
-        handleConfirmComput(progress);
-      } else {
-        console.error('Invalid progress value:', progress);
-      }
+    // 监听计算进度：服务端按运行合并后定时推送，只处理本客户端发起的这次计算
+    socket.on('progress', (data: any) => {
+      if (!computeRunIdRef.current || data?.run_id !== computeRunIdRef.current) return;
+      applyComputeProgress(data);
     });
 
     // 监听计算完成
@@ -553,6 +599,7 @@ export default function Home() {
       parameters: reconstructedParameters,
     };
 
+    computeRunIdRef.current = null;
     socketRef.current?.emit('api/factor/compute_factor', computeData);
 
     // 更新状态为正在计算
@@ -1,19 +1,27 @@
 'use client';
 // StockUpdater.tsx
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import io, { Socket } from 'socket.io-client';
-// 定义股票处理状态的类型
-interface StockStatus {
-  stock_code: string;
-  status: 'completed' | 'error';
-  error?: string;
+// 服务端按任务合并推送的进度
+interface JobProgress {
+  job: string;
+  run_id: string;
+  total: number;
+  reported: number;
+  failed: number;
+  percent: number;
+  counts: Record<string, number>;
+  errors: { key: string; status: string; error: string }[];
+  finished: boolean;
 }
 
 const StockUpdater: React.FC = () => {
   const [socket, setSocket] = useState<Socket | null>(null);
-  const [statuses, setStatuses] = useState<StockStatus[]>([]);
+  const [progress, setProgress] = useState<JobProgress | null>(null);
   const [isUpdating, setIsUpdating] = useState<boolean>(false);
   const [updateType, setUpdateType] = useState<'incremental' | 'full'>('incremental');
+  // 当前行情更新任务的运行 id（job/started 返回），断线重连后用它重新订阅进度
+  const runIdRef = useRef<string | null>(null);
   useEffect(() => {
     // 连接到 SocketIO 服务器
     const newSocket = io('http://localhost:5000'); 
@@ -33,13 +41,64 @@ const StockUpdater: React.FC = () => {
   useEffect(() => {
     if (!socket) return;
 
-    // 监听 'stock_update' 事件
-    socket.on('stock_update', (data: StockStatus) => {
-      setStatuses((prevStatuses) => [...prevStatuses, data]);
+    const applyProgress = (data: JobProgress) => {
+      setProgress(data);
+      if (data.finished) {
+        runIdRef.current = null;
+        setIsUpdating(false);
+      }
+    };
+
+    // 记录本客户端发起的行情更新任务的运行 id
+    socket.on('job/started', (data: { job: string; run_id: string }) => {
+      if (data.job !== 'updata_stock' && data.job !== 'replace_stock') return;
+      runIdRef.current = data.run_id;
+    });
+
+    // 监听合并推送的进度，只处理本客户端发起的这次运行
+    socket.on('progress', (data: JobProgress) => {
+      if (!runIdRef.current || data.run_id !== runIdRef.current) return;
+      applyProgress(data);
+    });
+
+    // 任务结束（包括出错退出）时恢复按钮
+    socket.on('job/finished', (data: { job: string; run_id: string }) => {
+      if (data.run_id !== runIdRef.current) return;
+      runIdRef.current = null;
+      setIsUpdating(false);
+    });
+
+    // 任务未能启动（例如同时运行的任务已满）时恢复按钮
+    socket.on('error', () => {
+      if (!runIdRef.current) setIsUpdating(false);
+    });
+
+    // 断线重连后重新加入这次运行的房间，并拉取断线期间的最新进度（任务可能已经结束）
+    socket.on('connect', () => {
+      const runId = runIdRef.current;
+      if (!runId) return;
+      socket.emit('progress/subscribe', { run_id: runId });
+      fetch(`http://localhost:5000/api/progress/${runId}`)
+        .then((res) => (res.ok ? res.json() : null))
+        .then((data: JobProgress | null) => {
+          if (runIdRef.current !== runId) return;
+          if (data) {
+            applyProgress(data);
+          } else {
+            // 服务端没有这次运行的记录（例如服务已重启），任务不会再推送进度
+            runIdRef.current = null;
+            setIsUpdating(false);
+          }
+        })
+        .catch((err) => console.error('获取任务进度失败:', err));
     });
 
     return () => {
-      socket.off('stock_update');
+      socket.off('job/started');
+      socket.off('progress');
+      socket.off('job/finished');
+      socket.off('error');
+      socket.off('connect');
     };
   }, [socket]);
 
@@ -50,7 +109,8 @@ const StockUpdater: React.FC = () => {
     }
 
     // 清空之前的状态
-    setStatuses([]);
+    setProgress(null);
+    runIdRef.current = null;
     setIsUpdating(true);
 
     // 根据选择的更新类型触发事件
@@ -58,18 +118,6 @@ const StockUpdater: React.FC = () => {
     socket.emit(event);
   };
 
-  // 当所有股票处理完成后，停止更新状态
-  useEffect(() => {
-    if (isUpdating && statuses.length > 0) {
-      // 假设5秒后所有股票都已处理
-      const timer = setTimeout(() => {
-        setIsUpdating(false);
-      }, 5000);
-
-      return () => clearTimeout(timer);
-    }
-  }, [statuses, isUpdating]);
-
   return (
     <div className="max-w-xl mx-auto p-6 bg-white rounded-lg shadow-md">
       <h2 className="text-2xl font-bold mb-4 text-center">股票数据更新</h2>
@@ -94,14 +142,27 @@ const StockUpdater: React.FC = () => {
       </button>
 
       <h3 className="text-xl font-semibold mt-6 mb-2">处理状态：</h3>
-      <ul className="space-y-2">
-        {statuses.map((status, index) => (
-          <li key={index} className={`p-2 rounded-md ${status.status === 'error' ? 'bg-red-100 text-red-700' : 'bg-green-100 text-green-700'}`}>
-            股票代码: <span className="font-bold">{status.stock_code}</span> - 状态: {status.status}
-            {status.status === 'error' && <span> - 错误: {status.error}</span>}
-          </li>
-        ))}
-      </ul>
+      {progress && (
+        <div className="space-y-2">
+          <p>
+            已处理 {progress.reported} / {progress.total}（{progress.percent}%），失败 {progress.failed}
+          </p>
+          <ul className="space-y-1">
+            {Object.entries(progress.counts).map(([status, count]) => (
+              <li key={status} className="p-2 rounded-md bg-green-100 text-green-700">
+                {status}: <span className="font-bold">{count}</span>
+              </li>
+            ))}
+          </ul>
+          <ul className="space-y-1">
+            {progress.errors.map((error, index) => (
+              <li key={index} className="p-2 rounded-md bg-red-100 text-red-700">
+                股票代码: <span className="font-bold">{error.key}</span> - 状态: {error.status} - 错误: {error.error}
+              </li>
+            ))}
+          </ul>
+        </div>
+      )}
     </div>
   );
 };